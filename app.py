@@ -1,17 +1,24 @@
-from pathlib import Path
+import re
 import streamlit as st
 import polars as pl
-import numpy as np
-import matplotlib.pyplot as plt
-from datetime import date, datetime, timedelta
+from datetime import datetime, timedelta
 
-from nav import top_nav
-from streamlit_autorefresh import st_autorefresh
+from nav import apply_theme, top_nav
 
 # === UTILITIES ===
-from utils import simulate_warehouse, risk_utils
+from utils import instrumentation
+from utils.instrumentation import span, timed
+from utils.charts import ChartCache, top_risk
+from utils.expiry_index import ExpiryIndex
+from utils.kpi_cube import KpiCube
+from utils.risk_utils import select_days
+from utils.warehouse_state import load_warehouse
+from config import fleet as fl
+from live import ALL_STATIONS, fleet, fleet_state, live_fragment, live_state, session_memo, station_state
 
 
+instrumentation.start_run()
+
 # ---------- NAV ----------
 top_nav(active="SmartTwin Warehouse")
 
@@ -28,69 +35,24 @@ div.block-container {padding-left: 3rem; padding-right: 3rem;}
 </style>
 """, unsafe_allow_html=True)
 
-theme_path = Path(__file__).parent / "assets" / "theme.css"
-st.markdown(f"<style>{theme_path.read_text()}</style>", unsafe_allow_html=True)
-
-# ==================================================
-#           AUTOREFRESH CONTROLLER
-# ==================================================
-# This triggers a full rerun every 30 seconds (30,000 ms)
-count = st_autorefresh(interval=20_000, limit=None, key="warehouse_autoupdate")
+apply_theme()
 
 # ==================================================
 #           DATA LOADING
 # ==================================================
-@st.cache_data(ttl=24*60*60)
-def load_and_compute():
-    try:
-        df = pl.read_csv("data/expirations_processed.csv")
-    except:
-        df = pl.read_csv("data/data_with_risk.csv")
-
-    today = date.today()
+@st.cache_resource
+def chart_cache() -> ChartCache:
+    """Rendered charts shared by every session, keyed by the content of their plot input."""
+    return ChartCache(maxsize=256)
 
-    # --- Detect and normalize Expiry_Date dtype ---
-    dtype = df.schema.get("Expiry_Date")
-
-    if dtype == pl.Utf8:
-        df = df.with_columns(
-            pl.col("Expiry_Date")
-            .str.strptime(pl.Date, strict=False)
-            .alias("Expiry_Date")
-        )
 
-    df = df.with_columns(
-        pl.when(pl.col("Expiry_Date").is_null())
-        .then(pl.lit(today))
-        .otherwise(pl.col("Expiry_Date"))
-        .alias("Expiry_Date")
-    )
-
-    # --- Compute days to expire ---
-    df = df.with_columns([
-        (pl.col("Expiry_Date").cast(pl.Date) - pl.lit(today).cast(pl.Date))
-        .dt.total_days()
-        .cast(pl.Int64, strict=False)
-        .alias("Days_to_Expire")
-    ])
-
-    # --- Status and risk ---
-    df = df.with_columns([
-        pl.when(pl.col("Days_to_Expire") < 0).then(pl.lit("Expired"))
-        .when(pl.col("Days_to_Expire") <= 2).then(pl.lit("Critical"))
-        .when(pl.col("Days_to_Expire") <= 7).then(pl.lit("Medium"))
-        .otherwise(pl.lit("Active"))
-        .alias("Status"),
-
-        (100 - (pl.col("Days_to_Expire") * 10))
-        .clip(0, 100)
-        .alias("Risk_Score"),
-    ])
-
-    return df, datetime.now()
+@st.cache_data(ttl=24*60*60)
+@timed("load_and_compute")
+def load_and_compute():
+    return load_warehouse(), datetime.now()
 
 
-df, computed_at = load_and_compute()
+fallback_df, computed_at = load_and_compute()
 
 # ---------- REFRESH INFO ----------
 next_refresh = computed_at + timedelta(days=1)
@@ -122,84 +84,133 @@ with col_refresh:
         st.rerun()
 
 # ==================================================
-#        LIVE WAREHOUSE SIMULATION
-# ==================================================
-# Automatically simulate every refresh or on button click
-if count > 0:
-    df = simulate_warehouse.simulate_warehouse(df)
-    df = risk_utils.recalc_risk(df)
-    st.toast("Warehouse updated")
-
-    df.write_csv("data/live_warehouse_state.csv")
-
-# ==================================================
-#            VISUALIZATIONS
+#        LIVE WAREHOUSE FEED
 # ==================================================
-st.title("Warehouse Twin")
+# One simulation clock per server (live.simulation_clock) advances the twin;
+# the data-dependent sections below are live fragments: they read the latest
+# snapshot themselves and a new version reruns only them, never the page.
+# In fleet mode every station is a shard with its own worker process.
+charts = chart_cache()
+station = None
+if fleet() is not None:
+    station = st.selectbox("Station", [ALL_STATIONS] + fl.STATIONS)
+
+
+@live_fragment
+def fleet_section():
+    # Vista de flota: solo agregados enviados por los workers, ningún DataFrame de lotes
+    handle, _ = fleet_state("app_fleet_version")
+    fleet_kpis = handle.fleet_kpis()
+
+    col1, col2 = st.columns(2)
+    with col1:
+        fleet_top = handle.top_risk(k=10).select(
+            pl.format("{} · {}", "Product_Name", "Station_ID").alias("Product_Name"), "Risk_Score"
+        )
+        st.image(charts.png("top_risk", fleet_top, k=10), use_container_width=True)
+    with col2:
+        pie_counts = fleet_kpis.status_counts(min_days=1, exclude=("expired",))
+        st.image(charts.png("status_pie", pie_counts), use_container_width=True)
+
+    st.divider()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Total lots", fleet_kpis.total[0])
+    col2.metric("Expired", fleet_kpis.lots(max_days=-1))
+    col3.metric("Critical (≤2 days)", fleet_kpis.lots(max_days=2))
+    col4.metric("Medium risk (≤7 days)", fleet_kpis.lots(min_days=3, max_days=7))
+
+    st.subheader("Stations")
+    st.dataframe(handle.rollup(), use_container_width=True)
+
+
+@live_fragment
+def twin_section(station: str | None):
+    state_key = f"app_feed_version_{station}" if station else "app_feed_version"
+    if station is not None:
+        snapshot, changed = station_state(station, state_key)
+        if snapshot is None:
+            # La estación aún no ha publicado: no se muestran los datos diarios como si fueran suyos
+            status = fleet().station_status().get(station, "starting")
+            st.info(f"Station {station} starting… ({status}). Its view appears with the first published version.")
+            st.stop()
+    else:
+        snapshot, changed = live_state(state_key)
 
-# Convert to pandas for matplotlib
-df_pd = df.to_pandas()
-df_visible = df_pd[df_pd["Risk_Score"] < 100]
-
-col1, col2 = st.columns(2)
-
-with col1:
-    fig, ax = plt.subplots()
-    risky = df_visible[df_visible["Risk_Score"] > 0]
-    top_risk = risky.nlargest(10, "Risk_Score")
-    ax.bar(top_risk["Product_Name"], top_risk["Risk_Score"], color="#E2001A")
-    ax.set_title("Top 10 products with highest expiration risk", fontsize=11, weight="bold")
-    ax.set_xlabel("Product")
-    ax.set_ylabel("Risk (%)")
-    plt.xticks(rotation=45, ha='right')
-    st.pyplot(fig, use_container_width=True)
-
-with col2:
-    df_no_expired = df_visible[df_visible["Status"].str.lower() != "expired"]
-    state_counts = df_no_expired["Status"].value_counts()
-
-    fig2, ax2 = plt.subplots()
-    if state_counts.empty:
-        ax2.text(0.5, 0.5, "No non-expired lots", ha="center", va="center")
-        ax2.axis("off")
+    if snapshot is not None:
+        version, df, kpis, index = snapshot.version, snapshot.df, snapshot.kpis, snapshot.index
+        if changed:
+            st.toast("Warehouse updated")
     else:
-        ax2.pie(
-            state_counts,
-            labels=state_counts.index,
-            autopct="%1.1f%%",
-            startangle=90,
-            textprops={'fontsize': 8}
+        # Sin feed publicado: el cálculo diario, versionado por su hora de cálculo
+        version, df = computed_at, fallback_df
+        kpis, index = session_memo(
+            "app_fallback_view", version, lambda: (KpiCube.from_frame(df).view(), ExpiryIndex.from_frame(df))
         )
-        ax2.set_title("Lot distribution by status", fontsize=11, weight="bold")
 
-    st.pyplot(fig2, use_container_width=True)
+    # ==================================================
+    #            VISUALIZATIONS
+    # ==================================================
+    # Los gráficos salen de agregados Polars de ~10 filas y se cachean como PNG
+    # Risk_Score < 100 ⇔ al menos 1 día: filas sacadas del índice de caducidad
+    df_visible, top = session_memo(
+        f"{state_key}_visible", version, lambda: (select_days(df, min_days=1, index=index), top_risk(df, k=10))
+    )
 
-st.divider()
+    col1, col2 = st.columns(2)
 
-# ==================================================
-#           KPIs & TABLE
-# ==================================================
-col1, col2, col3, col4 = st.columns(4)
-col1.metric("Total lots", len(df_pd))
-col2.metric("Expired", (df_pd["Days_to_Expire"] < 0).sum())
-col3.metric("Critical (≤2 days)", (df_pd["Days_to_Expire"] <= 2).sum())
-col4.metric("Medium risk (≤7 days)", ((df_pd["Days_to_Expire"] > 2) & (df_pd["Days_to_Expire"] <= 7)).sum())
+    with col1:
+        st.image(charts.png("top_risk", top, k=10), use_container_width=True)
 
-st.divider()
+    with col2:
+        # Visible (Risk_Score < 100 ⇔ ≥1 day left) and not expired, straight from the KPI cube
+        pie_counts = kpis.status_counts(min_days=1, exclude=("expired",))
+        st.image(charts.png("status_pie", pie_counts), use_container_width=True)
 
-# ---------- FILTERS ----------
-status_opts = df_visible["Status"].dropna().unique().tolist()
-status_selected = st.multiselect("Filter by status", status_opts, default=status_opts)
+    st.divider()
 
-search = st.text_input("Search by Product or Lot")
+    # ==================================================
+    #           KPIs & TABLE
+    # ==================================================
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Total lots", kpis.total[0])
+    col2.metric("Expired", kpis.lots(max_days=-1))
+    # Como antes, "≤2 días" incluye los lotes ya expirados
+    col3.metric("Critical (≤2 days)", kpis.lots(max_days=2))
+    col4.metric("Medium risk (≤7 days)", kpis.lots(min_days=3, max_days=7))
 
-filtered = df_visible[df_visible["Status"].isin(status_selected)]
-if search:
-    filtered = filtered[
-        filtered["Product_Name"].str.contains(search, case=False, na=False)
-        | filtered["LOT_Number"].astype(str).str.contains(search, case=False, na=False)
-    ]
+    st.divider()
 
-st.subheader("Current lot status")
-st.dataframe(filtered, use_container_width=True)
+    # ---------- FILTERS ----------
+    # Los filtros viven en el fragmento: cambiarlos tampoco relanza la página
+    status_opts = df_visible["Status"].drop_nulls().unique(maintain_order=True).to_list()
+    status_selected = st.multiselect("Filter by status", status_opts, default=status_opts)
+
+    search = st.text_input("Search by Product or Lot")
+
+    def apply_filters() -> pl.DataFrame:
+        filtered = df_visible.filter(pl.col("Status").is_in(status_selected))
+        if search:
+            pattern = f"(?i){re.escape(search)}"
+            filtered = filtered.filter(
+                pl.col("Product_Name").str.contains(pattern).fill_null(False)
+                | pl.col("LOT_Number").cast(pl.Utf8).str.contains(pattern).fill_null(False)
+            )
+        return filtered
+
+    filtered = session_memo(f"{state_key}_filtered", (version, tuple(status_selected), search), apply_filters)
+
+    st.subheader("Current lot status")
+    with span("render.table", rows=filtered.height):
+        st.dataframe(filtered, use_container_width=True)
+
+
+if station == ALL_STATIONS:
+    st.title("Fleet Twin")
+    fleet_section()
+    instrumentation.render_overlay()
+    st.stop()
+
+st.title("Warehouse Twin")
+twin_section(station)
 
+instrumentation.render_overlay()
@@ -0,0 +1,120 @@
+import argparse
+import io
+import json
+import time
+from datetime import date
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import polars as pl
+
+from utils import charts, risk_utils, simulate_warehouse
+from utils.synthetic_data import generate
+
+DELAYS = [0, 6, 12, 24, 48]
+# Fecha de referencia fija: los mismos lotes y estados en cualquier día de ejecución
+TODAY = date(2025, 1, 1)
+
+
+def _rss_mb() -> float:
+    for line in open("/proc/self/status"):
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _with_predictions(df: pl.DataFrame, delay: int) -> pl.DataFrame:
+    """Stand-in scores so the soak exercises rendering only, not the model."""
+    base = (pl.col("Risk_Score").cast(pl.Float64) * 0.8 + pl.col("Quantity").cast(pl.Float64) % 17)
+    return df.with_columns(
+        base.clip(0, 100).alias("Prob_Waste"),
+        base.clip(0, 100).alias("Prob_Waste_Current"),
+        (base + delay * 0.5).clip(0, 100).alias("Prob_Waste_Simulated"),
+    )
+
+
+def cached_rerun(cache: charts.ChartCache, df: pl.DataFrame, delay: int) -> None:
+    """What a rerun of the three pages renders with the chart layer."""
+    cache.png("top_risk", charts.top_risk(df, k=10), k=10)
+    cache.png("status_pie", charts.status_counts(df))
+    cache.png("top_waste", charts.top_waste(df, "Product_Name", k=10), k=10)
+    cache.png("scenario_bars", charts.scenario_bars(df, k=10), k=10, delay=delay)
+
+
+def legacy_rerun(df: pl.DataFrame, delay: int) -> None:
+    """Previous pages: full pandas copy and new pyplot figures on every rerun, never closed."""
+    df_pd = df.to_pandas()
+    visible = df_pd[df_pd["Risk_Score"] < 100]
+    for make in (
+        lambda ax: ax.bar(visible["Product_Name"].head(10), visible["Risk_Score"].head(10)),
+        lambda ax: ax.pie(visible["Status"].value_counts()),
+        lambda ax: ax.barh(df_pd["Product_Name"].head(10), df_pd["Prob_Waste"].head(10)),
+        lambda ax: ax.barh(np.arange(10), df_pd["Prob_Waste_Simulated"].head(10)),
+    ):
+        fig, ax = plt.subplots()
+        make(ax)
+        fig.savefig(io.BytesIO(), format="png")
+
+
+def soak(reruns: int, lots: int, change_every: int, legacy: bool, sample_every: int) -> dict:
+    df = risk_utils.recalc_risk(generate("processed", lots, seed=7, today=TODAY), TODAY)
+    cache = charts.ChartCache(maxsize=256)
+    samples = []
+    latencies = []
+    for i in range(reruns):
+        if i and i % change_every == 0:
+            # Un tick del reloj de simulación: datos nuevos para todos los gráficos
+            df = risk_utils.recalc_risk(simulate_warehouse.simulate_warehouse(df), TODAY)
+        delay = DELAYS[i % len(DELAYS)]
+        data = _with_predictions(df, delay)
+
+        t0 = time.perf_counter()
+        if legacy:
+            legacy_rerun(data, delay)
+        else:
+            cached_rerun(cache, data, delay)
+        latencies.append(time.perf_counter() - t0)
+        if i % sample_every == 0:
+            samples.append((i, _rss_mb()))
+
+    # Pendiente de la RSS en la segunda mitad (tras calentar la caché), MB por 1000 reruns
+    tail = samples[len(samples) // 2:]
+    slope = float(np.polyfit([s[0] for s in tail], [s[1] for s in tail], 1)[0] * 1000) if len(tail) > 1 else 0.0
+    lat = np.asarray(latencies) * 1000
+    return {
+        "mode": "legacy" if legacy else "cached",
+        "reruns": reruns,
+        "lots": lots,
+        "rerun_p50_ms": round(float(np.percentile(lat, 50)), 2),
+        "rerun_p99_ms": round(float(np.percentile(lat, 99)), 2),
+        "rss_start_mb": round(samples[0][1], 1),
+        "rss_end_mb": round(_rss_mb(), 1),
+        "rss_slope_mb_per_1k_reruns": round(slope, 2),
+        "open_pyplot_figures": len(plt.get_fignums()),
+        "cache": None if legacy else cache.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test of chart rendering: memory over thousands of reruns.")
+    parser.add_argument("--reruns", type=int, default=5000)
+    parser.add_argument("--lots", type=int, default=5000)
+    parser.add_argument("--change-every", type=int, default=10, help="Reruns between data changes (clock ticks)")
+    parser.add_argument("--sample-every", type=int, default=50)
+    parser.add_argument("--legacy", action="store_true", help="Run the previous pyplot path for comparison")
+    parser.add_argument("--output", help="Optional JSON file with the results")
+    args = parser.parse_args()
+
+    result = soak(args.reruns, args.lots, args.change_every, args.legacy, args.sample_every)
+    for key, value in result.items():
+        print(f"{key:<28} {value}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PAGES = ["app.py", "pages/waste.py", "pages/scenarios.py", "pages/operational-inteligence.py"]
+MARKER = "--- cold_start: entry ---"
+
+
+def has_main_guard(module: str) -> bool:
+    """True when importing `module` only defines it: its work runs under `if __name__ == "__main__"`."""
+    path = module.replace(".", "/") + ".py"
+    with open(path) as f:
+        return any(line.startswith("if __name__ ==") for line in f)
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Import time (ms) of everything imported after MARKER, total and self time per top-level package."""
+    after = stderr.split(MARKER, 1)[-1]
+    by_package: dict = {}
+    total = 0
+    for line in after.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        by_package[package] = by_package.get(package, 0) + int(self_us)
+        total += int(self_us)
+    top = sorted(by_package.items(), key=lambda kv: -kv[1])
+    return {"import_ms": round(total / 1000, 1), "top_imports_ms": {k: round(v / 1000, 1) for k, v in top[:8]}}
+
+
+def child(entry: str, timeout: float) -> None:
+    """Runs inside a fresh interpreter started with -X importtime."""
+    if entry.endswith(".py"):
+        from streamlit.testing.v1 import AppTest
+
+        # El arnés de AppTest carga el runtime de Streamlit: se calienta con una página vacía
+        AppTest.from_string("import streamlit as st").run()
+        sys.stderr.write(MARKER + "\n")
+        sys.stderr.flush()
+        start = time.perf_counter()
+        at = AppTest.from_file(entry, default_timeout=timeout).run()
+        result = {"first_render_s": time.perf_counter() - start, "exception": bool(at.exception)}
+    else:
+        import importlib
+
+        sys.stderr.write(MARKER + "\n")
+        sys.stderr.flush()
+        start = time.perf_counter()
+        importlib.import_module(entry)
+        result = {"first_render_s": None, "exception": False}
+    print(json.dumps(result))
+
+
+def measure(entry: str, runs: int, timeout: float) -> dict:
+    """`runs` cold processes for one entry point; medians plus the import profile of the last run."""
+    env = dict(os.environ, PYTHONPATH=os.getcwd())
+    renders, imports, profile, failed = [], [], {}, 0
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-m", "benchmarks.cold_start", "--child", entry,
+             "--timeout", str(timeout)],
+            capture_output=True, text=True, env=env,
+        )
+        if proc.returncode != 0 or not proc.stdout.strip():
+            failed += 1
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        failed += result["exception"]
+        profile = parse_importtime(proc.stderr)
+        imports.append(profile["import_ms"])
+        if result["first_render_s"] is not None:
+            renders.append(result["first_render_s"])
+    return {
+        "entry": entry,
+        "runs": runs,
+        "failed": failed,
+        "first_render_p50_s": round(statistics.median(renders), 3) if renders else None,
+        "import_p50_ms": round(statistics.median(imports), 1) if imports else None,
+        "top_imports_ms": profile.get("top_imports_ms", {}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start: time to first render and import profile per entry point.")
+    parser.add_argument("--entries", nargs="*", help="Pages (.py) or modules (src.x); default: every page and src CLI")
+    parser.add_argument("--runs", type=int, default=3, help="Cold processes per entry")
+    parser.add_argument("--timeout", type=float, default=300, help="AppTest timeout per page (s)")
+    parser.add_argument("--output", help="Optional JSON file with the results")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.timeout)
+        return
+
+    # Los scripts sin guard (data_preparation, risk_model, ...) ejecutan el pipeline al importarse:
+    # reescribirían data/ y el store en cada corrida, y el tiempo medido no sería de import
+    modules = sorted(f"src.{os.path.basename(p)[:-3]}" for p in glob.glob("src/*.py") if not p.endswith("__init__.py"))
+    entries = args.entries or PAGES + [m for m in modules if has_main_guard(m)]
+    unguarded = [e for e in entries if not e.endswith(".py") and not has_main_guard(e)]
+    if unguarded:
+        sys.exit(f"Modules without a __main__ guard run on import, not benchmarked: {', '.join(unguarded)}")
+    results = []
+    for entry in entries:
+        result = measure(entry, args.runs, args.timeout)
+        results.append(result)
+        render = f"{result['first_render_p50_s']:.2f}s" if result["first_render_p50_s"] is not None else "-"
+        top = ", ".join(f"{k} {v:.0f}" for k, v in list(result["top_imports_ms"].items())[:4])
+        print(f"{entry:<36} primer render {render:>7} · imports {result['import_p50_ms']} ms "
+              f"({top}){' · FALLOS ' + str(result['failed']) if result['failed'] else ''}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+
+SIZES = [10_000, 1_000_000, 10_000_000]
+BASELINE_PATH = "benchmarks/baselines/pipeline.json"
+# Fecha de referencia fija: las mismas semillas dan los mismos lotes y los mismos días a caducar en cualquier día
+TODAY = "2025-01-01"
+
+
+def _rss_mb() -> float:
+    for line in open("/proc/self/status"):
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class RssSampler:
+    """Peak RSS since the last reset(), sampled from a background thread."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _rss_mb())
+
+    def reset(self) -> None:
+        self.peak = _rss_mb()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+@contextmanager
+def stage(results: dict, sampler: RssSampler, name: str, rows: int):
+    sampler.reset()
+    start = time.perf_counter()
+    yield
+    seconds = time.perf_counter() - start
+    results[name] = {
+        "seconds": round(seconds, 4),
+        "rows": rows,
+        "rows_per_s": round(rows / seconds, 1) if seconds else None,
+        "peak_rss_mb": round(max(sampler.peak, _rss_mb()), 1),
+    }
+    print(f"  {name:<18} {seconds:>9.3f}s  {results[name]['rows_per_s'] or 0:>14,.0f} rows/s  "
+          f"peak {results[name]['peak_rss_mb']:>8.1f} MB", file=sys.stderr, flush=True)
+
+
+def run_size(n: int, train_rows: int, trees: int, ticks: int, seed: int, today: date) -> dict:
+    """Every stage of the chain on n seeded synthetic lots, in this (fresh) process."""
+    from sklearn.ensemble import RandomForestClassifier
+
+    from utils import risk_utils, simulate_warehouse
+    from utils.predictive_ai import score_lots
+    from utils.prepare_lots import OUTPUT_COLS, dedupe_lots, derive_lot_columns, normalize_lots, split_quality
+    from utils.synthetic_data import generate
+
+    sampler = RssSampler()
+    results: dict = {}
+    # Entradas generadas fuera de las etapas: solo se mide el trabajo del pipeline
+    raw = generate("raw", n, seed=seed, dirty_rate=0.01, today=today)
+    training = generate("training", min(n, train_rows), seed=seed + 1, label_noise=0.02, today=today)
+
+    # src/data_preparation.py sin la lectura del xlsx
+    with stage(results, sampler, "data_preparation", n):
+        df, _ = split_quality(normalize_lots(raw))
+        df = derive_lot_columns(dedupe_lots(df), today)
+        df = df.select(OUTPUT_COLS).sort(["Days_to_Expire", "Quantity"], descending=[False, True])
+    del raw
+
+    # src/risk_model.py: Days_to_Expire y Risk_Score respecto a la fecha de referencia
+    with stage(results, sampler, "risk_model", df.height):
+        df = risk_utils.recalc_risk(df, today)
+
+    # trainning/daily_train_predict_waste.py con el mismo modelo
+    with stage(results, sampler, "train", training.height):
+        X = training.select(["Quantity", "Days_to_Expire", "Avg_Usage_per_Day", "Risk"]).to_numpy()
+        model = RandomForestClassifier(n_estimators=trees, random_state=42)
+        model.fit(X, training["Waste_Label"].to_numpy())
+    del training
+
+    with stage(results, sampler, "score", df.height):
+        scored = score_lots(model, df)
+    del scored
+
+    with stage(results, sampler, "simulate", df.height * ticks):
+        state = df
+        for _ in range(ticks):
+            state = risk_utils.recalc_risk(simulate_warehouse.simulate_warehouse(state), today)
+
+    results["pipeline"] = {
+        "seconds": round(sum(r["seconds"] for r in results.values()), 4),
+        "rows": n,
+        "rows_per_s": None,
+        "peak_rss_mb": max(r["peak_rss_mb"] for r in results.values()),
+    }
+    results["pipeline"]["rows_per_s"] = round(n / results["pipeline"]["seconds"], 1)
+    sampler.stop()
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Stages slower (or heavier) than the baseline by more than `tolerance`."""
+    regressions = []
+    for size, stages in results.items():
+        for name, current in stages.items():
+            base = baseline.get(size, {}).get(name)
+            if base is None:
+                continue
+            for metric in ("seconds", "peak_rss_mb"):
+                if base[metric] and current[metric] > base[metric] * (1 + tolerance):
+                    regressions.append(f"{size} lots · {name} · {metric}: {current[metric]} vs baseline "
+                                       f"{base[metric]} (+{current[metric] / base[metric] - 1:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark with regression baselines.")
+    parser.add_argument("--sizes", type=int, nargs="*", default=SIZES, help="Lots per run")
+    parser.add_argument("--train-rows", type=int, default=1_000_000, help="Cap on training rows per size")
+    parser.add_argument("--trees", type=int, default=200, help="Forest size (as in the daily training)")
+    parser.add_argument("--ticks", type=int, default=3, help="simulate_warehouse ticks per size")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--today", type=date.fromisoformat, default=TODAY,
+                        help="Reference date of the synthetic lots (pinned so runs on different days compare)")
+    parser.add_argument("--output", default="pipeline_results.json", help="JSON results file")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before failing (0.25 = +25%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_size(args.child, args.train_rows, args.trees, args.ticks, args.seed, args.today)))
+        return
+
+    results = {}
+    for n in args.sizes:
+        print(f"{n:,} lots", file=sys.stderr, flush=True)
+        # Un proceso por tamaño: el pico de RSS de un tamaño no contamina al siguiente
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.pipeline", "--child", str(n), "--train-rows", str(args.train_rows),
+             "--trees", str(args.trees), "--ticks", str(args.ticks), "--seed", str(args.seed),
+             "--today", args.today.isoformat()],
+            stdout=subprocess.PIPE, text=True, env=dict(os.environ, PYTHONPATH=os.getcwd()),
+        )
+        if proc.returncode != 0:
+            sys.exit(f"{n:,} lots: child failed with exit code {proc.returncode}")
+        results[str(n)] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    report = {
+        "meta": {
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "train_rows": args.train_rows,
+            "trees": args.trees,
+            "ticks": args.ticks,
+            "seed": args.seed,
+            "today": args.today.isoformat(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline updated → {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to store one.")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline["results"], args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regressions beyond {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
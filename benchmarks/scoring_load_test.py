@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+import polars as pl
+
+from utils import predictive_ai
+
+LOTS_PATH = "data/live_warehouse_state.csv"
+FEATURES = ["Quantity", "Days_to_Expire", "Avg_Usage_per_Day", "Risk_Score"]
+
+
+def summarize(name: str, latencies: list[float], elapsed: float) -> dict:
+    lat = np.asarray(latencies) * 1000
+    result = {
+        "path": name,
+        "requests": len(lat),
+        "throughput_rps": round(len(lat) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(lat, 50)), 2),
+        "p99_ms": round(float(np.percentile(lat, 99)), 2),
+    }
+    print(f"{name:<28} {result['throughput_rps']:>10,.1f} req/s   p50 {result['p50_ms']:>8.2f} ms   "
+          f"p99 {result['p99_ms']:>8.2f} ms   ({len(lat)} requests)")
+    return result
+
+
+def per_call_baseline(lots: pl.DataFrame, n: int) -> dict:
+    """Current path: one predict_probability call (model load + pandas round-trip) per lot."""
+    latencies = []
+    start = time.perf_counter()
+    for i in range(n):
+        t0 = time.perf_counter()
+        predictive_ai.predict_probability(lots[i % lots.height])
+        latencies.append(time.perf_counter() - t0)
+    return summarize("per-call predict_probability", latencies, time.perf_counter() - start)
+
+
+async def _client(host: str, port: int, payloads: list[bytes], latencies: list[float]) -> None:
+    reader, writer = await asyncio.open_connection(host, port)
+    for body in payloads:
+        request = (f"POST /score HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                   f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+        t0 = time.perf_counter()
+        writer.write(request)
+        await writer.drain()
+        length = 0
+        while (line := await reader.readline()) not in (b"\r\n", b""):
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":")[1])
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - t0)
+    writer.close()
+
+
+async def service_load(host: str, port: int, lots: pl.DataFrame, n: int, connections: int) -> dict:
+    """Concurrent single-lot requests over keep-alive connections."""
+    # Con Product_ID el servicio enruta cada lote a su modelo de familia, como la línea base
+    rows = lots.select(["Product_ID"] + FEATURES).to_dicts()
+    payloads = [json.dumps(rows[i % len(rows)]).encode() for i in range(n)]
+    per_conn = [payloads[i::connections] for i in range(connections)]
+    latencies: list[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, p, latencies) for p in per_conn if p))
+    return summarize(f"service ({connections} conns)", latencies, time.perf_counter() - start)
+
+
+async def _wait_ready(host: str, port: int, timeout: float = 30.0) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Scoring service not reachable on {host}:{port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test: scoring service vs per-call predict_probability.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--start-service", action="store_true", help="Launch src.scoring_service for the test")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--baseline-requests", type=int, default=200)
+    parser.add_argument("--output", help="Optional JSON file with the results")
+    args = parser.parse_args()
+
+    lots = predictive_ai.recalc_risk(pl.read_csv(LOTS_PATH))
+    results = [per_call_baseline(lots, args.baseline_requests)]
+
+    service = None
+    if args.start_service:
+        service = subprocess.Popen([sys.executable, "-m", "src.scoring_service", "--port", str(args.port)])
+    try:
+        asyncio.run(_wait_ready(args.host, args.port))
+        results.append(asyncio.run(service_load(args.host, args.port, lots, args.requests, args.connections)))
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from tornado.websocket import WebSocketClosedError, websocket_connect
+
+APP_PATH = "app.py"
+FINISHED = {
+    ForwardMsg.FINISHED_SUCCESSFULLY: "full",
+    ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY: "poll",
+}
+
+
+class Session:
+    """
+    Browser stand-in speaking Streamlit's websocket protocol: requests the first
+    run, then fires the page's auto-rerun fragments (the live sections) on their
+    interval, like the frontend does. Latency is measured from the rerun request
+    to the matching script_finished message.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.page_hash = ""
+        self.fragments: dict[str, float] = {}
+        self.latencies = {"full": [], "poll": []}
+        self.errors = 0
+        self.disconnects = 0
+
+    async def _send(self, ws, fragment_id: str = "") -> None:
+        msg = BackMsg()
+        msg.rerun_script.page_script_hash = self.page_hash
+        if fragment_id:
+            msg.rerun_script.fragment_id = fragment_id
+            msg.rerun_script.is_auto_rerun = True
+        await ws.write_message(msg.SerializeToString(), binary=True)
+
+    async def _until_finished(self, ws, sent: float, deadline: float) -> None:
+        while (remaining := deadline - time.perf_counter()) > 0:
+            try:
+                raw = await asyncio.wait_for(ws.read_message(), remaining)
+            except asyncio.TimeoutError:
+                return
+            if raw is None:
+                raise ConnectionError("server closed the session")
+            msg = ForwardMsg()
+            msg.ParseFromString(raw)
+            kind = msg.WhichOneof("type")
+            if kind == "new_session":
+                self.page_hash = msg.new_session.page_script_hash
+            elif kind == "auto_rerun":
+                self.fragments[msg.auto_rerun.fragment_id] = msg.auto_rerun.interval
+            elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element" \
+                    and msg.delta.new_element.WhichOneof("type") == "exception":
+                self.errors += 1
+            elif kind == "script_finished" and msg.script_finished in FINISHED:
+                self.latencies[FINISHED[msg.script_finished]].append(time.perf_counter() - sent)
+                # Un st.rerun() dentro del fragmento termina en una ejecución completa: se cuenta aparte
+                return
+
+    async def run(self, duration: float) -> None:
+        deadline = time.perf_counter() + duration
+        ws = await websocket_connect(self.url, subprotocols=["streamlit"], max_message_size=64 * 2**20)
+        try:
+            sent = time.perf_counter()
+            await self._send(ws)
+            await self._until_finished(ws, sent, deadline)
+            while time.perf_counter() < deadline:
+                interval = min(self.fragments.values(), default=2.0)
+                await asyncio.sleep(interval)
+                for fragment_id in list(self.fragments):
+                    sent = time.perf_counter()
+                    await self._send(ws, fragment_id)
+                    await self._until_finished(ws, sent, deadline)
+        except (ConnectionError, WebSocketClosedError):
+            self.disconnects += 1
+        finally:
+            ws.close()
+
+
+def _proc_cpu_seconds(pid: int) -> float:
+    fields = open(f"/proc/{pid}/stat").read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _proc_rss_mb(pid: int) -> tuple[float, float]:
+    """(current RSS, peak RSS) of the server in MB."""
+    status = dict(line.split(":", 1) for line in open(f"/proc/{pid}/status"))
+    return int(status["VmRSS"].split()[0]) / 1024, int(status["VmHWM"].split()[0]) / 1024
+
+
+def _wait_ready(port: int, timeout: float = 60.0) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1)
+            return
+        except OSError:
+            time.sleep(0.3)
+    raise RuntimeError(f"Streamlit did not start on port {port}")
+
+
+async def _drive(port: int, sessions: int, duration: float, ramp: float) -> list[Session]:
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    clients = [Session(url) for _ in range(sessions)]
+
+    async def staggered(i: int, client: Session):
+        # Las sesiones se abren escalonadas, como operadores que van llegando
+        await asyncio.sleep(ramp * i / max(1, sessions))
+        await client.run(duration)
+
+    await asyncio.gather(*(staggered(i, c) for i, c in enumerate(clients)))
+    return clients
+
+
+def _pct(values: list[float], q: float) -> float | None:
+    return round(float(np.percentile(np.asarray(values) * 1000, q)), 1) if values else None
+
+
+def run(sessions: int, duration: float, port: int, ramp: float) -> dict:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP_PATH, "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_ready(port)
+        cpu0, start = _proc_cpu_seconds(server.pid), time.perf_counter()
+        clients = asyncio.run(_drive(port, sessions, duration, ramp))
+        elapsed = time.perf_counter() - start
+        cpu = _proc_cpu_seconds(server.pid) - cpu0
+        rss, peak_rss = _proc_rss_mb(server.pid)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    full = [x for c in clients for x in c.latencies["full"]]
+    poll = [x for c in clients for x in c.latencies["poll"]]
+    return {
+        "sessions": sessions,
+        "duration_s": round(elapsed, 1),
+        "full_reruns": len(full),
+        "full_rerun_p50_ms": _pct(full, 50),
+        "full_rerun_p99_ms": _pct(full, 99),
+        "polls": len(poll),
+        "poll_p50_ms": _pct(poll, 50),
+        "poll_p99_ms": _pct(poll, 99),
+        "script_errors": sum(c.errors for c in clients),
+        "disconnects": sum(c.disconnects for c in clients),
+        "server_cpu_seconds": round(cpu, 1),
+        "server_cpu_cores_avg": round(cpu / elapsed, 2),
+        "server_rss_mb": round(rss, 1),
+        "server_peak_rss_mb": round(peak_rss, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-session load test of the dashboard against a real Streamlit server.")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=90.0, help="Seconds each session stays connected")
+    parser.add_argument("--ramp", type=float, default=10.0, help="Seconds over which sessions connect")
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--output", help="Optional JSON file with the results")
+    args = parser.parse_args()
+
+    result = run(args.sessions, args.duration, args.port, args.ramp)
+    for key, value in result.items():
+        print(f"{key:<24} {value}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
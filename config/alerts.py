@@ -0,0 +1,11 @@
+# Umbrales de Operational Intelligence: una alerta se activa cuando la columna supera el valor
+RULES = {
+    "high_risk": ("Risk_Score", 85),
+    "high_prob": ("Probability_of_Expiration", 75),
+}
+# Log append-only de eventos new/resolved (una línea JSON por evento).
+# Un escritor por log: la página y el productor (--alerts) escriben cada uno el suyo
+ALERT_LOG = 'data/alerts/events.jsonl'
+PRODUCER_ALERT_LOG = 'data/alerts/producer-events.jsonl'
+# Eventos recientes que la página conserva en memoria
+RECENT_EVENTS = 500
@@ -0,0 +1,4 @@
+SNAPSHOT_DIR = 'data/snapshots'
+FORECAST_PATH = 'data/consumption_forecast.parquet'
+# Vida media (días) de la media exponencial del consumo diario por producto
+HALF_LIFE_DAYS = 14
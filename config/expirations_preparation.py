@@ -2,3 +2,8 @@ INPUT_XLSX = 'data/expirations.xlsx'
 SHEET_NAME = 'Sheet1'
 OUTPUT_CLEAN = 'data/expirations_processed.csv'
 OUTPUT_QUALITY_LOG = 'data/data_quality_log.csv'
+
+# Store particionado por mes de caducidad (upserts diarios)
+STORE_DIR = 'data/expirations_store'
+BOOTSTRAP_STORE = True
+DELTA_QUALITY_LOG = 'data/delta_quality_log.csv'
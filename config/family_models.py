@@ -0,0 +1,8 @@
+BUNDLE_DIR = 'data/waste_models'
+# Familia = prefijo de Product_ID (SAL008 → SAL, COF006 → COF)
+FAMILY_PREFIX_LEN = 3
+# Familias con menos filas (o una sola clase) usan el modelo global
+MIN_FAMILY_ROWS = 200
+FAMILY_TREES = 100
+# Bundles versionados conservados en disco
+KEEP_BUNDLES = 3
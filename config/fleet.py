@@ -0,0 +1,9 @@
+# Modo flota: cada estación de catering es un shard con su propio proceso de simulación y scoring
+FLEET_MODE = False
+STATIONS = ["MEX", "CUN", "GDL", "MTY"]
+# Estado inicial: data/stations/<ID>.csv si existe; si no, lotes sintéticos con semilla por estación
+STATION_DATA_DIR = 'data/stations'
+SYNTHETIC_LOTS_PER_STATION = 5000
+# Versiones publicadas como ficheros Arrow IPC (el servidor los mapea en memoria)
+SHARD_DIR = 'data/fleet'
+KEEP_VERSIONS = 3
@@ -0,0 +1,7 @@
+HISTORY_DIR = 'data/history'
+# Snapshot columnar completo cada N ticks; entre medias solo deltas (filas cambiadas)
+FULL_EVERY = 500
+# Pasados N días queda un base por día y los deltas se fusionan en uno por tramo y día
+COMPACT_AFTER_DAYS = 7
+# Ticks entre pasadas de compactación
+COMPACT_EVERY = 200
@@ -0,0 +1,10 @@
+FEED_DIR = 'data/live_feed'
+LIVE_STATE_CSV = 'data/live_warehouse_state.csv'
+# Reloj del simulador (productor) y sondeo de versión en las páginas
+TICK_SECONDS = 20
+POLL_SECONDS = 2
+# Snapshot completo cada N versiones; los deltas anteriores se compactan
+SNAPSHOT_EVERY = 50
+# True: el servidor de Streamlit arranca un único reloj de simulación en segundo plano
+# False: el estado llega de un productor externo (python -m src.live_feed_producer)
+EMBEDDED_CLOCK = True
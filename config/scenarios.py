@@ -0,0 +1,7 @@
+# Rejilla de los sliders de la página Scenarios (mismos pasos que los sliders)
+DELAY_MIN, DELAY_MAX, DELAY_STEP = 0, 48, 2
+CONSUMPTION_MIN, CONSUMPTION_MAX, CONSUMPTION_STEP = 0.5, 2.0, 0.1
+# Versiones (datos × modelo) de rejillas guardadas antes de expulsar la más antigua
+GRID_VERSIONS = 2
+# Por encima de N lotes no se precalcula (400 celdas × N × 2 bytes); la página simula bajo demanda
+GRID_MAX_LOTS = 200_000
@@ -0,0 +1,8 @@
+SNAPSHOT_DIR = 'data/snapshots'
+TRAINING_STORE_DIR = 'data/training_store'
+# Features tomadas N días antes de la caducidad
+LEAD_DAYS = 3
+# Tolerancia del as-of join: snapshot más viejo aceptado antes de la fecha objetivo
+ASOF_TOLERANCE_DAYS = 7
+# Tamaño de ventana (en días de caducidad) procesada en cada pasada
+WINDOW_DAYS = 30
@@ -0,0 +1,19 @@
+# Zonas del almacén: capacidad como fracción de las unidades almacenadas,
+# cadena de frío y rotación (1 = zona de picking rápido, 0 = reserva)
+ZONES = {
+    "A1": {"capacity": 0.10, "cold": False, "rotation": 1.0},
+    "A2": {"capacity": 0.10, "cold": False, "rotation": 0.8},
+    "A3": {"capacity": 0.15, "cold": False, "rotation": 0.6},
+    "B1": {"capacity": 0.15, "cold": True, "rotation": 0.7},
+    "B2": {"capacity": 0.30, "cold": True, "rotation": 0.3},
+    "C1": {"capacity": 0.15, "cold": False, "rotation": 0.2},
+    "C2": {"capacity": 0.15, "cold": False, "rotation": 0.1},
+    "C3": {"capacity": 0.20, "cold": False, "rotation": 0.0},
+}
+# Familias (prefijo de Product_ID) que solo pueden almacenarse en zonas frías
+COLD_CHAIN_PREFIXES = ("SND", "SAL", "CHS")
+# Lotes a ≤ N días de caducar: el frío frena el deterioro (regla de la zona B1)
+COLD_SHORT_DAYS = 3
+COLD_BONUS = 0.5
+# Coste de mover un lote, en unidades de merma esperada evitada
+MOVE_COST = 5.0
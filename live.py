@@ -0,0 +1,123 @@
+from datetime import datetime
+
+import streamlit as st
+
+from config import fleet as fl
+from config import history as hc
+from config import live_feed as lf
+
+from utils.fleet import Fleet
+from utils.history import HistoryStore
+from utils.live_feed import LiveFeedPublisher, LiveFeedSubscriber
+from utils.simulation_clock import SimulationClock, TwinSnapshot, persist_tick
+from utils.warehouse_state import load_warehouse
+
+# Opción del selector de estación para la vista agregada de la flota
+ALL_STATIONS = "All stations"
+
+
+@st.cache_resource
+def live_feed() -> LiveFeedSubscriber:
+    """One subscriber per server: every session reads the same materialized state."""
+    return LiveFeedSubscriber(lf.FEED_DIR)
+
+
+@st.cache_resource
+def simulation_clock() -> SimulationClock | None:
+    """
+    The only simulator of the server: one thread advances the twin on a fixed clock
+    and publishes to the feed; sessions just read its latest immutable snapshot.
+    """
+    if not lf.EMBEDDED_CLOCK:
+        return None
+    publisher = LiveFeedPublisher(lf.FEED_DIR, snapshot_every=lf.SNAPSHOT_EVERY)
+    history = HistoryStore(hc.HISTORY_DIR, hc.FULL_EVERY, hc.COMPACT_AFTER_DAYS, hc.COMPACT_EVERY)
+    return SimulationClock(load_warehouse, lf.TICK_SECONDS, publisher=publisher, on_tick=persist_tick,
+                           history=history).start()
+
+
+@st.cache_resource
+def fleet() -> Fleet | None:
+    """
+    Fleet mode: one worker process per station simulates and scores its shard;
+    the server only keeps their small aggregates and memory-maps the shard files.
+    """
+    if not fl.FLEET_MODE:
+        return None
+    return Fleet(fl.STATIONS, lf.TICK_SECONDS).start()
+
+
+def _changed(state_key: str, version: int) -> bool:
+    changed = st.session_state.get(state_key, version) != version
+    st.session_state[state_key] = version
+    return changed
+
+
+def station_state(station: str, state_key: str) -> tuple[TwinSnapshot | None, bool]:
+    """Like live_state, but for one station of the fleet: only that shard is read."""
+    view = fleet().station(station)
+    if view is None:
+        return None, _changed(state_key, 0)
+    shard, df, index = view
+    return TwinSnapshot(shard.version, shard.taken_at, df, shard.kpis, index), _changed(state_key, shard.version)
+
+
+def fleet_state(state_key: str) -> tuple[Fleet, bool]:
+    """The fleet handle and whether any station published since this session last rendered."""
+    handle = fleet()
+    return handle, _changed(state_key, handle.version)
+
+
+def _latest() -> TwinSnapshot | None:
+    clock = simulation_clock()
+    if clock is not None:
+        snapshot = clock.latest()
+    else:
+        feed = live_feed()
+        feed.poll()
+        df, version, kpis, index, drift, rebinned = feed.view
+        if df is None:
+            return None
+        snapshot = TwinSnapshot(version, datetime.now(), df, kpis, index, drift, rebinned)
+    # Cada sesión recibe su propio objeto: Polars no admite usar el mismo DataFrame desde varios hilos
+    return TwinSnapshot(snapshot.version, snapshot.taken_at, snapshot.frame(), snapshot.kpis, snapshot.index,
+                        snapshot.drift, snapshot.drift_changed)
+
+
+def live_state(state_key: str) -> tuple[TwinSnapshot | None, bool]:
+    """
+    Latest snapshot (frame, KPI margins and expiry index of the same version, or None)
+    and whether it changed since this session last rendered it. When the last tick
+    of the embedded clock failed, a warning says the twin is showing older data.
+    """
+    snapshot = _latest()
+    clock = simulation_clock()
+    if clock is not None and clock.last_error is not None:
+        failed_at, error = clock.last_error
+        st.warning(f"Simulation tick failed at {failed_at:%H:%M:%S} ({error}); showing version "
+                   f"{snapshot.version} until a tick succeeds. See the server log for the traceback.")
+    return snapshot, _changed(state_key, snapshot.version if snapshot is not None else 0)
+
+
+def session_memo(state_key: str, version, compute):
+    """
+    compute() once per `version` for this session. Live fragments rerun on every
+    poll; whatever is derived from the snapshot (predictions, drift, filters)
+    goes through here so an idle poll only re-emits the elements.
+    """
+    memo = st.session_state.get(state_key)
+    if memo is None or memo[0] != version:
+        memo = (version, compute())
+        st.session_state[state_key] = memo
+    return memo[1]
+
+
+def live_fragment(render):
+    """
+    Decorator for the data-dependent sections of a live page (KPIs, charts, tables).
+    The section becomes a fragment that reruns itself every POLL_SECONDS and reads
+    live_state / station_state / fleet_state on its own, so a new version redraws
+    that section only: the rest of the page (nav, theme, page-level widgets) is
+    not rerun. Widgets inside the section also rerun only the section.
+    """
+    return st.fragment(render, run_every=lf.POLL_SECONDS)
@@ -1,6 +1,11 @@
+from functools import lru_cache
+from pathlib import Path
+
 import streamlit as st
 from streamlit_option_menu import option_menu
 
+ASSETS_DIR = Path(__file__).parent / "assets"
+
 
 PAGES = {
     "SmartTwin Warehouse": "app.py",
@@ -9,6 +14,23 @@ PAGES = {
     "Operational Intelligence": "pages/operational-inteligence.py"
 }
 
+@lru_cache(maxsize=None)
+def _asset_text(name: str) -> str:
+    """Static asset read once per process; reruns reuse the cached text."""
+    return (ASSETS_DIR / name).read_text()
+
+
+@lru_cache(maxsize=None)
+def _logo_svg() -> str:
+    # st.image reconoce SVG en texto solo si empieza por <svg: se quita el prólogo XML
+    svg = _asset_text("gategroup.svg")
+    return svg[svg.index("<svg"):]
+
+
+def apply_theme():
+    st.markdown(f"<style>{_asset_text('theme.css')}</style>", unsafe_allow_html=True)
+
+
 def top_nav(
     active: str = "Overview",
     logo_url: str = "https://upload.wikimedia.org/wikipedia/de/d/de/Gategroup_Holding_201x_logo.svg",
@@ -41,8 +63,8 @@ def top_nav(
     left, right = st.columns([1, 3], vertical_alignment="center")
 
     with left:
-        # Usa st.image para evitar problemas de SVG/HTML
-        st.image("assets/gategroup.svg", width=logo_width)
+        # Usa st.image para evitar problemas de SVG/HTML; el SVG se lee una sola vez
+        st.image(_logo_svg(), width=logo_width)
 
     with right:
         st.markdown('<div class="gg-right">', unsafe_allow_html=True)
@@ -1,11 +1,21 @@
-from pathlib import Path
 import streamlit as st
 import polars as pl
 from datetime import datetime
 
-from nav import top_nav
-from utils import predictive_ai
-
+from nav import apply_theme, top_nav
+from utils import predictive_ai, instrumentation
+from utils.instrumentation import span
+from config import alerts as al
+from config.zones import ZONES
+from utils.alerts import AlertEngine, AlertLog
+from utils.expiry_index import ExpiryIndex
+from utils.fefo_planner import KEY_COLS, FefoPlanner
+from utils.kpi_cube import NO_ZONE, KpiCube
+from utils.risk_utils import select_days, snapshot_day
+from utils.slotting import ZoneSlotter
+from utils.synthetic_data import flight_schedule
+
+instrumentation.start_run()
 
 # ---------- NAV ----------
 top_nav(active="Operational Intelligence")
@@ -21,8 +31,7 @@ div.block-container {padding-left: 3rem; padding-right: 3rem;}
 </style>
 """, unsafe_allow_html=True)
 
-theme_path = Path(__file__).parent.parent / "assets" / "theme.css"
-st.markdown(f"<style>{theme_path.read_text()}</style>", unsafe_allow_html=True)
+apply_theme()
 
 # ---------- TITLE ----------
 st.title("Operational Intelligence")
@@ -39,10 +48,58 @@ def load_data():
         df = pl.read_csv("data/expirations_processed.csv")
     return df
 
-df = load_data()
+@st.cache_data(ttl=24*60*60)
+def load_kpis():
+    """KPI cube of the same snapshot, built once per data load."""
+    return KpiCube.from_frame(load_data()).view()
+
+
+@st.cache_resource(ttl=24*60*60)
+def load_active():
+    """Non-expired lots and their expiry index, built once per data load."""
+    df = load_data()
+    df = select_days(df, min_days=0, index=ExpiryIndex.from_frame(df))
+    return df, ExpiryIndex.from_frame(df)
+
+
+# Vuelos simulados del día (no hay feed de vuelos: demanda repartida desde Avg_Usage_per_Day)
+N_FLIGHTS = 24
+
+
+@st.cache_resource(ttl=24*60*60)
+def load_dispatch_plan():
+    """FEFO plan of the day's flights over the active lots, and the allocation per lot."""
+    active, _ = load_active()
+    day = snapshot_day(active)
+    planner = FefoPlanner.from_frame(active)
+    plan = planner.plan(flight_schedule(planner.daily_demand(), N_FLIGHTS, day=day, seed=day.toordinal()), as_of=day)
+    dispatch = plan.by_lot().with_columns(pl.col("Expiry_Date").cast(pl.Utf8))
+    return plan, dispatch
+
+
+@st.cache_resource(ttl=24*60*60)
+def load_slotting():
+    """Zone per active lot (capacity and cold chain aware) and the resulting zone load."""
+    active, _ = load_active()
+    try:
+        active = predictive_ai.predict_probability(active)
+    except:
+        pass
+    slotter = ZoneSlotter()
+    slots = slotter.assign(active).select(KEY_COLS + ["Current_Zone", "Zone", "Move"])
+    return slots.with_columns(pl.col("Current_Zone").fill_null("")), slotter.zone_load()
+
 
-# Exclude expired lots
-df = df.filter(pl.col("Days_to_Expire") >= 0)
+@st.cache_resource
+def alert_engine() -> AlertEngine:
+    """Active alerts shared by every session; transitions go to the append-only log."""
+    return AlertEngine(al.RULES, log=AlertLog(al.ALERT_LOG), recent=al.RECENT_EVENTS)
+
+
+kpis = load_kpis()
+active, index = load_active()
+# Exclude expired lots (copia propia: el frame cacheado lo comparten todas las sesiones)
+df = active.clone()
 
 if df.is_empty():
     st.warning("No active lots in warehouse.")
@@ -60,19 +117,52 @@ except:
 # ==================================================
 st.subheader("Automatic Alerts")
 
-high_risk = df_pred.filter(pl.col("Risk_Score") > 85)
-high_prob = df_pred.filter(pl.col("Probability_of_Expiration") > 75)
+# El motor compartido solo evalúa los lotes que cambiaron desde la última evaluación
+alerts = alert_engine()
+with span("alerts.update", rows=df_pred.height):
+    alerts.update(df_pred)
+active_alerts = alerts.counts()
+n_high_risk, n_high_prob = active_alerts["high_risk"], active_alerts["high_prob"]
 
-if high_risk.is_empty() and high_prob.is_empty():
+if n_high_risk == 0 and n_high_prob == 0:
     st.success("All lots are currently within safe thresholds.")
 else:
-    if not high_risk.is_empty():
-        st.warning(f"{len(high_risk)} lots exceed 85% Risk_Score — immediate attention required.")
-        st.dataframe(high_risk.select(["Product_Name", "LOT_Number", "Days_to_Expire", "Risk_Score"]), use_container_width=True)
+    if n_high_risk:
+        st.warning(f"{n_high_risk} lots exceed 85% Risk_Score — immediate attention required.")
+    if n_high_prob:
+        st.error(f"{n_high_prob} lots have >75% probability of expiration (AI prediction).")
+
+# Solo las transiciones desde el último render de esta sesión
+events = alerts.events_since(st.session_state.get("alerts_seq", 0))
+st.session_state["alerts_seq"] = alerts.seq
+if not events.is_empty():
+    st.caption(f"{events.filter(pl.col('Event') == 'new').height} new · "
+               f"{events.filter(pl.col('Event') == 'resolved').height} resolved since last view")
+    st.dataframe(events.drop("Seq").reverse(), use_container_width=True)
+
+with st.expander(f"Active alerts ({n_high_risk + n_high_prob})"):
+    st.dataframe(alerts.active_frame("high_risk").rename({"Value": "Risk_Score"}), use_container_width=True)
+    st.dataframe(alerts.active_frame("high_prob").rename({"Value": "Probability_of_Expiration"}),
+                 use_container_width=True)
+
+
+# ==================================================
+# DISPATCH PLAN (FEFO)
+# ==================================================
+st.divider()
+st.subheader("Dispatch Plan (FEFO)")
 
-    if not high_prob.is_empty():
-        st.error(f"{len(high_prob)} lots have >75% probability of expiration (AI prediction).")
-        st.dataframe(high_prob.select(["Product_Name", "LOT_Number", "Probability_of_Expiration", "Days_to_Expire"]), use_container_width=True)
+plan, dispatch = load_dispatch_plan()
+# Copias propias de los frames compartidos entre sesiones
+allocations, dispatch = plan.allocations.clone(), dispatch.clone()
+
+c1, c2, c3, c4 = st.columns(4)
+c1.metric("Flights planned", N_FLIGHTS)
+c2.metric("Units allocated", f"{plan.allocated:,}")
+c3.metric("Unfilled demand", f"{plan.demand - plan.allocated:,}")
+c4.metric("Projected waste (units)", f"{plan.projected_waste:,}")
+st.caption(f"Earliest-expiring lots first for the flights of {plan.as_of}; waste projected from daily usage after dispatch.")
+st.dataframe(allocations, use_container_width=True)
 
 
 # ==================================================
@@ -81,28 +171,46 @@ else:
 st.divider()
 st.subheader("Recommended Actions (Next Moves)")
 
-# Define mock zones (simulating warehouse areas)
-ZONES = ["A1", "A2", "A3", "B1", "B2", "C1", "C2", "C3"]
+slots, zone_load = load_slotting()
+slots = slots.clone()
 
 def recommend_action(row):
-    """Simple rule engine for operational decisions."""
-    if row["Risk_Score"] > 90 or row["Probability_of_Expiration"] > 80:
-        return f"🔁 Move lot {row['LOT_Number']} to zone A1 (fast rotation area)"
-    elif row["Risk_Score"] > 70:
-        return f"📦 Prioritize lot {row['LOT_Number']} for next dispatch"
-    elif row["Days_to_Expire"] <= 3:
-        return f"🧊 Store lot {row['LOT_Number']} in cold zone (B1)"
+    """Simple rule engine for operational decisions (dispatches from the FEFO plan, zones from slotting)."""
+    lot, zone = row["LOT_Number"], row["Zone"]
+    if row["Allocated"] > 0:
+        return f"📦 Dispatch {int(row['Allocated'])} units of lot {lot} on flight {row['Dispatch_Flight']}"
+    elif zone == NO_ZONE:
+        return f"⚠️ No zone with free capacity for lot {lot}"
+    elif row["Move"]:
+        return f"🔁 Move lot {lot} from {row['Current_Zone']} to zone {zone}"
+    elif row["Current_Zone"]:
+        return f"✅ Keep lot {lot} in zone {zone}"
+    elif ZONES[zone]["cold"]:
+        return f"🧊 Store lot {lot} in cold zone ({zone})"
+    elif ZONES[zone]["rotation"] >= 0.8:
+        return f"🔁 Move lot {lot} to zone {zone} (fast rotation area)"
     else:
-        return f"✅ Keep lot {row['LOT_Number']} in current zone"
+        return f"📍 Store lot {lot} in zone {zone}"
 
 # Convert to pandas for apply
-df_pd = df_pred.to_pandas()
-df_pd["Suggested_Action"] = df_pd.apply(recommend_action, axis=1)
+df_actions = (
+    df_pred.with_columns(pl.col("Expiry_Date").cast(pl.Utf8))
+    .join(dispatch, on=KEY_COLS, how="left")
+    .join(slots, on=KEY_COLS, how="left")
+    .with_columns(pl.col("Zone").fill_null(NO_ZONE), pl.col("Current_Zone").fill_null(""), pl.col("Move").fill_null(False))
+)
+with span("to_pandas", rows=df_actions.height):
+    df_pd = df_actions.to_pandas()
+with span("recommend_action", rows=len(df_pd)):
+    df_pd["Suggested_Action"] = df_pd.apply(recommend_action, axis=1)
 
 # Show top recommendations
-actions = df_pd[["Product_Name", "LOT_Number", "Days_to_Expire", "Risk_Score", "Probability_of_Expiration", "Suggested_Action"]]
+actions = df_pd[["Product_Name", "LOT_Number", "Days_to_Expire", "Risk_Score", "Probability_of_Expiration", "Zone", "Suggested_Action"]]
 st.dataframe(actions.sort_values(["Risk_Score", "Days_to_Expire"], ascending=[False, True]), use_container_width=True)
 
+with st.expander("Zone load after slotting"):
+    st.dataframe(zone_load.clone(), use_container_width=True)
+
 
 # ==================================================
 # 🧩 DECISION SUMMARY
@@ -111,9 +219,12 @@ st.divider()
 st.subheader("Operational Summary")
 
 col1, col2, col3 = st.columns(3)
-col1.metric("Lots above 85% Risk", len(high_risk))
-col2.metric("Predicted Expiring Lots", len(high_prob))
-col3.metric("Actions Suggested", len(actions))
+# Risk_Score > 85 ⇔ 0-1 días; cada lote activo recibe una acción
+col1.metric("Lots above 85% Risk", kpis.lots(min_days=0, max_days=1))
+col2.metric("Predicted Expiring Lots", n_high_prob)
+col3.metric("Actions Suggested", kpis.lots(min_days=0))
 
 st.caption(f"Last evaluated: {datetime.now():%Y-%m-%d %H:%M:%S}")
 
+instrumentation.render_overlay()
+
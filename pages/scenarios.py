@@ -1,12 +1,15 @@
-from pathlib import Path
 import streamlit as st
 import polars as pl
-import matplotlib.pyplot as plt
 from datetime import datetime
 
-from nav import top_nav
+from nav import apply_theme, top_nav
 from utils import predictive_ai
-from streamlit_autorefresh import st_autorefresh
+from utils import charts, instrumentation
+from utils.expiry_index import ExpiryIndex
+from utils.risk_utils import select_days
+from utils.scenario_grid import ScenarioGridCache
+
+instrumentation.start_run()
 
 # ---------- NAV ----------
 top_nav(active="Scenarios")
@@ -22,8 +25,7 @@ div.block-container {padding-left: 3rem; padding-right: 3rem;}
 </style>
 """, unsafe_allow_html=True)
 
-theme_path = Path(__file__).parent.parent / "assets" / "theme.css"
-st.markdown(f"<style>{theme_path.read_text()}</style>", unsafe_allow_html=True)
+apply_theme()
 
 # ---------- TITLE ----------
 st.title("Simulation Scenarios")
@@ -31,6 +33,17 @@ st.caption("AI-driven risk simulation for flight delays and consumption changes.
 st.divider()
 
 
+@st.cache_resource
+def chart_cache() -> charts.ChartCache:
+    return charts.ChartCache(maxsize=64)
+
+
+@st.cache_resource
+def scenario_grids() -> ScenarioGridCache:
+    """Precomputed scenario grids shared by every session, one per data and model version."""
+    return ScenarioGridCache()
+
+
 # ---------- LOAD DATA ----------
 @st.cache_data(ttl=24*60*60)
 def load_data():
@@ -40,10 +53,15 @@ def load_data():
         df = pl.read_csv("data/expirations_processed.csv")
     return df
 
-df = load_data()
+@st.cache_resource(ttl=24*60*60)
+def load_active():
+    """Non-expired lots, selected once per data load through the expiry index."""
+    df = load_data()
+    return select_days(df, min_days=0, index=ExpiryIndex.from_frame(df))
+
 
 # ---------- FILTER OUT EXPIRED LOTS ----------
-df = df.filter(pl.col("Days_to_Expire") >= 0)
+df = load_active().clone()
 
 if df.is_empty():
     st.warning("No valid lots to simulate. All are expired.")
@@ -72,7 +90,22 @@ st.markdown("""
 # ==================================================
 # RUN AI SIMULATION
 # ==================================================
-if simulate_btn:
+# La rejilla precalculada convierte cada posición de los sliders en una lectura de array
+try:
+    grid = scenario_grids().for_frame(df)
+except FileNotFoundError:
+    grid = None
+cell = grid.lookup(delay, consumption) if grid is not None else None
+
+df_sim = None
+if cell is not None:
+    prob_current, prob_sim = cell
+    df_sim = df.with_columns(
+        pl.Series("Prob_Waste_Current", prob_current),
+        pl.Series("Prob_Waste_Simulated", prob_sim),
+    )
+    st.success(f"Scenario delay={delay}h and consumption×{consumption} served from the precomputed grid")
+elif simulate_btn:
     try:
         df_sim = predictive_ai.simulate_scenario(
             df, delay_hours=delay, consumption_factor=consumption
@@ -83,52 +116,22 @@ if simulate_btn:
 
     st.success(f"Simulation complete — model re-evaluated with delay={delay}h and consumption×{consumption}")
 
+if df_sim is not None:
     # ---- Compute Delta safely in Polars ----
     df_sim = df_sim.with_columns(
         (pl.col("Prob_Waste_Simulated") - pl.col("Prob_Waste_Current")).alias("Delta_Signed")
     )
 
-    # ---- Convert to pandas for plotting ----
-    df_pd = df_sim.to_pandas()
-
     # ==================================================
     # VISUAL COMPARISON
     # ==================================================
     st.divider()
     st.subheader("AI Prediction Comparison (Current vs Scenario)")
 
-    sample = df_pd.sample(min(10, len(df_pd)))
-
-    # ---- Configurar posición desplazada de las barras ----
-    import numpy as np
-    y = np.arange(len(sample))
-    height = 0.35  # grosor de las barras
-
-    fig, ax = plt.subplots(figsize=(8, 5))
-    ax.barh(
-        y - height/2,
-        sample["Prob_Waste_Current"],
-        height=height,
-        label="Current (AI)",
-        alpha=0.85,
-        color="#1f77b4",  # azul
-    )
-    ax.barh(
-        y + height/2,
-        sample["Prob_Waste_Simulated"],
-        height=height,
-        label="Simulated (AI)",
-        alpha=0.85,
-        color="#d62728",  # rojo
-    )
-
-    ax.set_yticks(y)
-    ax.set_yticklabels(sample["Product_Name"])
-    ax.set_xlabel("Predicted Waste Probability (%)")
-    ax.set_title("AI-predicted impact of flight delay or consumption change", fontsize=11, weight="bold")
-    ax.legend()
-    plt.tight_layout()
-    st.pyplot(fig, use_container_width=True)
+    # Lotes más afectados: el gráfico se cachea por (delay, consumo, datos)
+    bars = charts.scenario_bars(df_sim, k=10)
+    st.image(chart_cache().png("scenario_bars", bars, k=10, delay=delay, consumption=consumption),
+             use_container_width=True)
 
 
     # ==================================================
@@ -137,10 +140,11 @@ if simulate_btn:
     st.divider()
     st.subheader("Simulation Summary")
 
+    delta = df_sim["Delta_Signed"]
     colA, colB, colC = st.columns(3)
-    colA.metric("Average Waste Change (%)", f"{df_pd['Delta_Signed'].mean():.2f}")
-    colB.metric("Max Waste Increase (%)", f"{df_pd['Delta_Signed'].max():.2f}")
-    colC.metric("Products Impacted", (df_pd['Delta_Signed'].abs() > 5).sum())
+    colA.metric("Average Waste Change (%)", f"{delta.mean():.2f}")
+    colB.metric("Max Waste Increase (%)", f"{delta.max():.2f}")
+    colC.metric("Products Impacted", (delta.abs() > 5).sum())
 
     # ==================================================
     # TOP IMPACTED PRODUCTS
@@ -148,8 +152,8 @@ if simulate_btn:
     st.markdown("#### Top 15 Most Affected Products")
 
     st.dataframe(
-        df_pd[["Product_Name", "Days_to_Expire", "Prob_Waste_Current", "Prob_Waste_Simulated", "Delta_Signed"]]
-        .sort_values("Delta_Signed", ascending=False)
+        df_sim.select(["Product_Name", "Days_to_Expire", "Prob_Waste_Current", "Prob_Waste_Simulated", "Delta_Signed"])
+        .sort("Delta_Signed", descending=True)
         .head(15),
         use_container_width=True
     )
@@ -158,4 +162,8 @@ if simulate_btn:
 
 else:
     st.info("Adjust the sliders and click **Run Simulation** to see AI-based risk projections.")
+    if grid is not None and grid.error is None:
+        st.caption(f"Precomputing scenario grid: {grid.progress:.0%} ready")
+
+instrumentation.render_overlay()
 
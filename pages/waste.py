@@ -1,16 +1,21 @@
 import os
-import joblib
+import sys
 import streamlit as st
 import polars as pl
 import numpy as np
-import matplotlib.pyplot as plt
 from datetime import datetime
 from nav import top_nav
-from streamlit_autorefresh import st_autorefresh
+from live import live_fragment, live_state, session_memo
+from utils.attribution import FamilyAttributor, TreeAttributor
+from utils.drift_monitor import FeatureSketch, drift_report
+from utils.family_models import current_bundle_path
+from utils.prediction_cache import PredictionCache
+from utils.predictive_ai import load_scoring_model, scoring_model_version
+from utils import charts, instrumentation
+from utils.risk_utils import select_days
 
 
-# ---------- AUTOREFRESH ----------
-st_autorefresh(interval=20_000, key="waste_pred_autorefresh")
+instrumentation.start_run()
 
 # ---------- CONFIG ----------
 st.set_page_config(page_title="Waste Prediction", layout="wide")
@@ -20,6 +25,7 @@ LIVE_DATA_PATH = "data/live_warehouse_state.csv"
 FALLBACK_DATA_PATH = "data/waste_training_history.csv"
 MODEL_PATH = "data/waste_model.pkl"
 LOG_PATH = "data/model_log.txt"
+SKETCH_PATH = "data/training_sketch.json"
 
 # ---------- NAV + STYLES ----------
 top_nav(active="Waste prediction")
@@ -35,64 +41,128 @@ col_train, col_info = st.columns([1, 3])
 with col_train:
     if st.button("Retrain ML model"):
         with st.spinner("Training model, please wait..."):
-            os.system("python daily_train.py")
+            # Como módulo desde la raíz del repo: el script importa config.* y utils.*
+            os.system(f"{sys.executable} -m trainning.daily_train_predict_waste")
         st.success("Model retrained successfully and saved to data/waste_model.pkl 🚀")
         st.cache_resource.clear()
         st.cache_data.clear()
         st.rerun()
 
 # ---------- LOADERS ----------
+def scoring_version() -> str | None:
+    """Version of the model the pages score with (per-family bundle or global .pkl); None when untrained."""
+    try:
+        return scoring_model_version(MODEL_PATH)
+    except FileNotFoundError:
+        return None
+
+
 @st.cache_resource
-def load_model(path: str):
+def load_model(version: str | None):
+    """The per-family bundle when one has been trained, else the global model (one load per version)."""
     try:
-        return joblib.load(path)
+        return load_scoring_model(MODEL_PATH)[0]
     except FileNotFoundError:
         st.error("Model file not found. Please train the model first.")
         return None
 
 
+@st.cache_resource
+def load_attributor(version: str | None) -> TreeAttributor | FamilyAttributor | None:
+    """Per-node contribution tables of the forest(s), built once per model version."""
+    model = load_model(version)
+    try:
+        if hasattr(model, "models"):
+            return FamilyAttributor(model)
+        return TreeAttributor(model) if model is not None else None
+    except ValueError:
+        return None
+
+
 @st.cache_data
-def load_data() -> pl.DataFrame | None:
-    """Load live or fallback dataset using Polars."""
+def load_data() -> tuple[pl.DataFrame | None, tuple[str, str]]:
+    """Load live or fallback dataset using Polars; returns it with the (level, text) notice to show."""
     if os.path.exists(LIVE_DATA_PATH):
-        st.info("Using live warehouse data feed.")
-        df = pl.read_csv(LIVE_DATA_PATH)
-    elif os.path.exists(FALLBACK_DATA_PATH):
-        st.warning("Live warehouse data not found, using last training dataset.")
-        df = pl.read_csv(FALLBACK_DATA_PATH)
-    else:
-        st.error("No data file found.")
-        return None
-    return df
+        return pl.read_csv(LIVE_DATA_PATH), ("info", "Using live warehouse data feed.")
+    if os.path.exists(FALLBACK_DATA_PATH):
+        return pl.read_csv(FALLBACK_DATA_PATH), ("warning", "Live warehouse data not found, using last training dataset.")
+    return None, ("error", "No data file found.")
+
+
+@st.cache_resource
+def load_training_sketch(path: str) -> FeatureSketch | None:
+    """Reference distribution written at training time (built from the history CSV if missing)."""
+    if os.path.exists(path):
+        return FeatureSketch.from_json(path)
+    if os.path.exists(FALLBACK_DATA_PATH):
+        return FeatureSketch.from_frame(pl.read_csv(FALLBACK_DATA_PATH))
+    return None
+
+
+@st.cache_resource
+def chart_cache() -> charts.ChartCache:
+    return charts.ChartCache(maxsize=64)
+
+
+@st.cache_resource
+def prediction_cache() -> PredictionCache:
+    """Shared across sessions; entries are keyed by model version, so retraining never serves stale scores."""
+    return PredictionCache(maxsize=200_000)
 
 
 # ---------- MODEL + DATA ----------
-model = load_model(MODEL_PATH)
-df = load_data()
+KEY_COLS = ["Product_ID", "LOT_Number", "Expiry_Date"]
+required_cols = ["Quantity", "Days_to_Expire", "Avg_Usage_per_Day", "Risk"]
+version = scoring_version()
+model = load_model(version)
+
+
+def analyse(snapshot) -> dict:
+    """Everything the page derives from one data version: filtered lots, predictions, drift, explanations."""
+    if snapshot is not None:
+        df, index, notice = snapshot.df, snapshot.index, ("info", "Using live warehouse data feed.")
+    else:
+        (df, notice), index = load_data(), None
+    result = {"notice": notice, "df": None, "live_sketch": None}
+    if df is None:
+        return result
 
-if df is not None:
     # --- Filter only items not expired ---
-    df = df.filter(pl.col("Days_to_Expire") > 0)
+    df = select_days(df, min_days=1, index=index)
     if df.height == 0:
-        st.warning("No products with positive days to expire.")
-        st.stop()
+        result["df"] = df
+        return result
 
     # --- Ensure required columns exist ---
-    required_cols = ["Quantity", "Days_to_Expire", "Avg_Usage_per_Day", "Risk"]
+    # The live feed exposes the risk as Risk_Score (same rule as utils/predictive_ai)
+    if "Risk" not in df.columns and "Risk_Score" in df.columns:
+        df = df.with_columns(pl.col("Risk_Score").cast(pl.Float64).alias("Risk"))
+
+    imputed_cols = []
     for col in required_cols:
         if col not in df.columns:
+            imputed_cols.append(col)
             if col == "Avg_Usage_per_Day":
                 df = df.with_columns(pl.Series(col, np.random.uniform(1, 10, df.height)))
             else:
                 df = df.with_columns(pl.Series(col, np.random.randint(1, 600, df.height)))
+    result["imputed_cols"] = imputed_cols
+
+    # --- Drift: the live sketch comes with the snapshot, updated by the producer from each delta ---
+    train_sketch = load_training_sketch(SKETCH_PATH)
+    if snapshot is not None and snapshot.drift is not None:
+        live_sketch, rebinned = snapshot.drift, snapshot.drift_changed
+    else:
+        # Datos diarios (sin feed): un solo binning por versión de datos
+        live_sketch, rebinned = FeatureSketch.from_frame(df), df.height
+    result["live_sketch"] = live_sketch
+    result["rebinned"] = rebinned
+    if train_sketch is not None:
+        result["drift"] = drift_report(train_sketch, live_sketch)
 
     # --- Predict probabilities ---
-    X = df.select(["Quantity", "Days_to_Expire", "Avg_Usage_per_Day", "Risk"]).to_numpy()
-    probs = model.predict_proba(X)[:, 1] * 100
+    probs = prediction_cache().predict(model, version, df, KEY_COLS, required_cols) * 100
     df = df.with_columns(pl.Series("Prob_Waste", probs))
-
-    # --- Display results ---
-    st.subheader("Waste Prediction")
     top_waste = df.sort("Prob_Waste", descending=True).head(10)
 
     # Choose best label column
@@ -102,6 +172,46 @@ if df is not None:
     elif "Product_ID" in df.columns:
         label_col = "Product_ID"
 
+    # --- Per-lot explanations: path contributions of the forest, cached with the predictions ---
+    attributor = load_attributor(version)
+    contribs = None
+    if attributor is not None:
+        contribs = prediction_cache().explain(
+            attributor, version, top_waste, KEY_COLS, required_cols
+        ) * 100
+
+    result.update(df=df, top_waste=top_waste, top_chart=charts.top_waste(df, label_col, k=10),
+                  attributor=attributor, contribs=contribs)
+    return result
+
+
+def current_analysis() -> dict:
+    # Las dos secciones vivas comparten el análisis de la sesión: se calcula una vez por versión de datos y modelo
+    snapshot, _ = live_state("waste_feed_version")
+    data_version = snapshot.version if snapshot is not None else "file"
+    return session_memo("waste_analysis", (data_version, version), lambda: analyse(snapshot))
+
+
+@live_fragment
+def waste_section():
+    result = current_analysis()
+    level, text = result["notice"]
+    getattr(st, level)(text)
+    df = result["df"]
+    if df is None:
+        return
+    if df.height == 0:
+        st.warning("No products with positive days to expire.")
+        st.stop()
+
+    if result["imputed_cols"]:
+        st.warning(f"Missing features filled with random values: {', '.join(result['imputed_cols'])}. "
+                   "Predictions and drift scores for them are not meaningful.")
+
+    # --- Display results ---
+    st.subheader("Waste Prediction")
+    top_waste = result["top_waste"]
+
     # --- Display table ---
     display_cols = [c for c in ["Product_Name", "Product_ID", "LOT_Number", "Days_to_Expire", "Quantity", "Prob_Waste"] if c in df.columns]
     for must in ["Days_to_Expire", "Prob_Waste"]:
@@ -114,17 +224,48 @@ if df is not None:
 
     # --- Chart ---
     with col2:
-        fig, ax = plt.subplots()
-        labels = (
-            top_waste[label_col].to_list()
-            if label_col is not None
-            else [f"idx {i}" for i in range(top_waste.height)]
+        st.image(chart_cache().png("top_waste", result["top_chart"], k=10))
+
+    attributor, contribs = result["attributor"], result["contribs"]
+    if attributor is not None:
+        st.markdown("#### Why these lots are flagged")
+        if isinstance(attributor, FamilyAttributor):
+            st.caption(f"Contribution of each feature to the waste probability, in percentage points over the "
+                       f"base rate of the family model that scored each lot (global model: {attributor.bias * 100:.1f}%).")
+        else:
+            st.caption(f"Contribution of each feature to the waste probability, in percentage points "
+                       f"over the model's base rate of {attributor.bias * 100:.1f}%.")
+        explain_cols = [c for c in ["Product_Name", "Product_ID", "LOT_Number", "Prob_Waste"] if c in top_waste.columns]
+        st.dataframe(
+            top_waste.select(explain_cols).with_columns(
+                [pl.Series(f"{feat} (pp)", contribs[:, i]).round(1) for i, feat in enumerate(required_cols)]
+            ),
+            use_container_width=True, hide_index=True,
         )
-        ax.barh(labels, top_waste["Prob_Waste"].to_list(), color="#E2001A")
-        ax.set_xlabel("Waste probability (%)")
-        ax.set_title("Top lots at highest risk of waste")
-        plt.gca().invert_yaxis()
-        st.pyplot(fig)
+
+
+@live_fragment
+def model_health():
+    result = current_analysis()
+
+    # --- Feature drift (training vs live) ---
+    report = result.get("drift")
+    if result["df"] is not None and report is not None:
+        st.markdown("#### Feature drift (training vs live)")
+        d1, d2 = st.columns([1, 3])
+        d1.metric("Max PSI", f"{report['PSI'].max():.3f}")
+        d1.caption(f"Lots re-binned for this version: {result['rebinned']}")
+        d2.dataframe(report.to_pandas(), use_container_width=True, hide_index=True)
+
+    # --- Prediction cache ---
+    cache_stats = prediction_cache().stats()
+    p1, p2, p3 = st.columns(3)
+    p1.metric("Prediction cache hit ratio", f"{cache_stats['hit_ratio']:.1%}")
+    p2.metric("Cached lots", f"{cache_stats['size']:,}")
+    p3.metric("Inference time saved", f"{cache_stats['saved_seconds'] * 1000:.0f} ms")
+
+
+waste_section()
 
 # ---------- MODEL INFO PANEL ----------
 if model is not None:
@@ -145,18 +286,28 @@ if model is not None:
         else:
             last_train_str = "No record found"
 
+    # Con bundle por familia se describe el bundle; las importancias son las del modelo global
+    bundle_path = current_bundle_path() if hasattr(model, "models") else None
+    global_model = model.global_model if bundle_path is not None else model
+
     c1, c2, c3 = st.columns(3)
-    c1.metric("Model file", MODEL_PATH)
+    c1.metric("Model file", str(bundle_path or MODEL_PATH))
     c2.metric("Last training", last_train_str)
-    c3.metric("Model type", type(model).__name__)
+    c3.metric("Model type", f"{type(global_model).__name__} + {len(model.models)} family models"
+              if bundle_path is not None else type(model).__name__)
 
     # --- Feature importances ---
     expected_feats = ["Quantity", "Days_to_Expire", "Avg_Usage_per_Day", "Risk"]
-    if hasattr(model, "feature_importances_") and len(model.feature_importances_) == len(expected_feats):
+    if hasattr(global_model, "feature_importances_") and len(global_model.feature_importances_) == len(expected_feats):
         fi_df = pl.DataFrame({
             "Feature": expected_feats,
-            "Importance": model.feature_importances_
+            "Importance": global_model.feature_importances_
         }).sort("Importance", descending=True)
         st.bar_chart(fi_df.to_pandas().set_index("Feature"))
 
+    # --- Drift and prediction cache: live, like the predictions above ---
+    model_health()
+
     st.divider()
+
+instrumentation.render_overlay()
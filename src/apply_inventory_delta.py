@@ -0,0 +1,47 @@
+import argparse
+import os
+
+import pandas as pd # importado para leer xlsx
+import polars as pl
+
+from config import expirations_preparation as ep
+from utils.prepare_lots import BASE_COLS, normalize_lots, split_quality
+from utils.upsert_lots import export_processed, upsert_delta
+
+
+def read_delta(path: str) -> pl.DataFrame:
+    """Read a delta file (.xlsx or .csv) keeping every column as raw text."""
+    if path.endswith((".xlsx", ".xls")):
+        return pl.from_pandas(pd.read_excel(path, dtype=str))
+    return pl.read_csv(path, infer_schema=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply a daily inventory delta to the partitioned lot store.")
+    parser.add_argument("delta", help="CSV/XLSX with new, changed or deleted lots (optional Action column)")
+    parser.add_argument("--store", default=ep.STORE_DIR)
+    parser.add_argument("--export", action="store_true",
+                        help=f"Refresh {ep.OUTPUT_CLEAN} from the store after merging")
+    args = parser.parse_args()
+
+    # --- Misma limpieza que data_preparation, pero solo sobre el delta ---
+    # Un delta de updates/deletes puede traer solo la clave (y Quantity): el resto de columnas llega nulo
+    delta = read_delta(args.delta)
+    delta = delta.with_columns([pl.lit(None, dtype=pl.Utf8).alias(c) for c in BASE_COLS if c not in delta.columns])
+    # Product_ID y fecha son obligatorios; los inserts sin nombre se rechazan después, en el merge
+    delta, quality_log = split_quality(normalize_lots(delta), required=["Product_ID", "Expiry_Date"])
+    if quality_log.height > 0:
+        write_header = not os.path.exists(ep.DELTA_QUALITY_LOG)
+        with open(ep.DELTA_QUALITY_LOG, "a") as f:
+            quality_log.drop("Action", strict=False).write_csv(f, include_header=write_header)
+
+    stats = upsert_delta(delta, args.store)
+    print(f"Delta aplicado → {args.store}: {stats}")
+
+    if args.export:
+        export_processed(args.store, ep.OUTPUT_CLEAN)
+        print(f"Datos limpios → {ep.OUTPUT_CLEAN}")
+
+
+if __name__ == "__main__":
+    main()
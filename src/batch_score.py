@@ -0,0 +1,155 @@
+import argparse
+import multiprocessing as mp
+import os
+import time
+from collections import deque
+from pathlib import Path
+
+import joblib
+import polars as pl
+
+from utils.lot_store import KEY_COLS, SharedLotStore, attach
+from utils.predictive_ai import load_scoring_model, predict_waste, score_lots
+from utils.risk_utils import recalc_risk
+
+MODEL_PATH = "data/waste_model.pkl"
+
+# Modelo compartido: con fork los workers lo heredan copy-on-write del proceso padre
+_MODEL = None
+
+
+def _load(model_path: str | None):
+    """--model given: that forest (memory-mapped); otherwise the per-family bundle when trained, as the pages use."""
+    if model_path is not None:
+        return joblib.load(model_path, mmap_mode="r")
+    return load_scoring_model(MODEL_PATH)[0]
+
+
+def _init_worker(model_path: str | None) -> None:
+    """Only loads the model when it was not inherited (spawn/forkserver start methods)."""
+    global _MODEL
+    if _MODEL is None:
+        _MODEL = _load(model_path)
+    # Un hilo por proceso: el paralelismo lo da el pool
+    models = [_MODEL.global_model, *_MODEL.models.values()] if hasattr(_MODEL, "models") else [_MODEL]
+    for model in models:
+        if hasattr(model, "n_jobs"):
+            model.n_jobs = 1
+
+
+def _score_chunk(chunk: pl.DataFrame) -> pl.DataFrame:
+    return score_lots(_MODEL, chunk)
+
+
+def _score_shared(store: str, generation: int, features: list[str]):
+    """Worker side of --shared-memory: attach the chunk by name, return only the probabilities."""
+    with attach(store, generation) as view:
+        return predict_waste(_MODEL, view.frame(), features) * 100
+
+
+def _features(chunk: pl.DataFrame) -> list[str]:
+    risk_col = "Risk_Score" if "Risk_Score" in chunk.columns else "Risk"
+    return ["Quantity", "Days_to_Expire", "Avg_Usage_per_Day", risk_col]
+
+
+def read_chunks(path: str, chunk_size: int):
+    """Stream a CSV or Parquet file (or a directory of Parquet parts) in fixed-size chunks."""
+    if os.path.isdir(path):
+        lf = pl.scan_parquet(str(Path(path) / "*.parquet"))
+    elif path.endswith(".parquet"):
+        lf = pl.scan_parquet(path)
+    else:
+        lf = pl.scan_csv(path, infer_schema_length=10_000)
+    return lf.collect_batches(chunk_size=chunk_size)
+
+
+class ChunkWriter:
+    """A single CSV appended chunk by chunk, or a directory of Parquet parts."""
+
+    def __init__(self, output: str):
+        self.output = output
+        self.as_csv = output.endswith(".csv")
+        self.parts = 0
+        if self.as_csv:
+            self._file = open(output, "w")
+        else:
+            os.makedirs(output, exist_ok=True)
+
+    def write(self, chunk: pl.DataFrame) -> None:
+        if self.as_csv:
+            chunk.write_csv(self._file, include_header=(self.parts == 0))
+        else:
+            chunk.write_parquet(Path(self.output) / f"part-{self.parts:05d}.parquet")
+        self.parts += 1
+
+    def close(self) -> None:
+        if self.as_csv:
+            self._file.close()
+
+
+def main():
+    global _MODEL
+    parser = argparse.ArgumentParser(description="Score a large lot file with the waste model, outside the UI.")
+    parser.add_argument("input", help="CSV, Parquet file or directory of Parquet parts")
+    parser.add_argument("output", help="Output .csv file, or a directory for Parquet parts")
+    parser.add_argument("--model", help=f"Model .pkl (default: the per-family bundle when trained, else {MODEL_PATH})")
+    parser.add_argument("--chunk-size", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shared-memory", action="store_true",
+                        help="Hand chunks to the workers through a shared-memory lot store instead of pickling them")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+    if ctx.get_start_method() == "fork":
+        _MODEL = _load(args.model)
+
+    writer = ChunkWriter(args.output)
+    rows = 0
+    start = time.perf_counter()
+    # Como máximo 2 chunks en vuelo por worker: memoria acotada y salida en orden
+    max_in_flight = 2 * args.workers
+    # Con --shared-memory cada chunk es una generación del store; se conservan las que siguen en vuelo
+    store = SharedLotStore(keep=max_in_flight + 1, numeric=None) if args.shared_memory else None
+
+    def submit(pool, chunk):
+        if store is None:
+            return pool.apply_async(_score_chunk, (chunk,)), None
+        if "Expiry_Date" in chunk.columns:
+            chunk = recalc_risk(chunk)
+        features = _features(chunk)
+        missing = [c for c in features if c not in chunk.columns]
+        if missing:
+            raise ValueError(f"Missing required feature: {missing}")
+        generation = store.publish(chunk.select(features + [c for c in KEY_COLS if c in chunk.columns]))
+        return pool.apply_async(_score_shared, (store.name, generation, features)), chunk
+
+    def collect(task) -> pl.DataFrame:
+        result, chunk = task
+        if chunk is None:
+            return result.get()
+        return chunk.with_columns(pl.Series("Probability_of_Expiration", result.get()).round(2))
+
+    try:
+        with ctx.Pool(args.workers, initializer=_init_worker, initargs=(args.model,)) as pool:
+            pending = deque()
+            for chunk in read_chunks(args.input, args.chunk_size):
+                pending.append(submit(pool, chunk))
+                while len(pending) >= max_in_flight:
+                    scored = collect(pending.popleft())
+                    writer.write(scored)
+                    rows += scored.height
+            while pending:
+                scored = collect(pending.popleft())
+                writer.write(scored)
+                rows += scored.height
+    finally:
+        if store is not None:
+            store.close()
+    writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"{rows:,} lotes puntuados → {args.output} en {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} lotes/s)")
+
+
+if __name__ == "__main__":
+    main()
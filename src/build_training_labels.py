@@ -0,0 +1,23 @@
+import argparse
+
+from config import training_labels as tl
+from utils.training_labels import update_training_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append Waste_Label rows for lots that expired since the last run.")
+    parser.add_argument("--snapshots", default=tl.SNAPSHOT_DIR)
+    parser.add_argument("--store", default=tl.TRAINING_STORE_DIR)
+    parser.add_argument("--lead-days", type=int, default=tl.LEAD_DAYS)
+    parser.add_argument("--tolerance-days", type=int, default=tl.ASOF_TOLERANCE_DAYS)
+    parser.add_argument("--window-days", type=int, default=tl.WINDOW_DAYS)
+    args = parser.parse_args()
+
+    written = update_training_store(
+        args.snapshots, args.store, args.lead_days, args.tolerance_days, args.window_days
+    )
+    print(f"Etiquetas nuevas → {args.store}: {written}")
+
+
+if __name__ == "__main__":
+    main()
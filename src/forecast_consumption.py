@@ -0,0 +1,30 @@
+import argparse
+import time
+
+import polars as pl
+
+from config import consumption_forecast as cf
+from utils.consumption_forecast import apply_usage, update_forecast
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update per-product consumption rates from the snapshots taken since the last run.")
+    parser.add_argument("--snapshots", default=cf.SNAPSHOT_DIR)
+    parser.add_argument("--forecast", default=cf.FORECAST_PATH)
+    parser.add_argument("--half-life-days", type=float, default=cf.HALF_LIFE_DAYS)
+    parser.add_argument("--apply", nargs="*", default=[], metavar="CSV",
+                        help="Lot CSVs whose Avg_Usage_per_Day is rewritten with the forecast")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rates = update_forecast(args.snapshots, args.forecast, args.half_life_days)
+    print(f"{rates.height:,} productos → {args.forecast} en {time.perf_counter() - start:.1f}s "
+          f"(hasta {rates['Rate_Date'].max()})")
+
+    for path in args.apply:
+        apply_usage(pl.read_csv(path), rates).write_csv(path)
+        print(f"Avg_Usage_per_Day actualizado → {path}")
+
+
+if __name__ == "__main__":
+    main()
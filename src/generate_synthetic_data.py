@@ -0,0 +1,36 @@
+import argparse
+import time
+from datetime import date
+
+from utils.synthetic_data import KINDS, iter_chunks, write_chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate seeded synthetic warehouses or training histories.")
+    parser.add_argument("kind", choices=KINDS,
+                        help="raw = expirations.xlsx layout, processed = expirations_processed + Risk_Score, "
+                             "training = waste_training_history layout")
+    parser.add_argument("rows", type=float, help="Number of lots, e.g. 1e6")
+    parser.add_argument("output", help="Directory of part files (parquet) or a single .csv file")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--products", type=int, default=10, help="Catalog size (variants of the 10 base products)")
+    parser.add_argument("--dirty-rate", type=float, default=0.0, help="Share of rows per dirty-data issue (raw only)")
+    parser.add_argument("--label-noise", type=float, default=0.0, help="Share of flipped Waste_Label (training only)")
+    parser.add_argument("--today", type=date.fromisoformat, default=None,
+                        help="Reference date (YYYY-MM-DD) for expiry dates and Days_to_Expire; default: today")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    chunks = iter_chunks(
+        args.kind, int(args.rows), chunk_size=args.chunk_size, seed=args.seed, n_products=args.products,
+        dirty_rate=args.dirty_rate, label_noise=args.label_noise, today=args.today,
+    )
+    rows = write_chunks(chunks, args.output, args.format)
+    elapsed = time.perf_counter() - start
+    print(f"{rows:,} filas ({args.kind}) → {args.output} en {elapsed:.1f}s ({rows / elapsed:,.0f} filas/s)")
+
+
+if __name__ == "__main__":
+    main()
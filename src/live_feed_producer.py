@@ -0,0 +1,48 @@
+import argparse
+
+from config import alerts as al
+from config import history as hc
+from config import live_feed as lf
+from utils.alerts import AlertEngine, AlertLog
+from utils.history import HistoryStore
+from utils.live_feed import LiveFeedPublisher
+from utils.simulation_clock import SimulationClock, persist_tick
+from utils.warehouse_state import load_warehouse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single producer of live warehouse updates for every dashboard session.")
+    parser.add_argument("--feed-dir", default=lf.FEED_DIR)
+    parser.add_argument("--tick", type=float, default=lf.TICK_SECONDS, help="Seconds between simulation ticks")
+    parser.add_argument("--ticks", type=int, default=0, help="Stop after N ticks (0 = run forever)")
+    parser.add_argument("--alerts", action="store_true",
+                        help=f"Evaluate alert thresholds over each tick's changed lots and append events to {al.PRODUCER_ALERT_LOG}")
+    args = parser.parse_args()
+
+    # Mismo reloj que el servidor embebido; usar con EMBEDDED_CLOCK = False para no simular dos veces
+    publisher = LiveFeedPublisher(args.feed_dir, snapshot_every=lf.SNAPSHOT_EVERY)
+    alerts = AlertEngine(al.RULES, log=AlertLog(al.PRODUCER_ALERT_LOG)) if args.alerts else None
+
+    def log_tick(df):
+        persist_tick(df)
+        msg = f"v{publisher.version}: {df.height} lotes"
+        if alerts is not None:
+            # Solo las filas del delta publicado: las alertas persistentes no cuestan nada
+            events = alerts.apply(publisher.last_upserts, publisher.last_deletes)
+            msg += f" · alertas +{sum(e['Event'] == 'new' for e in events)} -{sum(e['Event'] == 'resolved' for e in events)}"
+        print(msg, flush=True)
+
+    history = HistoryStore(hc.HISTORY_DIR, hc.FULL_EVERY, hc.COMPACT_AFTER_DAYS, hc.COMPACT_EVERY)
+    clock = SimulationClock(load_warehouse, args.tick, publisher=publisher, on_tick=log_tick, history=history)
+    if alerts is not None:
+        # Estado completo inicial: resuelve las alertas restauradas cuyo lote ya no existe
+        alerts.update(clock.latest().df)
+    print(f"Feed inicial v{clock.latest().version} → {args.feed_dir} ({clock.latest().df.height} lotes)", flush=True)
+    try:
+        clock.run(max_ticks=args.ticks)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
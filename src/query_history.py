@@ -0,0 +1,38 @@
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from config import history as hc
+from utils.history import HistoryStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warehouse state as of any past moment, rebuilt from the tick history.")
+    parser.add_argument("as_of", type=datetime.fromisoformat, help="Timestamp, e.g. 2026-10-12T08:00")
+    parser.add_argument("output", nargs="?", help="CSV or .parquet output (summary only when omitted)")
+    parser.add_argument("--history-dir", default=hc.HISTORY_DIR)
+    parser.add_argument("--compact", action="store_true",
+                        help=f"First merge deltas older than {hc.COMPACT_AFTER_DAYS} days into one per day")
+    args = parser.parse_args()
+
+    store = HistoryStore(args.history_dir, compact_every=0)
+    if args.compact:
+        removed = store.compact(datetime.now() - timedelta(days=hc.COMPACT_AFTER_DAYS))
+        print(f"Compactación: {removed} deltas fusionados")
+
+    start = time.perf_counter()
+    state = store.as_of(args.as_of)
+    elapsed = time.perf_counter() - start
+    if state is None:
+        raise SystemExit(f"No hay historia anterior a {args.as_of}")
+
+    print(f"Estado a {args.as_of}: {state.height} lotes en {elapsed * 1000:.0f} ms")
+    if args.output:
+        if args.output.endswith(".parquet"):
+            state.write_parquet(args.output)
+        else:
+            state.write_csv(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import json
+import logging
+
+from utils.micro_batcher import MicroBatcher
+from utils.prediction_cache import model_version
+from utils.predictive_ai import load_scoring_model
+
+log = logging.getLogger(__name__)
+
+MODEL_PATH = "data/waste_model.pkl"
+FEATURES = ["Quantity", "Days_to_Expire", "Avg_Usage_per_Day", "Risk"]
+
+
+def _features(lot: dict) -> list[float]:
+    """Feature vector in training order; Risk_Score is accepted as an alias of Risk."""
+    if "Risk" not in lot and "Risk_Score" in lot:
+        lot = {**lot, "Risk": lot["Risk_Score"]}
+    missing = [f for f in FEATURES if f not in lot]
+    if missing:
+        raise ValueError(f"Missing required feature: {missing}")
+    return [float(lot[f]) for f in FEATURES]
+
+
+def _product_id(lot: dict) -> str | None:
+    """Routes the lot to its family model when the service runs a per-family bundle."""
+    product_id = lot.get("Product_ID")
+    return None if product_id is None else str(product_id)
+
+
+def _response(status: str, payload: dict, keep_alive: bool) -> bytes:
+    body = json.dumps(payload).encode()
+    headers = (
+        f"HTTP/1.1 {status}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return headers.encode() + body
+
+
+class ScoringService:
+    """
+    Minimal HTTP/1.1 server (stdlib asyncio, keep-alive) in front of a MicroBatcher.
+
+    POST /score  {"Quantity": .., "Days_to_Expire": .., "Avg_Usage_per_Day": .., "Risk": ..,
+                  "Product_ID": .. (optional, picks the family model)}
+                 → {"Probability_of_Expiration": 12.5}
+                 or {"lots": [{...}, ...]} → {"Probability_of_Expiration": [..]}
+    GET  /health → model version and batching counters
+
+    Malformed requests get a 400; a scoring failure gets a 500 and the connection stays usable.
+    """
+
+    def __init__(self, model, max_batch: int, max_wait_ms: float, threads: int, version: str = ""):
+        self.version = version
+        self.batcher = MicroBatcher(model, max_batch=max_batch, max_wait_ms=max_wait_ms, threads=threads)
+
+    async def _score(self, payload: dict) -> dict:
+        if "lots" in payload:
+            lots = [(_features(lot), _product_id(lot)) for lot in payload["lots"]]
+            probs = await asyncio.gather(*(self.batcher.predict(x, product_id) for x, product_id in lots))
+            return {"Probability_of_Expiration": [round(p * 100, 2) for p in probs]}
+        prob = await self.batcher.predict(_features(payload), _product_id(payload))
+        return {"Probability_of_Expiration": round(prob * 100, 2)}
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> tuple[str, str, dict, bytes] | None:
+        """(method, path, headers, body) of the next request, None at EOF; ValueError when malformed."""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, path, _ = request_line.decode().split(" ", 2)
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length < 0:
+            raise ValueError(f"Invalid Content-Length: {length}")
+        return method, path, headers, await reader.readexactly(length)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except ValueError as exc:
+                    # Petición mal formada: 400 y se cierra, el stream ya no está alineado
+                    writer.write(_response("400 Bad Request", {"error": f"Malformed request: {exc}"}, False))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "keep-alive").lower() != "close"
+
+                if method == "GET" and path == "/health":
+                    response = _response("200 OK", {"status": "ok", "model_version": self.version,
+                                                    "batches": self.batcher.batches,
+                                                    "rows": self.batcher.rows}, keep_alive)
+                elif method == "POST" and path == "/score":
+                    try:
+                        response = _response("200 OK", await self._score(json.loads(body)), keep_alive)
+                    except (ValueError, TypeError, KeyError) as exc:
+                        response = _response("400 Bad Request", {"error": str(exc)}, keep_alive)
+                    except Exception as exc:
+                        # Fallo del modelo: 500 en la misma conexión en vez de cortarla
+                        log.exception("Scoring failed")
+                        response = _response("500 Internal Server Error",
+                                             {"error": f"{type(exc).__name__}: {exc}"}, keep_alive)
+                else:
+                    response = _response("404 Not Found", {"error": f"{method} {path}"}, keep_alive)
+
+                writer.write(response)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int) -> None:
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        print(f"Scoring service on http://{host}:{port} (model {self.version}, max_batch={self.batcher.max_batch}, "
+              f"max_wait={self.batcher.max_wait * 1000:.1f} ms)", flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP scoring service with request micro-batching.")
+    parser.add_argument("--model", help=f"Model .pkl (default: the per-family bundle when trained, else {MODEL_PATH})")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--max-wait-ms", type=float, default=3.0)
+    parser.add_argument("--threads", type=int, default=2, help="Inference threads")
+    args = parser.parse_args()
+
+    # El modelo se carga una sola vez para toda la vida del servicio: el bundle por familia si existe
+    if args.model is not None:
+        import joblib
+
+        model, version = joblib.load(args.model), model_version(args.model)
+    else:
+        model, version = load_scoring_model(MODEL_PATH)
+    service = ScoringService(model, args.max_batch, args.max_wait_ms, args.threads, version=version)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -35,7 +35,7 @@ fi
 MODEL_PATH="data/waste_model.pkl"
 if [ ! -f "$MODEL_PATH" ]; then
   echo "No existing model found. Running initial training..."
-  uv run python trainning/daily_train_predict_waste.py
+  uv run python -m trainning.daily_train_predict_waste
 else
   echo "Existing model detected at $MODEL_PATH"
 fi
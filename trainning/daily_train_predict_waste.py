@@ -1,58 +1,99 @@
+import numpy as np
 import polars as pl
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report
 import joblib
+import os
 from datetime import datetime
 
+from config.training_labels import TRAINING_STORE_DIR
+from utils.training_labels import scan_training_store
+from utils.drift_monitor import FeatureSketch
+from utils.family_models import save_bundle, train_family_models
+
 # --- Rutas ---
 DATA_PATH = "data/waste_training_history.csv"
 MODEL_PATH = "data/waste_model.pkl"
 LOG_PATH = "data/model_log.txt"
+SKETCH_PATH = "data/training_sketch.json"
+
+# --- Features del modelo ---
+FEATURES = ["Quantity", "Days_to_Expire", "Avg_Usage_per_Day", "Risk"]
+
+
+def main():
+    # --- Cargar dataset ---
+    df = pl.read_csv(DATA_PATH)
+
+    required = ["Quantity", "Days_to_Expire", "Avg_Usage_per_Day", "Risk", "Waste_Label"]
+    missing = [c for c in required if c not in df.columns]
+    if missing:
+        raise ValueError(f"Faltan columnas en {DATA_PATH}: {missing}")
+
+    # --- Etiquetas reales derivadas de los snapshots (src/build_training_labels.py) ---
+    if os.path.isdir(TRAINING_STORE_DIR) and any(f.endswith(".parquet") for f in os.listdir(TRAINING_STORE_DIR)):
+        # Product_ID se conserva (si existe) para los modelos por familia
+        cols = (["Product_ID"] if "Product_ID" in df.columns else []) + required
+        real = scan_training_store(TRAINING_STORE_DIR).select(cols).collect()
+        df = pl.concat([df.select(cols), real.cast(df.select(cols).schema)], how="vertical")
+        print(f"Etiquetas reales añadidas: {real.height}")
+
+    # --- Features y etiqueta ---
+    X = df.select(FEATURES).to_numpy()
+    y = df["Waste_Label"].to_numpy()
+
+    # --- División train/test (75% / 25%) ---
+    # Se dividen índices para poder repartir también las filas por familia
+    idx_train, idx_test = train_test_split(np.arange(df.height), test_size=0.25, random_state=42)
+    X_train, X_test, y_train, y_test = X[idx_train], X[idx_test], y[idx_train], y[idx_test]
+
+    # --- Entrenamiento ---
+    model = RandomForestClassifier(n_estimators=200, random_state=42)
+    model.fit(X_train, y_train)
+
+    # --- Evaluación ---
+    train_acc = accuracy_score(y_train, model.predict(X_train))
+    test_acc = accuracy_score(y_test, model.predict(X_test))
+
+    # --- Reporte más completo ---
+    report = classification_report(y_test, model.predict(X_test), digits=3)
+
+    # --- Guardar modelo ---
+    joblib.dump(model, MODEL_PATH)
+
+    # --- Modelos por familia (prefijo de Product_ID), entrenados en paralelo ---
+    family_report = ""
+    if "Product_ID" in df.columns:
+        bundle = train_family_models(df[idx_train], FEATURES, "Waste_Label", model)
+        routed_acc = accuracy_score(y_test, bundle.predict_frame(df[idx_test], FEATURES) > 0.5)
+        bundle_path = save_bundle(bundle)
+        family_report = (f"Modelos por familia: {sorted(bundle.models)} → {bundle_path}\n"
+                         f"Precisión por familia (test): {routed_acc:.3f}\n")
+
+    # --- Distribución de referencia para el monitor de drift ---
+    FeatureSketch.from_frame(df).to_json(SKETCH_PATH)
+
+    # --- Log actualizado ---
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(LOG_PATH, "a") as f:
+        f.write(
+            f"\n[{timestamp}] Modelo reentrenado\n"
+            f"Precisión (train): {train_acc:.3f}\n"
+            f"Precisión (test): {test_acc:.3f}\n"
+            f"{family_report}"
+            f"{report}\n"
+        )
+
+    # --- Consola ---
+    print(f"Modelo reentrenado y guardado en {MODEL_PATH}")
+    print(f"Última actualización: {timestamp}")
+    print(f"Precisión (train): {train_acc:.3f}")
+    print(f"Precisión (test):  {test_acc:.3f}")
+    if family_report:
+        print(family_report, end="")
+
 
-# --- Cargar dataset ---
-df = pl.read_csv(DATA_PATH)
-
-required = ["Quantity", "Days_to_Expire", "Avg_Usage_per_Day", "Risk", "Waste_Label"]
-missing = [c for c in required if c not in df.columns]
-if missing:
-    raise ValueError(f"Faltan columnas en {DATA_PATH}: {missing}")
-
-# --- Features y etiqueta ---
-X = df.select(["Quantity", "Days_to_Expire", "Avg_Usage_per_Day", "Risk"]).to_numpy()
-y = df["Waste_Label"].to_numpy()
-
-# --- División train/test (75% / 25%) ---
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.25, random_state=42
-)
-
-# --- Entrenamiento ---
-model = RandomForestClassifier(n_estimators=200, random_state=42)
-model.fit(X_train, y_train)
-
-# --- Evaluación ---
-train_acc = accuracy_score(y_train, model.predict(X_train))
-test_acc = accuracy_score(y_test, model.predict(X_test))
-
-# --- Reporte más completo ---
-report = classification_report(y_test, model.predict(X_test), digits=3)
-
-# --- Guardar modelo ---
-joblib.dump(model, MODEL_PATH)
-
-# --- Log actualizado ---
-timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-with open(LOG_PATH, "a") as f:
-    f.write(
-        f"\n[{timestamp}] Modelo reentrenado\n"
-        f"Precisión (train): {train_acc:.3f}\n"
-        f"Precisión (test): {test_acc:.3f}\n"
-        f"{report}\n"
-    )
-
-# --- Consola ---
-print(f"Modelo reentrenado y guardado en {MODEL_PATH}")
-print(f"Última actualización: {timestamp}")
-print(f"Precisión (train): {train_acc:.3f}")
-print(f"Precisión (test):  {test_acc:.3f}")
+# Guard: el pool de modelos por familia arranca procesos limpios (forkserver/spawn) que reimportan este módulo
+if __name__ == "__main__":
+    main()
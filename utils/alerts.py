@@ -0,0 +1,174 @@
+"""
+Differential alert stream over the Operational Intelligence thresholds.
+
+The engine keeps the set of active alerts, one per (rule, lot key), and only
+evaluates the rules over lots that changed: `apply()` takes a delta (upserted
+rows and deleted keys), `update()` takes a full frame and diffs it against the
+last one it saw on the key and rule columns. Each evaluation returns the
+transitions only:
+    new       the lot crossed the threshold
+    resolved  the lot dropped below it, or left the warehouse
+so thousands of lots that stay above a threshold cost nothing per tick. Events
+are appended to a local JSON Lines log for downstream consumers. Each log has a
+single writer (one engine); on start the engine replays its log to restore the
+sequence number and the active alerts, so a restart does not re-announce them.
+"""
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+import polars as pl
+
+KEY_COLS = ["Product_ID", "LOT_Number", "Expiry_Date"]
+EVENT_SCHEMA = {
+    "Seq": pl.Int64, "Timestamp": pl.Utf8, "Event": pl.Utf8, "Rule": pl.Utf8,
+    "Product_ID": pl.Utf8, "LOT_Number": pl.Utf8, "Expiry_Date": pl.Utf8, "Value": pl.Float64,
+}
+
+
+class AlertLog:
+    """Append-only JSON Lines file of alert events, written by a single engine."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        os.makedirs(self.path.parent, exist_ok=True)
+
+    def append(self, events: list[dict]) -> None:
+        if not events:
+            return
+        with open(self.path, "a") as f:
+            f.writelines(json.dumps(event) + "\n" for event in events)
+
+    def read(self) -> pl.DataFrame:
+        if not self.path.exists():
+            return pl.DataFrame(schema=EVENT_SCHEMA)
+        return pl.read_ndjson(self.path, schema=EVENT_SCHEMA)
+
+    def restore(self) -> tuple[int, dict]:
+        """(last Seq, active alerts) replayed from the log: a lot is active if its last event is `new`."""
+        events = self.read()
+        if events.is_empty():
+            return 0, {}
+        last = events.sort("Seq").unique(subset=["Rule"] + KEY_COLS, keep="last")
+        active = {
+            (rule, (product, lot, expiry)): (value, stamp)
+            for rule, product, lot, expiry, value, stamp in last.filter(pl.col("Event") == "new").select(
+                ["Rule"] + KEY_COLS + ["Value", "Timestamp"]
+            ).iter_rows()
+        }
+        return int(events["Seq"].max()), active
+
+
+class AlertEngine:
+    def __init__(self, rules: dict, log: AlertLog | None = None, recent: int = 500):
+        # rules: {nombre: (columna, umbral)}; se dispara con valor > umbral
+        self.rules = rules
+        self.log = log
+        # (rule, key) -> (valor, desde)
+        self.active: dict = {}
+        self.recent: deque = deque(maxlen=recent)
+        self.seq = 0
+        if log is not None:
+            # Continúa la numeración y las alertas activas del log tras un reinicio
+            self.seq, self.active = log.restore()
+        self._seen: pl.DataFrame | None = None
+        # Reentrante: update() llama a apply() con el lock tomado
+        self._lock = threading.RLock()
+
+    def _rule_cols(self, df: pl.DataFrame) -> dict:
+        """Rules whose column is present in `df`; the others keep their current alerts."""
+        return {name: col for name, (col, _) in self.rules.items() if col in df.columns}
+
+    def apply(self, upserts: pl.DataFrame | None, deletes: pl.DataFrame | None = None,
+              at: datetime | None = None) -> list[dict]:
+        """
+        Evaluate the rules over the changed lots only. `upserts` are full lot rows
+        (new or changed); `deletes` only needs the key columns. Returns the events.
+        """
+        stamp = (at or datetime.now()).isoformat(timespec="seconds")
+        events = []
+        with self._lock:
+            if upserts is not None and not upserts.is_empty():
+                rules = self._rule_cols(upserts)
+                # Un único select vectorizado: clave como texto, valor y bandera por regla
+                flags = upserts.select(
+                    [pl.col(c).cast(pl.Utf8) for c in KEY_COLS]
+                    + [pl.col(col).cast(pl.Float64).alias(f"{name}_v") for name, col in rules.items()]
+                    + [(pl.col(col).cast(pl.Float64) > self.rules[name][1]).fill_null(False).alias(f"{name}_f")
+                       for name, col in rules.items()]
+                )
+                for name in rules:
+                    keys = flags.select(KEY_COLS + [f"{name}_v", f"{name}_f"])
+                    for product, lot, expiry, value, firing in keys.iter_rows():
+                        alert = (name, (product, lot, expiry))
+                        if firing and alert not in self.active:
+                            self.active[alert] = (value, stamp)
+                            events.append(self._event(stamp, "new", alert, value))
+                        elif not firing and alert in self.active:
+                            del self.active[alert]
+                            events.append(self._event(stamp, "resolved", alert, value))
+                        elif firing:
+                            # Sigue activa: solo se refresca el valor, sin evento
+                            self.active[alert] = (value, self.active[alert][1])
+            if deletes is not None and not deletes.is_empty():
+                gone = set(deletes.select([pl.col(c).cast(pl.Utf8) for c in KEY_COLS]).iter_rows())
+                for alert in [a for a in self.active if a[1] in gone]:
+                    value, _ = self.active.pop(alert)
+                    events.append(self._event(stamp, "resolved", alert, value))
+            self.recent.extend(events)
+            if self.log is not None:
+                self.log.append(events)
+        return events
+
+    def update(self, df: pl.DataFrame, at: datetime | None = None) -> list[dict]:
+        """
+        Full-state entry point: diffs `df` against the previous call and applies only
+        the changes. On the first call, restored alerts of lots no longer in `df` resolve.
+        """
+        cols = KEY_COLS + sorted(set(self._rule_cols(df).values()))
+        current = df.select(cols).unique(subset=KEY_COLS, keep="last").with_columns(
+            pl.struct(cols).hash().alias("_h")
+        )
+        with self._lock:
+            if self._seen is None:
+                # Alertas restauradas del log cuyo lote ya no está: se resuelven como borrados
+                restored = pl.DataFrame([key for _, key in self.active],
+                                        schema={c: pl.Utf8 for c in KEY_COLS}, orient="row")
+                upserts = current
+                deletes = restored.join(current.select([pl.col(c).cast(pl.Utf8) for c in KEY_COLS]),
+                                        on=KEY_COLS, how="anti")
+            else:
+                upserts = current.join(self._seen.select(KEY_COLS + ["_h"]), on=KEY_COLS + ["_h"], how="anti")
+                deletes = self._seen.select(KEY_COLS).join(current, on=KEY_COLS, how="anti")
+            self._seen = current
+            return self.apply(upserts.drop("_h"), deletes, at=at)
+
+    def _event(self, stamp: str, kind: str, alert: tuple, value) -> dict:
+        self.seq += 1
+        name, (product, lot, expiry) = alert
+        return {"Seq": self.seq, "Timestamp": stamp, "Event": kind, "Rule": name,
+                "Product_ID": product, "LOT_Number": lot, "Expiry_Date": expiry, "Value": value}
+
+    def counts(self) -> dict:
+        """{rule: active alerts}."""
+        with self._lock:
+            out = dict.fromkeys(self.rules, 0)
+            for name, _ in self.active:
+                out[name] += 1
+        return out
+
+    def active_frame(self, rule: str) -> pl.DataFrame:
+        """Active alerts of one rule, with their current value and activation time."""
+        with self._lock:
+            rows = [(*key, value, since) for (name, key), (value, since) in self.active.items() if name == rule]
+        schema = {**{c: pl.Utf8 for c in KEY_COLS}, "Value": pl.Float64, "Since": pl.Utf8}
+        return pl.DataFrame(rows, schema=schema, orient="row")
+
+    def events_since(self, seq: int) -> pl.DataFrame:
+        """Events after `seq` still held in memory (newest last)."""
+        with self._lock:
+            rows = [e for e in self.recent if e["Seq"] > seq]
+        return pl.DataFrame(rows, schema=EVENT_SCHEMA)
@@ -0,0 +1,193 @@
+"""
+Chart layer for the dashboard pages.
+
+Plot inputs are reduced with Polars to a handful of rows (top-k, counts) and
+rendered once to PNG with a standalone matplotlib Figure, which is never
+registered in pyplot's global figure manager and is released as soon as the
+PNG is written. Rendered images live in a bounded LRU keyed by chart name,
+chart parameters and a hash of the reduced input, so a rerun whose data did
+not change for that chart costs one hash of ~10 rows and no matplotlib work.
+matplotlib itself is imported on the first render, so a page whose charts are
+all cache hits never pays its import.
+"""
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import polars as pl
+
+from utils.instrumentation import span
+
+RISK_COLOR = "#E2001A"
+
+
+# --- Pre-aggregations (Polars) ---
+
+def top_risk(df: pl.DataFrame, k: int = 10) -> pl.DataFrame:
+    """Top-k lots by Risk_Score among the visible (Risk_Score < 100) and risky ones."""
+    return (
+        df.filter((pl.col("Risk_Score") < 100) & (pl.col("Risk_Score") > 0))
+        .top_k(k, by="Risk_Score")
+        .sort(["Risk_Score", "Product_Name"], descending=[True, False])
+        .select("Product_Name", "Risk_Score")
+    )
+
+
+def status_counts(df: pl.DataFrame) -> pl.DataFrame:
+    """Lots per Status among the visible, non-expired ones (largest first)."""
+    return (
+        df.filter((pl.col("Risk_Score") < 100) & (pl.col("Status").str.to_lowercase() != "expired"))
+        .group_by("Status")
+        .len()
+        .sort(["len", "Status"], descending=[True, False])
+    )
+
+
+def top_waste(df: pl.DataFrame, label_col: str | None, k: int = 10) -> pl.DataFrame:
+    """Top-k lots by Prob_Waste with the label to show on the axis."""
+    top = df.top_k(k, by="Prob_Waste").sort("Prob_Waste", descending=True)
+    labels = (pl.col(label_col).cast(pl.Utf8) if label_col
+              else pl.format("idx {}", pl.int_range(pl.len())))
+    return top.select(labels.alias("Label"), "Prob_Waste")
+
+
+def scenario_bars(df_sim: pl.DataFrame, k: int = 10) -> pl.DataFrame:
+    """The k lots whose predicted waste moves the most under the scenario."""
+    return (
+        df_sim.with_columns((pl.col("Prob_Waste_Simulated") - pl.col("Prob_Waste_Current")).abs().alias("_abs"))
+        .top_k(k, by="_abs")
+        .sort(["_abs", "Product_Name"], descending=[True, False])
+        .select("Product_Name", "Prob_Waste_Current", "Prob_Waste_Simulated")
+    )
+
+
+# --- Renderers: one standalone Figure per call, closed when the PNG is written ---
+
+def _figure(**kwargs):
+    # Import diferido: matplotlib solo se carga cuando hay que dibujar de verdad
+    from matplotlib.figure import Figure
+
+    return Figure(**kwargs)
+
+
+def _to_png(fig) -> bytes:
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=100, bbox_inches="tight")
+    # Sin pyplot no hay registro global: limpiar la figura libera artistas y buffers ya
+    fig.clear()
+    return buf.getvalue()
+
+
+def render_top_risk(data: pl.DataFrame) -> bytes:
+    fig = _figure()
+    ax = fig.subplots()
+    ax.bar(data["Product_Name"].to_list(), data["Risk_Score"].to_list(), color=RISK_COLOR)
+    ax.set_title("Top 10 products with highest expiration risk", fontsize=11, weight="bold")
+    ax.set_xlabel("Product")
+    ax.set_ylabel("Risk (%)")
+    ax.tick_params(axis="x", labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment("right")
+    return _to_png(fig)
+
+
+def render_status_pie(data: pl.DataFrame) -> bytes:
+    fig = _figure()
+    ax = fig.subplots()
+    if data.is_empty():
+        ax.text(0.5, 0.5, "No non-expired lots", ha="center", va="center")
+        ax.axis("off")
+    else:
+        ax.pie(
+            data["len"].to_list(),
+            labels=data["Status"].to_list(),
+            autopct="%1.1f%%",
+            startangle=90,
+            textprops={'fontsize': 8}
+        )
+        ax.set_title("Lot distribution by status", fontsize=11, weight="bold")
+    return _to_png(fig)
+
+
+def render_top_waste(data: pl.DataFrame) -> bytes:
+    fig = _figure()
+    ax = fig.subplots()
+    ax.barh(data["Label"].to_list(), data["Prob_Waste"].to_list(), color=RISK_COLOR)
+    ax.set_xlabel("Waste probability (%)")
+    ax.set_title("Top lots at highest risk of waste")
+    ax.invert_yaxis()
+    return _to_png(fig)
+
+
+def render_scenario_bars(data: pl.DataFrame) -> bytes:
+    fig = _figure(figsize=(8, 5))
+    ax = fig.subplots()
+    y = np.arange(data.height)
+    height = 0.35
+    ax.barh(y - height/2, data["Prob_Waste_Current"].to_list(), height=height,
+            label="Current (AI)", alpha=0.85, color="#1f77b4")
+    ax.barh(y + height/2, data["Prob_Waste_Simulated"].to_list(), height=height,
+            label="Simulated (AI)", alpha=0.85, color="#d62728")
+    ax.set_yticks(y)
+    ax.set_yticklabels(data["Product_Name"].to_list())
+    ax.set_xlabel("Predicted Waste Probability (%)")
+    ax.set_title("AI-predicted impact of flight delay or consumption change", fontsize=11, weight="bold")
+    ax.legend()
+    fig.tight_layout()
+    return _to_png(fig)
+
+
+RENDERERS = {
+    "top_risk": render_top_risk,
+    "status_pie": render_status_pie,
+    "top_waste": render_top_waste,
+    "scenario_bars": render_scenario_bars,
+}
+
+
+def data_key(data: pl.DataFrame) -> tuple:
+    """Content version of a (small) plot input: schema plus row hashes."""
+    return tuple(data.columns), tuple(data.hash_rows().to_list())
+
+
+class ChartCache:
+    """Bounded LRU of rendered PNGs shared by every session of the server."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def png(self, chart: str, data: pl.DataFrame, **params) -> bytes:
+        """PNG of `chart` for `data`; `params` are the options that shaped `data` (k, filters...)."""
+        key = (chart, tuple(sorted(params.items())), data_key(data))
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+
+        with span(f"render.{chart}", rows=data.height):
+            image = RENDERERS[chart](data)
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = image
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return image
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "size": len(self._entries),
+                "bytes": sum(len(v) for v in self._entries.values()),
+            }
@@ -0,0 +1,161 @@
+"""
+Per-product consumption rates from the daily snapshot history.
+
+Consumption on a snapshot day is what left each lot since its previous
+snapshot: quantity decreases, plus lots that vanished before their expiry
+date (fully consumed). Lots that disappear after expiring are waste, not
+consumption. Each product's total over a snapshot interval is divided by the
+days since the previous snapshot, giving a daily rate (zero on intervals
+without movement), and the rates are smoothed with a time-aware exponential
+moving average (ewm_mean_by with a half-life in days): with irregular gaps
+between snapshots, an observation weighs by the time it covers.
+
+The forecast file holds the last smoothed rate per product and its date.
+update_forecast() only reads snapshots from that date on and resumes the
+average from the stored value, so each run costs the new days only.
+"""
+import os
+from pathlib import Path
+
+import polars as pl
+
+from utils.snapshots import scan_snapshots
+
+KEY_COLS = ["Product_ID", "LOT_Number", "Expiry_Date"]
+FORECAST_SCHEMA = {"Product_ID": pl.Utf8, "Usage_Rate": pl.Float64, "Rate_Date": pl.Date}
+
+
+def daily_consumption(snaps: pl.LazyFrame) -> pl.LazyFrame:
+    """Product_ID, Snapshot_Date, Consumed: units that left each product since the previous snapshot day."""
+    days = (
+        snaps.select(pl.col("Snapshot_Date").unique()).sort("Snapshot_Date")
+        .with_columns(pl.col("Snapshot_Date").shift(-1).alias("_next_snapshot"))
+    )
+    lots = (
+        snaps.select(KEY_COLS + ["Snapshot_Date", pl.col("Quantity").cast(pl.Int64).fill_null(0)])
+        .sort(KEY_COLS + ["Snapshot_Date"])
+        # Ordenado por lote: la fila siguiente es el siguiente snapshot del mismo lote si la clave coincide
+        .with_columns(pl.all_horizontal([pl.col(c) == pl.col(c).shift(-1) for c in KEY_COLS]).fill_null(False).alias("_same"))
+        .with_columns(
+            pl.when("_same").then(pl.col("Quantity").shift(-1)).alias("_next_qty"),
+            pl.when("_same").then(pl.col("Snapshot_Date").shift(-1)).alias("_next_date"),
+        )
+        .join(days, on="Snapshot_Date", how="left")
+    )
+    seen_again = pl.col("_next_date").is_not_null()
+    # Sin snapshot siguiente del lote: consumido si desapareció antes de caducar
+    vanished = pl.col("_next_snapshot").is_not_null() & (pl.col("_next_snapshot") <= pl.col("Expiry_Date"))
+    return (
+        lots.with_columns(
+            pl.when(seen_again).then((pl.col("Quantity") - pl.col("_next_qty")).clip(lower_bound=0))
+            .when(vanished).then(pl.col("Quantity"))
+            .otherwise(0).alias("Consumed"),
+            pl.when(seen_again).then(pl.col("_next_date")).otherwise(pl.col("_next_snapshot")).alias("Day"),
+        )
+        .filter(pl.col("Day").is_not_null())
+        .group_by("Product_ID", "Day")
+        .agg(pl.col("Consumed").sum())
+        .rename({"Day": "Snapshot_Date"})
+    )
+
+
+def forecast_rates(snaps: pl.LazyFrame, half_life_days: float, previous: pl.DataFrame | None = None) -> pl.DataFrame:
+    """
+    Smoothed daily usage per product (Product_ID, Usage_Rate, Rate_Date).
+    `previous` (a former result) seeds the average; only snapshot days after
+    its Rate_Date count as new observations.
+    """
+    previous = previous if previous is not None else pl.DataFrame(schema=FORECAST_SCHEMA)
+    since = previous["Rate_Date"].max()
+    # Una sola lectura de los snapshots para las tres consultas
+    snaps = snaps.select(KEY_COLS + ["Snapshot_Date", "Quantity"]).collect().lazy()
+
+    consumed = daily_consumption(snaps)
+    if since is not None:
+        consumed = consumed.filter(pl.col("Snapshot_Date") > since)
+    consumed = consumed.collect()
+
+    # Rejilla producto × día: los días sin movimiento cuentan como consumo 0.
+    # Gap = días desde el snapshot anterior (global): Consumed es el total del intervalo, no de un día
+    snapshot_days = (
+        snaps.select(pl.col("Snapshot_Date").unique()).sort("Snapshot_Date")
+        .with_columns((pl.col("Snapshot_Date") - pl.col("Snapshot_Date").shift(1)).dt.total_days().alias("_gap"))
+        .collect()
+    )
+    if since is not None:
+        snapshot_days = snapshot_days.filter(pl.col("Snapshot_Date") > since)
+    first_seen = (
+        snaps.group_by("Product_ID").agg(pl.col("Snapshot_Date").min().alias("_first")).collect()
+        .join(previous.select("Product_ID", "Rate_Date"), on="Product_ID", how="full", coalesce=True)
+        .select("Product_ID", pl.min_horizontal("_first", "Rate_Date").alias("_first"))
+    )
+    grid = (
+        first_seen.join(snapshot_days, how="cross")
+        .filter(pl.col("Snapshot_Date") > pl.col("_first"))
+        .join(consumed, on=["Product_ID", "Snapshot_Date"], how="left")
+        .select("Product_ID", "Snapshot_Date",
+                (pl.col("Consumed").cast(pl.Float64).fill_null(0.0) / pl.col("_gap")).alias("Consumed"))
+    )
+    # El valor previo entra como primera observación: la media continúa donde quedó
+    seeds = previous.select("Product_ID", pl.col("Rate_Date").alias("Snapshot_Date"),
+                            pl.col("Usage_Rate").alias("Consumed"))
+    series = pl.concat([seeds, grid]).sort("Product_ID", "Snapshot_Date")
+    if series.is_empty():
+        return previous
+
+    return (
+        series.with_columns(
+            # En horas: Polars no acepta fracciones ("7.0d") en las duraciones
+            pl.col("Consumed").ewm_mean_by("Snapshot_Date", half_life=f"{round(half_life_days * 24)}h")
+            .over("Product_ID")
+            .alias("Usage_Rate")
+        )
+        .group_by("Product_ID")
+        .agg(pl.col("Usage_Rate").last().round(4), pl.col("Snapshot_Date").last().alias("Rate_Date"))
+        .sort("Product_ID")
+    )
+
+
+def load_forecast(forecast_path: str) -> pl.DataFrame | None:
+    return pl.read_parquet(forecast_path) if os.path.exists(forecast_path) else None
+
+
+def update_forecast(snapshot_dir: str, forecast_path: str, half_life_days: float) -> pl.DataFrame:
+    """Fold the snapshots taken since the last run into the stored rates and save them."""
+    previous = load_forecast(forecast_path)
+    snaps = scan_snapshots(snapshot_dir)
+    if previous is not None and not previous.is_empty():
+        # El snapshot del último día procesado sirve de base para las diferencias
+        snaps = snaps.filter(pl.col("Snapshot_Date") >= previous["Rate_Date"].max())
+    rates = forecast_rates(snaps, half_life_days, previous)
+
+    path = Path(forecast_path)
+    os.makedirs(path.parent, exist_ok=True)
+    tmp = path.with_suffix(".parquet.tmp")
+    rates.write_parquet(tmp)
+    os.replace(tmp, path)
+    return rates
+
+
+def apply_usage(df: pl.DataFrame, rates: pl.DataFrame | None) -> pl.DataFrame:
+    """
+    Write the forecast back into Avg_Usage_per_Day. Each non-expired lot gets its
+    share of the product rate in proportion to its quantity, so per-product sums
+    equal the rate; expired lots get 0. Products without history keep their value.
+    """
+    if rates is None or rates.is_empty():
+        return df
+    usable = pl.col("Days_to_Expire") >= 0 if "Days_to_Expire" in df.columns else pl.lit(True)
+    quantity = pl.when(usable).then(pl.col("Quantity").cast(pl.Float64)).otherwise(0.0)
+    stock = quantity.sum().over("Product_ID")
+    share = pl.when(stock > 0).then(quantity / stock).otherwise(0.0)
+    return (
+        df.join(rates.select("Product_ID", "Usage_Rate"), on="Product_ID", how="left")
+        .with_columns(
+            pl.when(pl.col("Usage_Rate").is_not_null())
+            .then((pl.col("Usage_Rate") * share).round(2))
+            .otherwise(pl.col("Avg_Usage_per_Day"))
+            .alias("Avg_Usage_per_Day")
+        )
+        .drop("Usage_Rate")
+    )
@@ -0,0 +1,200 @@
+import json
+import threading
+
+import numpy as np
+import polars as pl
+
+FEATURES = ["Quantity", "Days_to_Expire", "Avg_Usage_per_Day", "Risk"]
+
+# Bordes fijos por feature: sketches con los mismos bordes siempre se pueden sumar
+FEATURE_EDGES = {
+    "Quantity": np.linspace(0, 1000, 41),
+    "Days_to_Expire": np.linspace(-30, 90, 41),
+    "Avg_Usage_per_Day": np.concatenate([[0.0], np.geomspace(0.1, 1000, 40)]),
+    "Risk": np.linspace(0, 100, 41),
+}
+
+# Umbrales habituales de PSI
+PSI_MODERATE = 0.1
+PSI_DRIFT = 0.25
+
+# Lotes que cuentan en el sketch en vivo: los que muestra la página Waste (select_days(min_days=1))
+LIVE_ROWS = pl.col("Days_to_Expire") >= 1
+
+
+class FeatureSketch:
+    """
+    Fixed-size histogram per feature (inner bins + underflow/overflow).
+    Sketches add and subtract in O(rows given), and two sketches merge in O(bins).
+    """
+
+    def __init__(self, edges: dict = FEATURE_EDGES):
+        self.edges = edges
+        self.counts = {f: np.zeros(len(e) + 1, dtype=np.int64) for f, e in edges.items()}
+
+    def update(self, df: pl.DataFrame, sign: int = 1) -> "FeatureSketch":
+        """Add (sign=1) or remove (sign=-1) the rows of `df`."""
+        for feature, edges in self.edges.items():
+            if feature not in df.columns or df.height == 0:
+                continue
+            values = df[feature].cast(pl.Float64).drop_nulls().to_numpy()
+            bins = np.searchsorted(edges, values, side="right")
+            self.counts[feature] += sign * np.bincount(bins, minlength=len(edges) + 1)
+        return self
+
+    def merge(self, other: "FeatureSketch") -> "FeatureSketch":
+        merged = FeatureSketch(self.edges)
+        for feature in self.counts:
+            merged.counts[feature] = self.counts[feature] + other.counts[feature]
+        return merged
+
+    def total(self, feature: str) -> int:
+        return int(self.counts[feature].sum())
+
+    def to_json(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump({feat: c.tolist() for feat, c in self.counts.items()}, f)
+
+    @classmethod
+    def from_json(cls, path: str) -> "FeatureSketch":
+        with open(path) as f:
+            raw = json.load(f)
+        sketch = cls()
+        for feature, counts in raw.items():
+            sketch.counts[feature] = np.asarray(counts, dtype=np.int64)
+        return sketch
+
+    @classmethod
+    def from_frame(cls, df: pl.DataFrame) -> "FeatureSketch":
+        return cls().update(df)
+
+
+def psi(expected: np.ndarray, actual: np.ndarray, eps: float = 1e-4) -> float:
+    """Population Stability Index between two histograms with the same bins."""
+    e = np.clip(expected / max(expected.sum(), 1), eps, None)
+    a = np.clip(actual / max(actual.sum(), 1), eps, None)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def ks(expected: np.ndarray, actual: np.ndarray) -> float:
+    """Kolmogorov-Smirnov statistic evaluated on the bin edges."""
+    e = np.cumsum(expected) / max(expected.sum(), 1)
+    a = np.cumsum(actual) / max(actual.sum(), 1)
+    return float(np.max(np.abs(a - e)))
+
+
+def drift_report(reference: FeatureSketch, live: FeatureSketch) -> pl.DataFrame:
+    rows = []
+    for feature in reference.counts:
+        score = psi(reference.counts[feature], live.counts[feature])
+        rows.append({
+            "Feature": feature,
+            "PSI": round(score, 4),
+            "KS": round(ks(reference.counts[feature], live.counts[feature]), 4),
+            "Live_rows": live.total(feature),
+            "Status": "drift" if score >= PSI_DRIFT else "moderate" if score >= PSI_MODERATE else "stable",
+        })
+    return pl.DataFrame(rows)
+
+
+class LiveDriftMonitor:
+    """
+    Keeps the sketch of the current live state without keeping the state: per lot
+    only its key hash and the bin of each feature. Producers feed it the delta of
+    each version (`apply_delta`), so a tick re-bins only the lots that changed;
+    `observe` rebuilds from a full frame (first version, or after losing a delta).
+    Lots outside `row_filter` (default: the ones the Waste page shows) count nowhere.
+    """
+
+    def __init__(self, key_cols: list[str], features: list[str] = FEATURES,
+                 row_filter: pl.Expr | None = LIVE_ROWS):
+        self.key_cols = key_cols
+        self.features = features
+        self.row_filter = row_filter
+        self.sketch = FeatureSketch()
+        # Mapa ordenado hash de clave -> bin por feature (-1: no cuenta); mismo patrón que KpiCube
+        self._hash_sorted = np.empty(0, dtype=np.uint64)
+        self._bins = np.empty((0, len(features)), dtype=np.int16)
+        self._lock = threading.Lock()
+        self.last_changed = 0
+
+    def _key_hashes(self, df: pl.DataFrame) -> np.ndarray:
+        return df.select([pl.col(c).cast(pl.Utf8) for c in self.key_cols]).hash_rows().to_numpy()
+
+    def _bin(self, df: pl.DataFrame) -> np.ndarray:
+        """Bin of every feature per row; -1 for nulls, missing features and filtered-out rows."""
+        # El feed publica el riesgo como Risk_Score (misma regla que pages/waste)
+        if "Risk" not in df.columns and "Risk_Score" in df.columns:
+            df = df.with_columns(pl.col("Risk_Score").alias("Risk"))
+        bins = np.full((df.height, len(self.features)), -1, dtype=np.int16)
+        counted = np.ones(df.height, dtype=bool)
+        if self.row_filter is not None:
+            counted = df.select(self.row_filter.fill_null(False)).to_series().to_numpy()
+        for j, feature in enumerate(self.features):
+            if feature not in df.columns:
+                continue
+            values = df[feature].cast(pl.Float64).to_numpy()
+            ok = counted & ~np.isnan(values)
+            bins[ok, j] = np.searchsorted(self.sketch.edges[feature], values[ok], side="right")
+        return bins
+
+    def _fold(self, bins: np.ndarray, sign: int) -> None:
+        for j, feature in enumerate(self.features):
+            b = bins[:, j]
+            self.sketch.counts[feature] += sign * np.bincount(b[b >= 0], minlength=len(self.sketch.counts[feature]))
+
+    def _lookup(self, hashes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(position in the sorted map, found mask) of each key hash."""
+        if not len(self._hash_sorted):
+            return np.zeros(len(hashes), dtype=np.int64), np.zeros(len(hashes), dtype=bool)
+        pos = np.minimum(np.searchsorted(self._hash_sorted, hashes), len(self._hash_sorted) - 1)
+        return pos, self._hash_sorted[pos] == hashes
+
+    def apply_delta(self, upserts: pl.DataFrame | None, deletes: pl.DataFrame | None = None) -> int:
+        """
+        Re-bin the lots of one published delta: `upserts` are full lot rows (new or
+        changed), `deletes` only needs the key columns. Returns lots touched.
+        """
+        touched = 0
+        with self._lock:
+            if upserts is not None and not upserts.is_empty():
+                # Una clave repetida en el lote cuenta una vez, con su última fila
+                upserts = upserts.unique(subset=self.key_cols, keep="last", maintain_order=True)
+                hashes = self._key_hashes(upserts)
+                new_bins = self._bin(upserts)
+                pos, found = self._lookup(hashes)
+
+                old = pos[found]
+                self._fold(self._bins[old], -1)
+                self._bins[old] = new_bins[found]
+                self._fold(new_bins, +1)
+
+                order = np.argsort(hashes[~found], kind="stable")
+                fresh = hashes[~found][order]
+                at = np.searchsorted(self._hash_sorted, fresh)
+                self._hash_sorted = np.insert(self._hash_sorted, at, fresh)
+                self._bins = np.insert(self._bins, at, new_bins[~found][order], axis=0)
+                touched += upserts.height
+            if deletes is not None and not deletes.is_empty():
+                pos, found = self._lookup(np.unique(self._key_hashes(deletes)))
+                gone = pos[found]
+                self._fold(self._bins[gone], -1)
+                self._hash_sorted = np.delete(self._hash_sorted, gone)
+                self._bins = np.delete(self._bins, gone, axis=0)
+                touched += len(gone)
+            self.last_changed = touched
+        return touched
+
+    def observe(self, df: pl.DataFrame) -> FeatureSketch:
+        """Rebuild from a full live frame (O(rows)); use `apply_delta` between versions."""
+        with self._lock:
+            self.sketch = FeatureSketch(self.sketch.edges)
+            self._hash_sorted = np.empty(0, dtype=np.uint64)
+            self._bins = np.empty((0, len(self.features)), dtype=np.int16)
+        self.apply_delta(df)
+        return self.view()
+
+    def view(self) -> FeatureSketch:
+        """Copy of the current sketch (a few hundred counters), safe to hand to sessions."""
+        with self._lock:
+            return FeatureSketch(self.sketch.edges).merge(self.sketch)
@@ -0,0 +1,154 @@
+"""
+Calendar index of lots by days to expiry.
+
+A ring buffer of `horizon + 1` per-day arrays of row indices: logical slot d
+holds the rows that expire in d days. Rows already expired and rows beyond the
+horizon live in two side arrays (the far ones sorted by expiry day, so they can
+be promoted into the ring as the calendar advances).
+
+At day rollover the ring rotates: today's slot joins the expired rows, the head
+moves one position and the freed slot is filled from the far rows. Nothing is
+recomputed per lot. Range queries (≤2 days, 3-7 days, not expired, Risk_Score
+thresholds via risk_utils.max_days_for_risk) return row indices directly.
+
+Instances are immutable: advanced() and extended() return a new index that
+shares every untouched array, so a published index can be read by any number
+of sessions while the simulation clock builds the next one.
+"""
+from datetime import date
+
+import numpy as np
+import polars as pl
+
+DEFAULT_HORIZON = 60
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+class ExpiryIndex:
+    __slots__ = ("horizon", "as_of", "n_rows", "_slots", "_head", "_expired", "_far_days", "_far_rows")
+
+    def __init__(self, horizon: int, as_of: date, n_rows: int, slots: tuple, head: int,
+                 expired: np.ndarray, far_days: np.ndarray, far_rows: np.ndarray):
+        self.horizon = horizon
+        self.as_of = as_of
+        self.n_rows = n_rows
+        self._slots = slots
+        self._head = head
+        self._expired = expired
+        # Días absolutos (ordinal de fecha) de los lotes más allá del horizonte, ordenados
+        self._far_days = far_days
+        self._far_rows = far_rows
+
+    # --- Construcción ---
+
+    @staticmethod
+    def _split(days: np.ndarray, rows: np.ndarray, horizon: int) -> tuple:
+        """(expired rows, per-day row arrays for 0..horizon, far rows, far days)."""
+        order = np.argsort(days, kind="stable")
+        days, rows = days[order], rows[order]
+        bounds = np.searchsorted(days, np.arange(-1, horizon + 1), side="right")
+        expired = rows[:bounds[0]]
+        slots = [rows[bounds[d]:bounds[d + 1]] for d in range(horizon + 1)]
+        return expired, slots, rows[bounds[-1]:], days[bounds[-1]:]
+
+    @classmethod
+    def from_frame(cls, df: pl.DataFrame, horizon: int = DEFAULT_HORIZON, as_of: date | None = None) -> "ExpiryIndex":
+        """Index of `df` by its Days_to_Expire column, taken as relative to `as_of` (today)."""
+        as_of = as_of or date.today()
+        days = df["Days_to_Expire"].cast(pl.Int64)
+        valid = days.is_not_null().to_numpy()
+        rows = np.flatnonzero(valid).astype(np.int64)
+        expired, slots, far_rows, far_days = cls._split(days.to_numpy()[valid].astype(np.int64), rows, horizon)
+        return cls(horizon, as_of, df.height, tuple(slots), 0, expired,
+                   far_days + as_of.toordinal(), far_rows)
+
+    def _slot(self, d: int) -> np.ndarray:
+        return self._slots[(self._head + d) % (self.horizon + 1)]
+
+    # --- Actualización ---
+
+    def advanced(self, today: date) -> "ExpiryIndex":
+        """Rotate the ring to `today`: O(days elapsed + promoted rows), not O(lots)."""
+        steps = (today - self.as_of).days
+        if steps <= 0:
+            return self
+        size = self.horizon + 1
+        shift = min(steps, size)
+        slots = list(self._slots)
+        expired = [self._expired] + [self._slot(d) for d in range(shift)]
+        head = (self._head + steps) % size
+
+        # Los slots liberados pasan a representar los últimos días del horizonte
+        today_ord = today.toordinal()
+        lo = np.searchsorted(self._far_days, today_ord + size - shift, side="left")
+        hi = np.searchsorted(self._far_days, today_ord + self.horizon, side="right")
+        if steps > size:
+            # Saltos de más de un horizonte: lo que quedó antes de la ventana ya expiró
+            expired.append(self._far_rows[:lo])
+        for d in range(size - shift, size):
+            a = np.searchsorted(self._far_days, today_ord + d, side="left")
+            b = np.searchsorted(self._far_days, today_ord + d, side="right")
+            slots[(head + d) % size] = self._far_rows[a:b]
+
+        return ExpiryIndex(self.horizon, today, self.n_rows, tuple(slots), head,
+                           np.concatenate(expired), self._far_days[hi:], self._far_rows[hi:])
+
+    def extended(self, df: pl.DataFrame) -> "ExpiryIndex":
+        """
+        Index rows appended to `df` since this index was built (existing rows must
+        keep their position and expiry). Only the slots that receive rows are copied.
+        """
+        if df.height < self.n_rows:
+            return ExpiryIndex.from_frame(df, self.horizon, self.as_of)
+        if df.height == self.n_rows:
+            return self
+        new = df.slice(self.n_rows)["Days_to_Expire"].cast(pl.Int64)
+        valid = new.is_not_null().to_numpy()
+        rows = np.flatnonzero(valid).astype(np.int64) + self.n_rows
+        expired, new_slots, far_rows, far_days = self._split(new.to_numpy()[valid].astype(np.int64), rows, self.horizon)
+
+        size = self.horizon + 1
+        slots = list(self._slots)
+        for d, added in enumerate(new_slots):
+            if len(added):
+                i = (self._head + d) % size
+                slots[i] = np.concatenate([slots[i], added])
+        far_days = np.concatenate([self._far_days, far_days + self.as_of.toordinal()])
+        far_rows = np.concatenate([self._far_rows, far_rows])
+        order = np.argsort(far_days, kind="stable")
+        return ExpiryIndex(self.horizon, self.as_of, df.height, tuple(slots), self._head,
+                           np.concatenate([self._expired, expired]), far_days[order], far_rows[order])
+
+    # --- Consultas ---
+
+    def _parts(self, min_days: int | None, max_days: int | None) -> list:
+        parts = []
+        if min_days is None or min_days < 0:
+            if max_days is None or max_days >= -1:
+                parts.append(self._expired)
+        lo = max(0, min_days if min_days is not None else 0)
+        hi = min(self.horizon, max_days if max_days is not None else self.horizon)
+        parts.extend(self._slot(d) for d in range(lo, hi + 1))
+        if max_days is None or max_days > self.horizon:
+            far = self._far_rows
+            if max_days is not None or (min_days is not None and min_days > self.horizon + 1):
+                base = self.as_of.toordinal()
+                a = np.searchsorted(self._far_days, base + max(self.horizon + 1, min_days or 0), side="left")
+                b = (np.searchsorted(self._far_days, base + max_days, side="right")
+                     if max_days is not None else len(self._far_days))
+                far = self._far_rows[a:b]
+            parts.append(far)
+        return parts
+
+    def rows(self, min_days: int | None = None, max_days: int | None = None, sort: bool = True) -> np.ndarray:
+        """
+        Row indices with min_days ≤ Days_to_Expire ≤ max_days (None = unbounded).
+        Expired rows are only resolved as a whole (min_days < 0 includes all of them).
+        Sorted by row position unless sort=False (then grouped by expiry day).
+        """
+        parts = [p for p in self._parts(min_days, max_days) if len(p)]
+        out = np.concatenate(parts) if parts else _EMPTY
+        return np.sort(out) if sort else out
+
+    def count(self, min_days: int | None = None, max_days: int | None = None) -> int:
+        return int(sum(len(p) for p in self._parts(min_days, max_days)))
@@ -0,0 +1,135 @@
+"""
+Per-product-family waste models.
+
+Perishables (SAL, SND, FRU...) and shelf-stable items (COF, DRK...) behave very
+differently, so besides the global forest a smaller forest is fitted for every
+family (Product_ID prefix) with enough rows and both classes. Families are
+fitted in parallel worker processes and stored together with the global model
+in one versioned bundle (`bundle-<version>.pkl`, CURRENT points at the latest).
+
+At inference a batch is partitioned by family and the groups are scored
+concurrently in threads (forest traversal releases the GIL); lots of families
+without a model fall back to the global forest.
+"""
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from config import family_models as fm
+
+GLOBAL = "*"
+
+
+def family_expr(col: str = "Product_ID") -> pl.Expr:
+    return pl.col(col).cast(pl.Utf8).str.to_uppercase().str.slice(0, fm.FAMILY_PREFIX_LEN).fill_null(GLOBAL)
+
+
+def _fit(X: np.ndarray, y: np.ndarray, n_estimators: int, random_state: int):
+    from sklearn.ensemble import RandomForestClassifier
+
+    model = RandomForestClassifier(n_estimators=n_estimators, random_state=random_state)
+    return model.fit(X, y)
+
+
+@dataclass
+class FamilyModels:
+    version: str
+    global_model: object
+    models: dict = field(default_factory=dict)
+    rows: dict = field(default_factory=dict)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Without family information every row goes to the global model."""
+        return self.global_model.predict_proba(X)
+
+    def families(self, df: pl.DataFrame) -> np.ndarray | None:
+        """Family of every row of `df` (None when the frame has no Product_ID)."""
+        if "Product_ID" not in df.columns:
+            return None
+        return df.select(family_expr()).to_series().to_numpy()
+
+    def groups(self, families: np.ndarray) -> dict:
+        """Row indices per model name; families without a model go to GLOBAL."""
+        routed = np.where(np.isin(families, list(self.models)), families, GLOBAL)
+        return {name: np.flatnonzero(routed == name) for name in np.unique(routed)}
+
+    def predict_routed(self, X: np.ndarray, families: np.ndarray | None, max_workers: int | None = None) -> np.ndarray:
+        """P(waste) per row of `X`, each family scored by its own model, groups in parallel."""
+        if families is None or not self.models:
+            return self.global_model.predict_proba(X)[:, 1]
+        groups = self.groups(families)
+
+        def score(item):
+            name, idx = item
+            model = self.models.get(name, self.global_model)
+            return idx, model.predict_proba(X[idx])[:, 1]
+
+        out = np.empty(len(X), dtype=np.float64)
+        with ThreadPoolExecutor(max_workers=max_workers or min(len(groups), os.cpu_count() or 1)) as pool:
+            for idx, probs in pool.map(score, groups.items()):
+                out[idx] = probs
+        return out
+
+    def predict_frame(self, df: pl.DataFrame, features: list[str], max_workers: int | None = None) -> np.ndarray:
+        """P(waste) per row of `df`, routed by the family of its Product_ID."""
+        return self.predict_routed(df.select(features).to_numpy(), self.families(df), max_workers)
+
+def train_family_models(df: pl.DataFrame, features: list[str], label: str, global_model,
+                        min_rows: int = fm.MIN_FAMILY_ROWS, n_estimators: int = fm.FAMILY_TREES,
+                        workers: int | None = None) -> FamilyModels:
+    """Fit one forest per family with enough rows (and both classes) in worker processes."""
+    parts = df.with_columns(family_expr().alias("_family")).partition_by("_family", as_dict=True)
+    jobs = {}
+    rows = {}
+    for (family,), part in parts.items():
+        rows[family] = part.height
+        if family != GLOBAL and part.height >= min_rows and part[label].n_unique() == 2:
+            jobs[family] = (part.select(features).to_numpy(), part[label].to_numpy())
+
+    models = {}
+    if jobs:
+        # Polars no es fork-safe y el llamador ya ha usado su pool de hilos: procesos limpios
+        # (forkserver, o spawn donde no existe); el script que llama necesita guard de __main__
+        method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context(method)) as pool:
+            futures = {f: pool.submit(_fit, X, y, n_estimators, 42) for f, (X, y) in jobs.items()}
+            models = {f: fut.result() for f, fut in futures.items()}
+
+    version = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return FamilyModels(version=version, global_model=global_model, models=models, rows=rows)
+
+
+def save_bundle(bundle: FamilyModels, bundle_dir: str = fm.BUNDLE_DIR, keep: int = fm.KEEP_BUNDLES) -> Path:
+    import joblib
+
+    os.makedirs(bundle_dir, exist_ok=True)
+    path = Path(bundle_dir) / f"bundle-{bundle.version}.pkl"
+    tmp = path.with_suffix(".tmp")
+    joblib.dump(bundle, tmp)
+    os.replace(tmp, path)
+    current = Path(bundle_dir) / "CURRENT"
+    current.with_suffix(".tmp").write_text(path.name)
+    os.replace(current.with_suffix(".tmp"), current)
+    for old in sorted(Path(bundle_dir).glob("bundle-*.pkl"))[:-keep]:
+        old.unlink(missing_ok=True)
+    return path
+
+
+def current_bundle_path(bundle_dir: str = fm.BUNDLE_DIR) -> Path | None:
+    try:
+        return Path(bundle_dir) / (Path(bundle_dir) / "CURRENT").read_text().strip()
+    except FileNotFoundError:
+        return None
+
+
+def load_bundle(bundle_dir: str = fm.BUNDLE_DIR) -> FamilyModels | None:
+    import joblib
+
+    path = current_bundle_path(bundle_dir)
+    return joblib.load(path) if path is not None and path.exists() else None
@@ -0,0 +1,328 @@
+"""
+First-expired-first-out dispatch planning for upcoming flights.
+
+Every product keeps a min-heap of its lots keyed on expiry day. A flight's
+demand for a product pops the earliest-expiring lot that is still valid on
+the departure day, takes what it needs and moves on, so a day of flights costs
+O(allocations · log lots) regardless of warehouse size.
+
+Heap entries are plain ints, (expiry day << 32) | lot id, and per-lot state
+(remaining quantity, usage, expiry) lives in numpy arrays indexed by lot id:
+a million lots take a few tens of MB instead of a million Python tuples.
+Lots are identified by (Product_ID, LOT_Number, Expiry_Date) like the rest of
+the store; changes arrive through apply() (same delta shape as KpiCube) and
+dispatched quantities through commit(). Both are incremental; removed or
+depleted lots stay in the heaps as stale entries that are skipped when they
+reach the top and compacted when they outnumber the live ones.
+
+Projected waste after a plan: each product is consumed from the next day on
+at the sum of its lots' Avg_Usage_per_Day, FEFO; what a lot still holds on its
+expiry day is waste.
+"""
+import heapq
+import threading
+from dataclasses import dataclass, field
+from datetime import date
+
+import numpy as np
+import polars as pl
+
+KEY_COLS = ["Product_ID", "LOT_Number", "Expiry_Date"]
+_ID_BITS = 32
+_ID_MASK = (1 << _ID_BITS) - 1
+_EPOCH = date(1970, 1, 1)
+LOT_SCHEMA = {"Product_ID": pl.Utf8, "LOT_Number": pl.Utf8, "Expiry_Date": pl.Date}
+
+
+def _day(d: date) -> int:
+    """Days since 1970-01-01 (physical value of pl.Date)."""
+    return (d - _EPOCH).days
+
+
+def _lot_frame(df: pl.DataFrame) -> pl.DataFrame:
+    """Normalised lot rows: key, quantity and usage; lots without a valid expiry date are dropped."""
+    expiry = pl.col("Expiry_Date")
+    if df.schema.get("Expiry_Date") == pl.Utf8:
+        expiry = expiry.str.strptime(pl.Date, strict=False)
+    usage = pl.col("Avg_Usage_per_Day").cast(pl.Float64) if "Avg_Usage_per_Day" in df.columns else pl.lit(0.0)
+    return (
+        df.select(
+            pl.col("Product_ID").cast(pl.Utf8),
+            pl.col("LOT_Number").cast(pl.Utf8),
+            expiry.cast(pl.Date).alias("Expiry_Date"),
+            pl.col("Quantity").cast(pl.Int64).fill_null(0).clip(lower_bound=0),
+            usage.fill_null(0.0).alias("Avg_Usage_per_Day"),
+        )
+        .drop_nulls(KEY_COLS)
+        .unique(subset=KEY_COLS, keep="last", maintain_order=True)
+    )
+
+
+def _key_hashes(lots: pl.DataFrame) -> np.ndarray:
+    return lots.select([pl.col(c).cast(pl.Utf8) for c in KEY_COLS]).hash_rows().to_numpy()
+
+
+@dataclass(frozen=True)
+class DispatchPlan:
+    """Allocation of one batch of flights, plus the waste projected once it is dispatched."""
+    as_of: date
+    allocations: pl.DataFrame   # Flight_ID, Departure, Product_ID, LOT_Number, Expiry_Date, Allocated
+    shortfalls: pl.DataFrame    # Flight_ID, Departure, Product_ID, Shortfall
+    waste: pl.DataFrame         # lots with Projected_Waste > 0
+    demand: int
+    # Ids y cantidades por línea de asignación, para commit()
+    lot_ids: np.ndarray = field(repr=False, default_factory=lambda: np.empty(0, np.int64))
+    lot_qty: np.ndarray = field(repr=False, default_factory=lambda: np.empty(0, np.int64))
+
+    @property
+    def allocated(self) -> int:
+        return int(self.lot_qty.sum())
+
+    @property
+    def projected_waste(self) -> int:
+        return int(self.waste["Projected_Waste"].sum()) if not self.waste.is_empty() else 0
+
+    def by_lot(self) -> pl.DataFrame:
+        """Per lot: units allocated and the first flight that takes them."""
+        return (
+            self.allocations.sort("Departure")
+            .group_by(KEY_COLS, maintain_order=True)
+            .agg(pl.col("Allocated").sum(), pl.col("Flight_ID").first().alias("Dispatch_Flight"))
+        )
+
+
+class FefoPlanner:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._products: dict = {}
+        self._heaps: list = []
+        self._lots = pl.DataFrame(schema=LOT_SCHEMA)
+        self._qty = np.empty(0, np.int64)
+        self._exp = np.empty(0, np.int64)
+        self._usage = np.empty(0, np.float64)
+        self._product = np.empty(0, np.int32)
+        self._in_heap = np.empty(0, bool)
+        # Hash de la clave del lote → id, ordenado para búsquedas vectorizadas
+        self._hash_sorted = np.empty(0, np.uint64)
+        self._hash_ids = np.empty(0, np.int64)
+        self._stale = 0
+
+    @classmethod
+    def from_frame(cls, df: pl.DataFrame) -> "FefoPlanner":
+        planner = cls()
+        planner.apply(df)
+        return planner
+
+    @property
+    def n_lots(self) -> int:
+        return int((self._qty > 0).sum())
+
+    # --- Actualización incremental ---
+
+    def _lookup(self, hashes: np.ndarray) -> np.ndarray:
+        """Lot id of each key hash, -1 when unknown."""
+        if not len(self._hash_sorted):
+            return np.full(len(hashes), -1, np.int64)
+        pos = np.minimum(np.searchsorted(self._hash_sorted, hashes), len(self._hash_sorted) - 1)
+        return np.where(self._hash_sorted[pos] == hashes, self._hash_ids[pos], -1)
+
+    def _push(self, ids: np.ndarray) -> None:
+        """Add lots to their product heaps (bulk heapify for large batches)."""
+        if not len(ids):
+            return
+        ids = ids[np.lexsort((ids, self._exp[ids], self._product[ids]))]
+        packed = (self._exp[ids] << _ID_BITS) | ids
+        codes = self._product[ids]
+        bounds = np.flatnonzero(np.diff(codes)) + 1
+        for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(ids)]):
+            heap = self._heaps[codes[start]]
+            added = packed[start:end].tolist()
+            if not heap:
+                # Ya ordenado por caducidad: una lista ordenada es un heap válido
+                heap.extend(added)
+            elif len(added) > len(heap) // 8:
+                heap.extend(added)
+                heapq.heapify(heap)
+            else:
+                for entry in added:
+                    heapq.heappush(heap, entry)
+        self._in_heap[ids] = True
+
+    def _set_quantity(self, ids: np.ndarray, qty: np.ndarray) -> None:
+        old, in_heap = self._qty[ids], self._in_heap[ids]
+        # Entradas que quedan (o dejan de ser) obsoletas dentro de los heaps
+        self._stale += int(((qty <= 0) & (old > 0) & in_heap).sum()) - int(((qty > 0) & (old <= 0) & in_heap).sum())
+        self._qty[ids] = qty
+        revived = ids[(qty > 0) & ~self._in_heap[ids]]
+        if len(revived):
+            self._push(revived)
+
+    def _append(self, lots: pl.DataFrame, hashes: np.ndarray) -> None:
+        start = len(self._qty)
+        ids = np.arange(start, start + lots.height, dtype=np.int64)
+        codes = np.empty(lots.height, np.int32)
+        for i, product in enumerate(lots["Product_ID"].to_list()):
+            code = self._products.get(product)
+            if code is None:
+                code = self._products[product] = len(self._heaps)
+                self._heaps.append([])
+            codes[i] = code
+
+        self._lots = pl.concat([self._lots, lots.select(KEY_COLS)], rechunk=False)
+        self._qty = np.concatenate([self._qty, np.zeros(lots.height, np.int64)])
+        self._exp = np.concatenate([self._exp, lots["Expiry_Date"].to_physical().to_numpy().astype(np.int64)])
+        self._usage = np.concatenate([self._usage, lots["Avg_Usage_per_Day"].to_numpy()])
+        self._product = np.concatenate([self._product, codes])
+        self._in_heap = np.concatenate([self._in_heap, np.zeros(lots.height, bool)])
+
+        all_hashes = np.concatenate([self._hash_sorted, hashes])
+        all_ids = np.concatenate([self._hash_ids, ids])
+        order = np.argsort(all_hashes, kind="stable")
+        self._hash_sorted, self._hash_ids = all_hashes[order], all_ids[order]
+        self._set_quantity(ids, lots["Quantity"].to_numpy())
+
+    def apply(self, upserts: pl.DataFrame | None, deletes: pl.DataFrame | None = None) -> int:
+        """
+        Apply a delta: `upserts` are full lot rows (new lots or new quantities),
+        `deletes` only needs the key columns. Returns rows touched.
+        """
+        touched = 0
+        with self._lock:
+            if upserts is not None and not upserts.is_empty():
+                lots = _lot_frame(upserts)
+                hashes = _key_hashes(lots)
+                ids = self._lookup(hashes)
+                known = ids >= 0
+                if known.any():
+                    self._usage[ids[known]] = lots["Avg_Usage_per_Day"].to_numpy()[known]
+                    self._set_quantity(ids[known], lots["Quantity"].to_numpy()[known])
+                if not known.all():
+                    self._append(lots.filter(pl.Series(~known)), hashes[~known])
+                touched += lots.height
+            if deletes is not None and not deletes.is_empty():
+                ids = self._lookup(_key_hashes(deletes))
+                ids = ids[ids >= 0]
+                self._set_quantity(ids, np.zeros(len(ids), np.int64))
+                touched += len(ids)
+            self._maybe_compact()
+        return touched
+
+    def _maybe_compact(self) -> None:
+        live = int(self._in_heap.sum())
+        if self._stale <= max(1024, live - self._stale):
+            return
+        self._heaps = [[] for _ in self._heaps]
+        self._in_heap[:] = False
+        self._stale = 0
+        self._push(np.flatnonzero(self._qty > 0))
+
+    # --- Planificación ---
+
+    def plan(self, flights: pl.DataFrame, as_of: date | None = None) -> DispatchPlan:
+        """
+        Allocate `flights` (Flight_ID, Departure, Product_ID, Demand) FEFO, in
+        departure order. A lot is only dispatched on or before its expiry day.
+        The planner itself is not modified; call commit() once the plan is executed.
+        """
+        as_of = as_of or date.today()
+        flights = flights.sort(["Departure", "Flight_ID"])
+        departure = flights["Departure"].cast(pl.Date).to_physical().to_list()
+        lines, lot_ids, lot_qty, short_lines, short_qty = [], [], [], [], []
+        taken: dict = {}
+
+        with self._lock:
+            work: dict = {}
+            for line, (product, day, demand) in enumerate(zip(flights["Product_ID"].to_list(), departure,
+                                                             flights["Demand"].cast(pl.Int64).to_list())):
+                code = self._products.get(product)
+                heap = None
+                if code is not None:
+                    heap = work.get(code)
+                    if heap is None:
+                        heap = work[code] = list(self._heaps[code])
+                while demand > 0 and heap:
+                    lot = heap[0] & _ID_MASK
+                    available = int(self._qty[lot]) - taken.get(lot, 0)
+                    if available <= 0 or (heap[0] >> _ID_BITS) < day:
+                        heapq.heappop(heap)
+                        continue
+                    q = min(available, demand)
+                    taken[lot] = taken.get(lot, 0) + q
+                    lines.append(line)
+                    lot_ids.append(lot)
+                    lot_qty.append(q)
+                    demand -= q
+                    if q == available:
+                        heapq.heappop(heap)
+                if demand > 0:
+                    short_lines.append(line)
+                    short_qty.append(demand)
+
+            lot_ids = np.asarray(lot_ids, dtype=np.int64)
+            lot_qty = np.asarray(lot_qty, dtype=np.int64)
+            allocations = pl.concat([
+                flights.select("Flight_ID", "Departure")[np.asarray(lines, dtype=np.int64)],
+                self._lots[lot_ids],
+                pl.DataFrame({"Allocated": lot_qty}),
+            ], how="horizontal")
+            waste = self._projected_waste(lot_ids, lot_qty, as_of)
+
+        shortfalls = flights.select("Flight_ID", "Departure", "Product_ID")[np.asarray(short_lines, dtype=np.int64)].with_columns(
+            pl.Series("Shortfall", short_qty, dtype=pl.Int64)
+        )
+        return DispatchPlan(as_of, allocations, shortfalls, waste, int(flights["Demand"].cast(pl.Int64).sum()),
+                            lot_ids, lot_qty)
+
+    def _projected_waste(self, lot_ids: np.ndarray, lot_qty: np.ndarray, as_of: date) -> pl.DataFrame:
+        remaining = self._qty.copy()
+        np.subtract.at(remaining, lot_ids, lot_qty)
+        live = pl.Series(self._qty > 0)
+        days = pl.col("Days_to_Expire")
+        # Consumo FEFO desde mañana a ritmo u: U_i = min(U_{i-1} + q_i, u·d_i)
+        # ⇒ U_i = cumq_i + min(0, min_{j≤i}(u·d_j − cumq_j))
+        capacity = pl.col("_rate") * days.clip(lower_bound=0)
+        used = pl.col("_cumq") + (capacity - pl.col("_cumq")).cum_min().over("Product_ID").clip(upper_bound=0)
+        return (
+            self._lots.with_columns(
+                pl.Series("Days_to_Expire", self._exp - _day(as_of)),
+                pl.Series("Remaining", remaining),
+                pl.Series("_usage", self._usage),
+            )
+            .filter(live)
+            .with_columns(pl.col("_usage").sum().over("Product_ID").alias("_rate"))
+            .sort(["Product_ID", "Days_to_Expire", "LOT_Number"])
+            .with_columns(pl.col("Remaining").cum_sum().over("Product_ID").alias("_cumq"))
+            .with_columns(used.alias("_used"))
+            .with_columns(
+                (pl.col("Remaining") - (pl.col("_used") - pl.col("_used").shift(1, fill_value=0).over("Product_ID")))
+                .round(0).cast(pl.Int64).alias("Projected_Waste")
+            )
+            .filter(pl.col("Projected_Waste") > 0)
+            .select(KEY_COLS + ["Days_to_Expire", "Remaining", "Projected_Waste"])
+        )
+
+    def commit(self, plan: DispatchPlan) -> None:
+        """Consume the plan's allocations from stock."""
+        with self._lock:
+            qty = self._qty.copy()
+            np.subtract.at(qty, plan.lot_ids, plan.lot_qty)
+            ids = np.unique(plan.lot_ids)
+            self._set_quantity(ids, np.maximum(qty[ids], 0))
+            # Limpiar las cimas agotadas de los heaps tocados
+            for code in np.unique(self._product[ids]).tolist():
+                heap = self._heaps[code]
+                while heap and self._qty[heap[0] & _ID_MASK] <= 0:
+                    self._in_heap[heapq.heappop(heap) & _ID_MASK] = False
+                    self._stale -= 1
+            self._maybe_compact()
+
+    def daily_demand(self) -> pl.DataFrame:
+        """Product_ID, Daily_Demand: sum of Avg_Usage_per_Day over the live lots of each product."""
+        with self._lock:
+            live = pl.Series(self._qty > 0)
+            return (
+                self._lots.select("Product_ID").with_columns(pl.Series("Daily_Demand", self._usage))
+                .filter(live)
+                .group_by("Product_ID", maintain_order=True)
+                .agg(pl.col("Daily_Demand").sum())
+            )
@@ -0,0 +1,348 @@
+"""
+Multi-station twin, one shard per catering station.
+
+Every station runs in its own worker process: it owns the station's frame,
+advances it on the shared tick (simulate_warehouse + recalc_risk), scores it
+with a PredictionCache (only lots whose features changed hit predict_proba)
+and writes each version as an Arrow IPC file. The server memory-maps those
+files, so a station view reads Arrow buffers straight from the page cache:
+nothing is pickled and the cost is that station's rows only.
+
+Alongside the file path each worker sends small aggregates through the
+queue: the station's KpiView margins and its top-risk lots, both kept by the
+worker across ticks and updated with the lots that changed (ShardAggregates). Fleet-wide KPIs
+are the sum of the margins (kpi_cube.merge_views) and the fleet top-k is the
+top-k of the per-station top-k, so the fleet overview never touches a frame.
+"""
+import atexit
+import logging
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import types
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+import polars as pl
+
+from config import fleet as fl
+from utils.charts import top_risk
+from utils.expiry_index import ExpiryIndex
+from utils.kpi_cube import KpiCube, KpiView, merge_views
+
+MODEL_PATH = "data/waste_model.pkl"
+FEATURES = ["Quantity", "Days_to_Expire", "Avg_Usage_per_Day", "Risk_Score"]
+TOP_K = 10
+KEY_COLS = ["Product_ID", "LOT_Number", "Expiry_Date"]
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ShardSnapshot:
+    """What a station worker publishes for one version (everything but the frame is small)."""
+    station: str
+    version: int
+    taken_at: datetime
+    path: str
+    rows: int
+    kpis: KpiView
+    top_risk: pl.DataFrame
+    predicted_expiring: int
+    tick_seconds: float = field(default=0.0)
+
+
+@dataclass(frozen=True)
+class ShardFailure:
+    """A station tick that raised: the worker logs it, reports it and retries on the next tick."""
+    station: str
+    at: datetime
+    error: str
+
+
+def load_station(station: str, data_dir: str = fl.STATION_DATA_DIR,
+                 lots: int = fl.SYNTHETIC_LOTS_PER_STATION) -> pl.DataFrame:
+    """Initial state of a station: its CSV when present, otherwise seeded synthetic lots (seeded by station)."""
+    from utils.warehouse_state import load_warehouse
+
+    path = Path(data_dir) / f"{station}.csv"
+    if path.exists():
+        df = load_warehouse(str(path), str(path))
+    else:
+        from utils.risk_utils import recalc_risk
+        from utils.synthetic_data import generate
+        df = recalc_risk(generate("processed", lots, seed=zlib.crc32(station.encode())))
+    return df
+
+
+def _write_ipc(df: pl.DataFrame, shard_dir: str, station: str, version: int, keep: int) -> str:
+    station_dir = Path(shard_dir) / station
+    os.makedirs(station_dir, exist_ok=True)
+    path = station_dir / f"v{version:08d}.arrow"
+    tmp = path.with_suffix(".arrow.tmp")
+    df.write_ipc(tmp, compression="uncompressed")
+    os.replace(tmp, path)
+    # Las versiones viejas se borran; un lector que aún las tenga mapeadas conserva sus páginas
+    for old in sorted(station_dir.glob("v*.arrow"))[:-keep]:
+        old.unlink(missing_ok=True)
+    return str(path)
+
+
+def _station_worker(station: str, out: mp.Queue, stop: mp.Event, tick_seconds: float,
+                    shard_dir: str, data_dir: str, lots: int, keep: int, model_path: str) -> None:
+    """Process body: simulate, score and publish one station until `stop` is set."""
+    import time
+
+    from utils import risk_utils, simulate_warehouse
+    from utils.prediction_cache import PredictionCache
+    from utils.predictive_ai import LOT_KEY, load_scoring_model
+
+    df = load_station(station, data_dir, lots)
+    # Mismo modelo que el resto de páginas: el bundle por familia cuando existe
+    try:
+        model, model_tag = load_scoring_model(model_path)
+    except FileNotFoundError:
+        model, model_tag = None, None
+    cache = PredictionCache(maxsize=4 * max(df.height, 1))
+    aggregates = ShardAggregates(TOP_K)
+    version = 0
+    while True:
+        start = time.perf_counter()
+        try:
+            if version:
+                df = risk_utils.recalc_risk(simulate_warehouse.simulate_warehouse(df))
+            if model is not None:
+                probs = cache.predict(model, model_tag, df, LOT_KEY, FEATURES) * 100
+                scored = df.with_columns(pl.Series("Probability_of_Expiration", probs).round(2))
+            else:
+                scored = df.with_columns(pl.lit(None, dtype=pl.Float64).alias("Probability_of_Expiration"))
+            # Station_ID solo en el shard publicado: simulate_warehouse no conoce la columna
+            scored = scored.with_columns(pl.lit(station).alias("Station_ID"))
+            # Cubo y top-k se actualizan con los lotes que cambiaron desde el tick anterior
+            aggregates.update(scored)
+            path = _write_ipc(scored, shard_dir, station, version + 1, keep)
+            version += 1
+            out.put(ShardSnapshot(
+                station=station, version=version, taken_at=datetime.now(), path=path, rows=scored.height,
+                kpis=aggregates.kpis(), top_risk=aggregates.top_risk(),
+                predicted_expiring=int((scored["Probability_of_Expiration"] > 75).sum()),
+                tick_seconds=time.perf_counter() - start,
+            ))
+        except Exception as exc:
+            # Un tick fallido no mata el worker: se registra, se avisa al servidor y se reintenta
+            log.exception("Station %s tick failed", station)
+            # Los agregados pueden haber quedado a medias: el siguiente tick los reconstruye
+            aggregates.reset()
+            out.put(ShardFailure(station=station, at=datetime.now(), error=f"{type(exc).__name__}: {exc}"))
+        if stop.wait(tick_seconds):
+            break
+
+
+def _with_row_hash(df: pl.DataFrame) -> pl.DataFrame:
+    return df.with_columns(pl.struct(pl.all()).hash().alias("_h"))
+
+
+class ShardAggregates:
+    """
+    KPI cube and top-risk lots of one station, kept across ticks: each tick is
+    diffed against the previous one (row hashes, as LiveFeedPublisher) and only
+    the changed lots move in the cube or compete for the top-k.
+    """
+
+    def __init__(self, k: int = TOP_K):
+        self.k = k
+        self.cube = KpiCube()
+        self._state: pl.DataFrame | None = None
+        self._top: pl.DataFrame | None = None
+
+    def reset(self) -> None:
+        """Forget the previous tick: the next update rebuilds from the full frame."""
+        self._state = self._top = None
+
+    def _top_lots(self, df: pl.DataFrame) -> pl.DataFrame:
+        return (
+            df.filter((pl.col("Risk_Score") < 100) & (pl.col("Risk_Score") > 0))
+            .top_k(self.k, by="Risk_Score")
+            .select(KEY_COLS + ["Product_Name", "Risk_Score"])
+        )
+
+    def update(self, df: pl.DataFrame) -> None:
+        current = _with_row_hash(df.unique(subset=KEY_COLS, keep="last", maintain_order=True))
+        if self._state is None:
+            self.cube.rebuild(df)
+            self._top = self._top_lots(df)
+        else:
+            upserts = current.join(self._state.select(KEY_COLS + ["_h"]), on=KEY_COLS + ["_h"], how="anti").drop("_h")
+            deletes = self._state.select(KEY_COLS).join(current, on=KEY_COLS, how="anti")
+            self.cube.apply(upserts, deletes)
+            changed = pl.concat([upserts.select(KEY_COLS), deletes])
+            if self._top.join(changed, on=KEY_COLS, how="semi", nulls_equal=True).is_empty():
+                # Ningún lote del top cambió: el nuevo top-k sale del top anterior y de los lotes cambiados
+                self._top = self._top_lots(pl.concat([self._top, upserts.select(self._top.columns)]))
+            else:
+                self._top = self._top_lots(df)
+        self._state = current
+
+    def kpis(self) -> KpiView:
+        return self.cube.view()
+
+    def top_risk(self) -> pl.DataFrame:
+        return top_risk(self._top, k=self.k)
+
+
+@contextmanager
+def _detached_main():
+    """
+    Streamlit registers the running page as __main__ and spawn re-imports
+    __main__ in every child: hide it while the workers start.
+    """
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+class Fleet:
+    """
+    Server-side handle on the station workers. A receiver thread keeps the
+    latest ShardSnapshot per station; views are opened lazily per version.
+    """
+
+    def __init__(self, stations: list[str], tick_seconds: float, shard_dir: str = fl.SHARD_DIR,
+                 data_dir: str = fl.STATION_DATA_DIR, lots: int = fl.SYNTHETIC_LOTS_PER_STATION,
+                 keep: int = fl.KEEP_VERSIONS, model_path: str = MODEL_PATH):
+        self.stations = list(stations)
+        self.version = 0
+        self._args = (tick_seconds, shard_dir, data_dir, lots, keep, model_path)
+        # spawn: el servidor tiene hilos (tornado, Polars) y fork podría heredar locks tomados
+        self._ctx = mp.get_context("spawn")
+        self._queue = self._ctx.Queue()
+        self._stop = self._ctx.Event()
+        self._procs: list = []
+        self._shards: dict = {}
+        self._failures: dict = {}
+        self._views: dict = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def start(self) -> "Fleet":
+        with _detached_main():
+            for station in self.stations:
+                proc = self._ctx.Process(target=_station_worker, args=(station, self._queue, self._stop, *self._args),
+                                         name=f"station-{station}", daemon=True)
+                proc.start()
+                self._procs.append(proc)
+        threading.Thread(target=self._receive, name="fleet-receiver", daemon=True).start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        for proc in self._procs:
+            proc.join(timeout=5)
+
+    def _receive(self) -> None:
+        while not self._stop.is_set():
+            try:
+                shard = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            if isinstance(shard, ShardFailure):
+                with self._lock:
+                    self._failures[shard.station] = shard
+                continue
+            with self._changed:
+                self._shards[shard.station] = shard
+                self._failures.pop(shard.station, None)
+                self.version += 1
+                self._changed.notify_all()
+
+    def wait_ready(self, timeout: float = 120) -> bool:
+        """Block until every station has published its first version."""
+        with self._changed:
+            return self._changed.wait_for(lambda: len(self._shards) == len(self.stations), timeout)
+
+    def shards(self) -> dict:
+        with self._lock:
+            return dict(self._shards)
+
+    def station_version(self, station: str) -> int:
+        shard = self.shards().get(station)
+        return shard.version if shard else 0
+
+    def station(self, station: str) -> tuple[ShardSnapshot, pl.DataFrame, ExpiryIndex] | None:
+        """
+        Latest version of one station: its snapshot, a session-local frame over the
+        memory-mapped IPC file and its expiry index (built once per version).
+        """
+        shard = self.shards().get(station)
+        if shard is None:
+            return None
+        key = (station, shard.version)
+        with self._lock:
+            view = self._views.get(key)
+        if view is None:
+            df = pl.read_ipc(shard.path, memory_map=True)
+            view = (df, ExpiryIndex.from_frame(df))
+            with self._lock:
+                # Solo la última versión de cada estación queda abierta
+                self._views = {k: v for k, v in self._views.items() if k[0] != station}
+                self._views[key] = view
+        df, index = view
+        return shard, df.clone(), index
+
+    def fleet_kpis(self) -> KpiView:
+        return merge_views([shard.kpis for shard in self.shards().values()])
+
+    def top_risk(self, k: int = TOP_K) -> pl.DataFrame:
+        """Fleet top-k from the per-station top-k."""
+        tops = [s.top_risk.with_columns(pl.lit(s.station).alias("Station_ID")) for s in self.shards().values()]
+        if not tops:
+            return pl.DataFrame(schema={"Product_Name": pl.Utf8, "Risk_Score": pl.Float64, "Station_ID": pl.Utf8})
+        return pl.concat(tops).sort(["Risk_Score", "Product_Name"], descending=[True, False]).head(k)
+
+    def station_status(self) -> dict:
+        """Health of each worker: ok, starting, failing (last tick raised) or dead (process exited)."""
+        with self._lock:
+            shards, failures = dict(self._shards), dict(self._failures)
+        status = {}
+        for station, proc in zip(self.stations, self._procs):
+            if not proc.is_alive():
+                status[station] = f"dead (exit code {proc.exitcode})"
+            elif station in failures:
+                status[station] = f"failing: {failures[station].error}"
+            else:
+                status[station] = "ok" if station in shards else "starting"
+        return status
+
+    def rollup(self) -> pl.DataFrame:
+        """One row per station from its aggregates and worker status, plus the fleet total."""
+        shards, status = self.shards(), self.station_status()
+        rows = []
+        for station in sorted(self.stations):
+            s = shards.get(station)
+            # Una estación sin versión publicada (o con el worker muerto) sigue en la tabla con su estado
+            rows.append({
+                "Station": station, "Status": status.get(station, "starting"),
+                "Version": s.version if s else None, "Lots": s.kpis.total[0] if s else None,
+                "Units": s.kpis.total[1] if s else None,
+                "Expired": s.kpis.lots(max_days=-1) if s else None,
+                "Critical (≤2 days)": s.kpis.lots(max_days=2) if s else None,
+                "Medium (3-7 days)": s.kpis.lots(min_days=3, max_days=7) if s else None,
+                "Predicted expiring": s.predicted_expiring if s else None,
+                "Tick (s)": round(s.tick_seconds, 3) if s else None,
+            })
+        table = pl.DataFrame(rows)
+        if table.is_empty():
+            return table
+        total = table.select(pl.lit("Fleet").alias("Station"), pl.lit(None, dtype=pl.Utf8).alias("Status"),
+                             pl.col("Version").sum(), pl.exclude("Station", "Status", "Version", "Tick (s)").sum(),
+                             pl.col("Tick (s)").max())
+        return pl.concat([table, total.select(table.columns)], how="vertical_relaxed")
@@ -0,0 +1,199 @@
+"""
+Delta-encoded history of the warehouse state, one entry per simulation tick.
+
+Layout of `history_dir` (seq grows with every recorded tick, ts in epoch ms):
+    base-<seq>-<ts>.parquet    full columnar state (every `full_every` ticks)
+    delta-<seq>-<ts>.parquet   changed rows only: upserts (_op="upsert") and
+                               deleted keys (_op="delete")
+
+as_of(t) reads the latest base at or before t and every later delta up to t,
+keeps the last operation per lot key with one sort/unique over all of them,
+and applies it to the base with an anti-join and a concat: no per-delta loop.
+
+compact() bounds the far past (older than `compact_after_days`): it keeps the
+first base of each day, turning every later base of that day into a delta of
+its own tick, and merges the deltas into one per base segment and day (last
+operation per key wins). A past day then costs one base and at most two
+deltas, while recent ticks stay exact. Resolution inside a compacted day is
+coarse: an as_of that falls inside a merged group returns the state at the
+start of that group (its base, or the end of the previous group), and one at
+or after the group's last tick returns the state at its end.
+"""
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import polars as pl
+
+KEY_COLS = ["Product_ID", "LOT_Number", "Expiry_Date"]
+OP_COL = "_op"
+SEQ_COL = "_seq"
+
+
+def _with_row_hash(df: pl.DataFrame) -> pl.DataFrame:
+    return df.with_columns(pl.struct(pl.all()).hash().alias("_h"))
+
+
+def _stamp(at: datetime) -> int:
+    return int(at.timestamp() * 1000)
+
+
+def _write_atomic(df: pl.DataFrame, path: Path) -> None:
+    tmp = path.with_suffix(".tmp")
+    df.write_parquet(tmp)
+    os.replace(tmp, path)
+
+
+def _diff(previous: pl.DataFrame, current: pl.DataFrame) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """(upserts, deleted keys) that turn `previous` into `current`; both frames carry the _h row hash."""
+    upserts = current.join(previous.select(KEY_COLS + ["_h"]), on=KEY_COLS + ["_h"], how="anti").drop("_h")
+    deletes = previous.select(KEY_COLS).join(current, on=KEY_COLS, how="anti")
+    return upserts, deletes
+
+
+def _delta_frame(upserts: pl.DataFrame, deletes: pl.DataFrame | None) -> pl.DataFrame:
+    parts = [upserts.with_columns(pl.lit("upsert").alias(OP_COL))]
+    if deletes is not None and not deletes.is_empty():
+        parts.append(deletes.select(KEY_COLS).with_columns(pl.lit("delete").alias(OP_COL)))
+    return pl.concat(parts, how="diagonal_relaxed")
+
+
+class HistoryStore:
+    def __init__(self, history_dir: str, full_every: int = 500, compact_after_days: int = 7,
+                 compact_every: int = 200):
+        self.dir = Path(history_dir)
+        self.full_every = full_every
+        self.compact_after_days = compact_after_days
+        self.compact_every = compact_every
+        os.makedirs(self.dir, exist_ok=True)
+        entries = self.entries()
+        # Tras un reinicio la secuencia continúa; el primer registro es un base completo
+        self.seq = max((e[1] for e in entries), default=0)
+        self.base_seq = 0
+        self._state: pl.DataFrame | None = None
+        self._since_compact = 0
+
+    def entries(self) -> list[tuple[str, int, int, Path]]:
+        """(kind, seq, ts, path) of every stored file, in seq order."""
+        out = []
+        for path in self.dir.glob("*.parquet"):
+            kind, seq, ts = path.stem.split("-")
+            out.append((kind, int(seq), int(ts), path))
+        return sorted(out, key=lambda e: e[1])
+
+    def record(self, df: pl.DataFrame, at: datetime | None = None,
+               upserts: pl.DataFrame | None = None, deletes: pl.DataFrame | None = None) -> int | None:
+        """
+        Append the state of one tick. Pass the tick's upserts/deletes when the caller
+        already has them (live feed publisher); otherwise the state is diffed here.
+        Returns the new seq, or None when nothing changed.
+        """
+        at = at or datetime.now()
+        current = _with_row_hash(df.unique(subset=KEY_COLS, keep="last", maintain_order=True))
+        if self._state is None or self.seq - self.base_seq >= self.full_every:
+            self.seq += 1
+            _write_atomic(current.drop("_h"), self.dir / f"base-{self.seq:010d}-{_stamp(at)}.parquet")
+            self.base_seq = self.seq
+        else:
+            if upserts is None:
+                upserts, deletes = _diff(self._state, current)
+            if upserts.is_empty() and (deletes is None or deletes.is_empty()):
+                self._state = current
+                return None
+            self.seq += 1
+            _write_atomic(_delta_frame(upserts, deletes), self.dir / f"delta-{self.seq:010d}-{_stamp(at)}.parquet")
+        self._state = current
+
+        self._since_compact += 1
+        if self.compact_every and self._since_compact >= self.compact_every:
+            self.compact(at - timedelta(days=self.compact_after_days))
+            self._since_compact = 0
+        return self.seq
+
+    def as_of(self, at: datetime) -> pl.DataFrame | None:
+        """State of the warehouse at `at` (None when the history starts later)."""
+        ts = _stamp(at)
+        return self._rebuild([e for e in self.entries() if e[2] <= ts])
+
+    def _rebuild(self, entries: list) -> pl.DataFrame | None:
+        """State after the last of `entries`: its latest base plus every later delta."""
+        bases = [e for e in entries if e[0] == "base"]
+        if not bases:
+            return None
+        _, base_seq, _, base_path = bases[-1]
+        state = pl.read_parquet(base_path)
+        deltas = [e[3] for e in entries if e[0] == "delta" and e[1] > base_seq]
+        if not deltas:
+            return state
+        return self._apply(state, deltas)
+
+    @staticmethod
+    def _collapse(paths: list[Path]) -> pl.DataFrame:
+        """Last operation per lot key over several deltas, read as one scan."""
+        frames = [
+            pl.read_parquet(p).with_columns(pl.lit(int(p.stem.split("-")[1])).alias(SEQ_COL)) for p in paths
+        ]
+        return (
+            pl.concat(frames, how="diagonal_relaxed")
+            .sort(SEQ_COL)
+            .unique(subset=KEY_COLS, keep="last", maintain_order=True)
+        )
+
+    def _apply(self, state: pl.DataFrame, deltas: list[Path]) -> pl.DataFrame:
+        last = self._collapse(deltas)
+        keys = last.select(KEY_COLS).cast(state.select(KEY_COLS).schema)
+        upserts = last.filter(pl.col(OP_COL) == "upsert").select(state.columns).cast(state.schema)
+        return pl.concat([state.join(keys, on=KEY_COLS, how="anti"), upserts], how="vertical")
+
+    def compact(self, before: datetime) -> int:
+        """
+        Bound the history older than `before`: one base per day (later bases become
+        deltas of their own tick) and one merged delta per (base segment, day).
+        Returns files removed.
+        """
+        cutoff = _stamp(before)
+        removed = self._fold_bases(cutoff)
+
+        groups: dict = {}
+        segment = 0
+        for kind, seq, ts, path in self.entries():
+            if kind == "base":
+                segment = seq
+            elif ts < cutoff:
+                day = datetime.fromtimestamp(ts / 1000).date()
+                groups.setdefault((segment, day), []).append((seq, ts, path))
+
+        for group in groups.values():
+            if len(group) < 2:
+                continue
+            seq, ts, _ = group[-1]
+            merged = self._collapse([p for _, _, p in group]).drop(SEQ_COL)
+            # Se escribe bajo la seq y el ts del último delta del día antes de borrar los originales
+            target = self.dir / f"delta-{seq:010d}-{ts}.parquet"
+            _write_atomic(merged, target)
+            for _, _, path in group[:-1]:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def _fold_bases(self, cutoff: int) -> int:
+        """Replace every base older than `cutoff` but the first of its day by the delta of its tick."""
+        seen_days = set()
+        folded = 0
+        for kind, seq, ts, path in self.entries():
+            if kind != "base" or ts >= cutoff:
+                continue
+            day = datetime.fromtimestamp(ts / 1000).date()
+            if day not in seen_days:
+                seen_days.add(day)
+                continue
+            # El tick del base también cambió filas: se guardan como delta antes de borrarlo
+            previous = self._rebuild([e for e in self.entries() if e[1] < seq])
+            base = pl.read_parquet(path)
+            if previous is None or previous.columns != base.columns:
+                continue
+            upserts, deletes = _diff(_with_row_hash(previous), _with_row_hash(base.cast(previous.schema)))
+            _write_atomic(_delta_frame(upserts, deletes), self.dir / f"delta-{seq:010d}-{ts}.parquet")
+            path.unlink(missing_ok=True)
+            folded += 1
+        return folded
@@ -0,0 +1,258 @@
+"""
+Lightweight per-stage timing.
+
+Enable with SMARTTWIN_METRICS=1. Spans record wall time, rows processed and
+the memory of the stage, aggregate them per stage and periodically rewrite a
+Prometheus text file (SMARTTWIN_METRICS_PATH, default data/metrics.prom).
+Stage memory is the peak within the span over the memory in use when it
+started. By default it is measured on the RSS: when the stage raises the
+process high-water mark (ru_maxrss) the peak is exact; otherwise only the
+net RSS growth at exit is known, a lower bound. SMARTTWIN_TRACE_MEMORY=1
+switches to tracemalloc (exact for Python and numpy allocations, but slows
+Python code noticeably); nested spans fold their peak back into the parent.
+With concurrent spans in several threads the figures include the other
+threads' allocations.
+
+When disabled, span() returns a shared no-op context manager and timed()
+wrappers cost a single flag check.
+"""
+import atexit
+import functools
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+ENABLED = os.environ.get("SMARTTWIN_METRICS", "0") == "1"
+TRACE_MEMORY = os.environ.get("SMARTTWIN_TRACE_MEMORY", "0") == "1"
+METRICS_PATH = os.environ.get("SMARTTWIN_METRICS_PATH", "data/metrics.prom")
+FLUSH_INTERVAL = 5.0
+
+_lock = threading.Lock()
+_stages: dict = {}
+_recent = deque(maxlen=500)
+_local = threading.local()
+_last_flush = 0.0
+
+
+def enable(trace_memory: bool = False) -> None:
+    """Turn instrumentation on at runtime (benchmarks, notebooks)."""
+    global ENABLED, TRACE_MEMORY
+    if not ENABLED:
+        atexit.register(flush)
+    ENABLED = True
+    TRACE_MEMORY = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _max_rss_bytes() -> int:
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def _rss_bytes() -> int:
+    """Current RSS; where /proc is missing, the process peak (ru_maxrss) is the best available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return _max_rss_bytes()
+
+
+def _tracing() -> bool:
+    return TRACE_MEMORY and tracemalloc.is_tracing()
+
+
+def _memory_label() -> str:
+    return "Traced peak MB" if _tracing() else "Peak RSS MB"
+
+
+def _span_stack() -> list:
+    stack = getattr(_local, "spans", None)
+    if stack is None:
+        stack = _local.spans = []
+    return stack
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set_rows(self, rows: int) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ("name", "rows", "_start", "_mem_start", "_hwm_start", "_peak")
+
+    def __init__(self, name: str, rows: int | None = None):
+        self.name = name
+        self.rows = rows
+
+    def set_rows(self, rows: int) -> None:
+        self.rows = rows
+
+    def __enter__(self):
+        if _tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            stack = _span_stack()
+            # reset_peak es global: el pico visto hasta ahora pertenece al span padre
+            if stack:
+                stack[-1]._peak = max(stack[-1]._peak, peak)
+            stack.append(self)
+            tracemalloc.reset_peak()
+            self._mem_start = self._peak = current
+        else:
+            self._mem_start, self._hwm_start = _rss_bytes(), _max_rss_bytes()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._start
+        if _tracing() and getattr(_local, "spans", None) and _local.spans[-1] is self:
+            _local.spans.pop()
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            # El pico del hijo también es pico del padre
+            if _local.spans:
+                _local.spans[-1]._peak = max(_local.spans[-1]._peak, self._peak)
+            memory = self._peak - self._mem_start
+        elif hasattr(self, "_hwm_start"):
+            hwm = _max_rss_bytes()
+            # Si la etapa subió el máximo del proceso, ese máximo es su pico; si no, solo se conoce la RSS final
+            end = hwm if hwm > self._hwm_start else _rss_bytes()
+            memory = max(0, end - self._mem_start)
+        else:
+            # El modo cambió entre enter y exit (enable() en medio): sin medida de memoria
+            memory = 0
+        _record(self.name, elapsed, self.rows, memory)
+        return False
+
+
+def span(name: str, rows: int | None = None):
+    """Context manager timing a block: `with span("render.pie", rows=df.height): ...`"""
+    return Span(name, rows) if ENABLED else _NULL_SPAN
+
+
+def _rows_of(result) -> int | None:
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    height = getattr(result, "height", None)
+    if height is None and hasattr(result, "shape"):
+        height = result.shape[0] if len(result.shape) else None
+    return height
+
+
+def timed(name: str | None = None):
+    """Decorator version of span(); rows are taken from the returned frame/array when possible."""
+    def decorator(fn):
+        stage = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with Span(stage) as s:
+                result = fn(*args, **kwargs)
+                s.set_rows(_rows_of(result))
+            return result
+        return wrapper
+    return decorator
+
+
+def _record(name: str, elapsed: float, rows: int | None, memory: int) -> None:
+    entry = (time.time(), name, elapsed, rows, memory)
+    with _lock:
+        agg = _stages.setdefault(name, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "rows": 0, "memory_bytes": 0})
+        agg["calls"] += 1
+        agg["seconds"] += elapsed
+        agg["max_seconds"] = max(agg["max_seconds"], elapsed)
+        agg["rows"] += rows or 0
+        agg["memory_bytes"] = max(agg["memory_bytes"], memory)
+        _recent.append(entry)
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run.append(entry)
+    if time.time() - _last_flush > FLUSH_INTERVAL:
+        flush()
+
+
+def start_run() -> None:
+    """Mark the start of a script rerun; spans of this thread are collected for the overlay."""
+    if ENABLED:
+        _local.run = []
+
+
+def current_run() -> list:
+    return list(getattr(_local, "run", None) or [])
+
+
+def stage_stats() -> dict:
+    with _lock:
+        return {k: dict(v) for k, v in _stages.items()}
+
+
+def to_prometheus() -> str:
+    stats = stage_stats()
+    lines = []
+    metrics = [
+        ("smarttwin_stage_calls_total", "counter", "Number of executions per stage", "calls"),
+        ("smarttwin_stage_seconds_total", "counter", "Wall time spent per stage", "seconds"),
+        ("smarttwin_stage_max_seconds", "gauge", "Slowest single execution per stage", "max_seconds"),
+        ("smarttwin_stage_rows_total", "counter", "Rows processed per stage", "rows"),
+        ("smarttwin_stage_memory_bytes", "gauge",
+         "Largest per-execution peak memory over the stage's starting memory", "memory_bytes"),
+    ]
+    for metric, kind, help_text, field in metrics:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for stage, agg in sorted(stats.items()):
+            lines.append(f'{metric}{{stage="{stage}"}} {agg[field]}')
+    return "\n".join(lines) + "\n"
+
+
+def flush(path: str | None = None) -> None:
+    """Rewrite the metrics file atomically (node_exporter textfile-collector style)."""
+    global _last_flush
+    _last_flush = time.time()
+    path = path or METRICS_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(to_prometheus())
+    os.replace(tmp, path)
+
+
+if ENABLED:
+    atexit.register(flush)
+    if TRACE_MEMORY:
+        tracemalloc.start()
+
+
+def render_overlay() -> None:
+    """Optional Streamlit expander with the spans of the current rerun."""
+    if not ENABLED:
+        return
+    import streamlit as st
+
+    run = current_run()
+    with st.expander(f"⏱ Timing ({len(run)} spans this rerun)"):
+        st.dataframe(
+            [{"Stage": name, "ms": round(elapsed * 1000, 2), "Rows": rows, _memory_label(): round(memory / 2**20, 1)}
+             for _, name, elapsed, rows, memory in run],
+            use_container_width=True,
+            hide_index=True,
+        )
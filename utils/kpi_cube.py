@@ -0,0 +1,233 @@
+"""
+Aggregate cube of lot counts and quantities by
+Status × Product_ID × Zone × expiry-day bucket.
+
+The cube remembers each lot's cell, so applying a delta (upserted rows and
+deleted keys) moves only those lots between cells: O(delta), not O(lots).
+The lot → cell map is a sorted array of key hashes with parallel cell ids
+and quantities (searchsorted lookups, as in fefo_planner), and a batch is
+folded into the cells with one group-by per cell: the Python work is per
+distinct cell touched, never per lot, so building the cube for a whole
+frame is a bulk Polars/numpy pass. Marginal totals are maintained alongside
+the cells, so dashboard KPIs are dictionary lookups over at most a handful
+of buckets.
+
+Buckets come from Days_to_Expire and the edges below:
+    "<0" (expired), "0", "1", "2", "3-7", "8-30", "31+"
+so every threshold the pages use (≤2 days, ≤7 days, Risk_Score > 85 ⇔ days ≤ 1,
+Risk_Score < 100 ⇔ days ≥ 1) falls on a bucket boundary.
+"""
+import threading
+from dataclasses import dataclass, field
+
+import numpy as np
+import polars as pl
+
+KEY_COLS = ["Product_ID", "LOT_Number", "Expiry_Date"]
+BUCKET_EDGES = [0, 1, 2, 3, 8, 31]
+BUCKET_LABELS = ["<0", "0", "1", "2", "3-7", "8-30", "31+"]
+# Límite inferior de días de cada bucket (None = sin límite)
+BUCKET_LOW = [None, 0, 1, 2, 3, 8, 31]
+BUCKET_HIGH = [-1, 0, 1, 2, 7, 30, None]
+NO_ZONE = "Unassigned"
+# Marginales mantenidos además de las celdas completas
+MARGINS = [("Status",), ("Product_ID",), ("Zone",), ("Bucket",), ("Status", "Bucket")]
+CELL_COLS = ["Status", "_product", "Zone", "Bucket"]
+
+
+def _cell_frame(df: pl.DataFrame) -> pl.DataFrame:
+    """Key, cell coordinates and quantity of every lot of `df`."""
+    days = pl.col("Days_to_Expire").cast(pl.Int64)
+    bucket = pl.sum_horizontal([(days >= edge).cast(pl.Int32) for edge in BUCKET_EDGES])
+    zone = pl.col("Zone").cast(pl.Utf8).fill_null(NO_ZONE) if "Zone" in df.columns else pl.lit(NO_ZONE)
+    return df.select(
+        [pl.col(c).cast(pl.Utf8) for c in KEY_COLS] + [
+            pl.col("Status").cast(pl.Utf8).fill_null(""),
+            pl.col("Product_ID").cast(pl.Utf8).alias("_product"),
+            zone.alias("Zone"),
+            bucket.fill_null(0).alias("Bucket"),
+            pl.col("Quantity").cast(pl.Int64).fill_null(0),
+        ]
+    )
+
+
+def _key_hashes(cells: pl.DataFrame) -> np.ndarray:
+    return cells.select(KEY_COLS).hash_rows().to_numpy()
+
+
+def _in_range(bucket: int, min_days: int | None, max_days: int | None) -> bool:
+    """True when the whole bucket lies in [min_days, max_days] (bounds must fall on bucket edges)."""
+    low, high = BUCKET_LOW[bucket], BUCKET_HIGH[bucket]
+    if min_days is not None and (low is None or low < min_days):
+        return False
+    if max_days is not None and (high is None or high > max_days):
+        return False
+    return True
+
+
+@dataclass(frozen=True)
+class KpiView:
+    """Immutable copy of the cube margins; what sessions read."""
+    total: tuple
+    margins: dict = field(default_factory=dict)
+
+    def _margin(self, name: tuple) -> dict:
+        return self.margins.get(name, {})
+
+    def lots(self, min_days: int | None = None, max_days: int | None = None) -> int:
+        """Lots whose Days_to_Expire is within [min_days, max_days]."""
+        return sum(v[0] for (b,), v in self._margin(("Bucket",)).items() if _in_range(b, min_days, max_days))
+
+    def quantity(self, min_days: int | None = None, max_days: int | None = None) -> int:
+        return sum(v[1] for (b,), v in self._margin(("Bucket",)).items() if _in_range(b, min_days, max_days))
+
+    def by(self, dim: str) -> dict:
+        """{value: (lots, quantity)} along one dimension (Status, Product_ID, Zone, Bucket)."""
+        out = {k[0]: tuple(v) for k, v in self._margin((dim,)).items() if v[0]}
+        if dim == "Bucket":
+            out = {BUCKET_LABELS[b]: v for b, v in sorted(out.items())}
+        return out
+
+    def status_counts(self, min_days: int | None = None, exclude: tuple = ()) -> pl.DataFrame:
+        """Lots per Status (Status, len) for the given day range — same shape as charts.status_counts."""
+        counts: dict = {}
+        for (status, b), v in self._margin(("Status", "Bucket")).items():
+            if v[0] and status.lower() not in exclude and _in_range(b, min_days, None):
+                counts[status] = counts.get(status, 0) + v[0]
+        return (
+            pl.DataFrame({"Status": list(counts), "len": list(counts.values())},
+                         schema={"Status": pl.Utf8, "len": pl.UInt32})
+            .sort(["len", "Status"], descending=[True, False])
+        )
+
+
+def merge_views(views: list[KpiView]) -> KpiView:
+    """Sum of several views (e.g. one per station): margins are additive, so roll-ups are exact."""
+    total = [0, 0]
+    margins: dict = {}
+    for view in views:
+        total[0] += view.total[0]
+        total[1] += view.total[1]
+        for name, agg in view.margins.items():
+            merged = margins.setdefault(name, {})
+            for key, (lots, qty) in agg.items():
+                old = merged.get(key, (0, 0))
+                merged[key] = (old[0] + lots, old[1] + qty)
+    return KpiView(total=tuple(total), margins=margins)
+
+
+class KpiCube:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.cells: dict = {}
+        self.margins: dict = {m: {} for m in MARGINS}
+        self.total = [0, 0]
+        # Celdas distintas vistas (pocas): id ↔ coordenadas
+        self._cell_keys: list = []
+        self._cell_ids: dict = {}
+        # Lote → celda: hashes de clave ordenados con su id de celda y cantidad en paralelo
+        self._hash_sorted = np.empty(0, dtype=np.uint64)
+        self._lot_cell = np.empty(0, dtype=np.int32)
+        self._lot_qty = np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def from_frame(cls, df: pl.DataFrame) -> "KpiCube":
+        cube = cls()
+        cube.apply(df)
+        return cube
+
+    def _add(self, cell: tuple, lots: int, qty: int) -> None:
+        coords = dict(zip(("Status", "Product_ID", "Zone", "Bucket"), cell))
+        for target, key in [(self.cells, cell)] + [(self.margins[m], tuple(coords[d] for d in m)) for m in MARGINS]:
+            agg = target.setdefault(key, [0, 0])
+            agg[0] += lots
+            agg[1] += qty
+        self.total[0] += lots
+        self.total[1] += qty
+
+    def _fold(self, cell_ids: np.ndarray, qty: np.ndarray, sign: int) -> None:
+        """Add (sign=+1) or remove (-1) lots from their cells: one update per distinct cell."""
+        if not len(cell_ids):
+            return
+        lots = np.bincount(cell_ids, minlength=len(self._cell_keys))
+        sums = np.bincount(cell_ids, weights=qty, minlength=len(self._cell_keys))
+        for cid in np.flatnonzero(lots):
+            self._add(self._cell_keys[cid], sign * int(lots[cid]), sign * int(round(sums[cid])))
+
+    def _cell_ids_of(self, cells: pl.DataFrame) -> np.ndarray:
+        """Cell id of every row, registering the cells not seen before."""
+        distinct = cells.select(CELL_COLS).unique()
+        ids = []
+        for cell in distinct.iter_rows():
+            cid = self._cell_ids.get(cell)
+            if cid is None:
+                cid = self._cell_ids[cell] = len(self._cell_keys)
+                self._cell_keys.append(cell)
+            ids.append(cid)
+        mapping = distinct.with_columns(pl.Series("_cid", ids, dtype=pl.Int32))
+        # El join (left) conserva el orden de filas; Product_ID nulo es una coordenada válida
+        return cells.join(mapping, on=CELL_COLS, how="left", nulls_equal=True)["_cid"].to_numpy()
+
+    def _lookup(self, hashes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(position in the sorted map, found mask) of each key hash."""
+        if not len(self._hash_sorted):
+            return np.zeros(len(hashes), dtype=np.int64), np.zeros(len(hashes), dtype=bool)
+        pos = np.minimum(np.searchsorted(self._hash_sorted, hashes), len(self._hash_sorted) - 1)
+        return pos, self._hash_sorted[pos] == hashes
+
+    def apply(self, upserts: pl.DataFrame | None, deletes: pl.DataFrame | None = None) -> int:
+        """
+        Move the changed lots between cells. `upserts` are full lot rows (new or
+        changed); `deletes` only needs the key columns. Returns rows touched.
+        """
+        touched = 0
+        with self._lock:
+            if upserts is not None and not upserts.is_empty():
+                # Una clave repetida en el lote cuenta una vez, con su última fila
+                cells = _cell_frame(upserts).unique(subset=KEY_COLS, keep="last", maintain_order=True)
+                hashes = _key_hashes(cells)
+                new_cell = self._cell_ids_of(cells)
+                new_qty = cells["Quantity"].to_numpy()
+                pos, found = self._lookup(hashes)
+
+                # Los lotes conocidos salen de su celda anterior y se actualizan en el mapa
+                old = pos[found]
+                self._fold(self._lot_cell[old], self._lot_qty[old], -1)
+                self._lot_cell[old] = new_cell[found]
+                self._lot_qty[old] = new_qty[found]
+                self._fold(new_cell, new_qty, +1)
+
+                # Los nuevos se insertan en orden (O(lotes) en C, sin reordenar el mapa)
+                order = np.argsort(hashes[~found], kind="stable")
+                fresh = hashes[~found][order]
+                at = np.searchsorted(self._hash_sorted, fresh)
+                self._hash_sorted = np.insert(self._hash_sorted, at, fresh)
+                self._lot_cell = np.insert(self._lot_cell, at, new_cell[~found][order])
+                self._lot_qty = np.insert(self._lot_qty, at, new_qty[~found][order])
+                touched += cells.height
+            if deletes is not None and not deletes.is_empty():
+                keys = deletes.select([pl.col(c).cast(pl.Utf8) for c in KEY_COLS]).unique()
+                pos, found = self._lookup(_key_hashes(keys))
+                gone = pos[found]
+                self._fold(self._lot_cell[gone], self._lot_qty[gone], -1)
+                self._hash_sorted = np.delete(self._hash_sorted, gone)
+                self._lot_cell = np.delete(self._lot_cell, gone)
+                self._lot_qty = np.delete(self._lot_qty, gone)
+                touched += len(gone)
+        return touched
+
+    def rebuild(self, df: pl.DataFrame) -> None:
+        with self._lock:
+            self.reset()
+        self.apply(df)
+
+    def view(self) -> KpiView:
+        """Snapshot of the margins (size independent of the number of lots)."""
+        with self._lock:
+            return KpiView(
+                total=tuple(self.total),
+                margins={m: {k: tuple(v) for k, v in agg.items() if v[0]} for m, agg in self.margins.items()},
+            )
@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+import polars as pl
+
+from utils.drift_monitor import LiveDriftMonitor
+from utils.expiry_index import ExpiryIndex
+from utils.kpi_cube import KpiCube
+
+KEY_COLS = ["Product_ID", "LOT_Number", "Expiry_Date"]
+OP_COL = "_op"
+
+
+def _with_row_hash(df: pl.DataFrame) -> pl.DataFrame:
+    return df.with_columns(pl.struct(pl.all()).hash().alias("_h"))
+
+
+def _write_atomic(df: pl.DataFrame, path: Path) -> None:
+    tmp = path.with_suffix(".tmp")
+    df.write_parquet(tmp)
+    os.replace(tmp, path)
+
+
+class LiveFeedPublisher:
+    """
+    Single producer of warehouse state. publish() diffs the new state against the
+    last published one and appends only the changed rows as a versioned delta;
+    when nothing changed the tick is skipped and the version stays the same.
+
+    Layout of `feed_dir`:
+        snapshot-<v>.parquet   full state at version v (every `snapshot_every` versions)
+        delta-<v>.parquet      upserted rows (_op="upsert") and deleted keys (_op="delete")
+        VERSION                {"version": v, "snapshot": s} — written last, so readers
+                               never see a version whose files are not on disk yet
+    """
+
+    def __init__(self, feed_dir: str, snapshot_every: int = 50):
+        self.feed_dir = Path(feed_dir)
+        self.snapshot_every = snapshot_every
+        os.makedirs(self.feed_dir, exist_ok=True)
+        # Al reiniciar el productor las versiones siguen creciendo (el primer publish es un snapshot)
+        try:
+            self.version = json.loads((self.feed_dir / "VERSION").read_text())["version"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            self.version = 0
+        self.snapshot_version = 0
+        self._state: pl.DataFrame | None = None
+        # Cambios del último publish, para quien mantenga agregados incrementales
+        self.last_upserts: pl.DataFrame | None = None
+        self.last_deletes: pl.DataFrame | None = None
+
+    def publish(self, df: pl.DataFrame) -> int | None:
+        """Returns the new version, or None when the state did not change."""
+        current = _with_row_hash(df.unique(subset=KEY_COLS, keep="last", maintain_order=True))
+
+        if self._state is None:
+            self.version += 1
+            self._write_snapshot(current)
+            self.last_upserts, self.last_deletes = current.drop("_h"), None
+        else:
+            upserts = current.join(self._state.select(KEY_COLS + ["_h"]), on=KEY_COLS + ["_h"], how="anti")
+            deletes = self._state.select(KEY_COLS).join(current, on=KEY_COLS, how="anti")
+            if upserts.is_empty() and deletes.is_empty():
+                return None
+
+            self.version += 1
+            self.last_upserts, self.last_deletes = upserts.drop("_h"), deletes
+            if self.version - self.snapshot_version >= self.snapshot_every:
+                self._write_snapshot(current)
+            else:
+                delta = pl.concat([
+                    upserts.drop("_h").with_columns(pl.lit("upsert").alias(OP_COL)),
+                    deletes.with_columns(pl.lit("delete").alias(OP_COL)),
+                ], how="diagonal_relaxed")
+                _write_atomic(delta, self.feed_dir / f"delta-{self.version:08d}.parquet")
+
+        self._state = current
+        self._write_version()
+        return self.version
+
+    def _write_snapshot(self, current: pl.DataFrame) -> None:
+        _write_atomic(current.drop("_h"), self.feed_dir / f"snapshot-{self.version:08d}.parquet")
+        self.snapshot_version = self.version
+
+    def _write_version(self) -> None:
+        tmp = self.feed_dir / "VERSION.tmp"
+        tmp.write_text(json.dumps({"version": self.version, "snapshot": self.snapshot_version}))
+        os.replace(tmp, self.feed_dir / "VERSION")
+        # Compacta: todo lo anterior al último snapshot ya no hace falta
+        for old in self.feed_dir.glob("*.parquet"):
+            if int(old.stem.split("-")[1]) < self.snapshot_version:
+                old.unlink(missing_ok=True)
+
+
+class LiveFeedSubscriber:
+    """
+    Materializes the published state for every session of the server. Reading the
+    version is a tiny file read; deltas are applied only when the version moved.
+    """
+
+    def __init__(self, feed_dir: str):
+        self.feed_dir = Path(feed_dir)
+        self.version = 0
+        self.state: pl.DataFrame | None = None
+        self.cube = KpiCube()
+        self.drift = LiveDriftMonitor(KEY_COLS)
+        # (state, version, kpis, index, drift, lotes re-binneados) reemplazado de una vez: siempre coherente entre sí
+        self.view: tuple = (None, 0, None, None, None, 0)
+        self._lock = threading.Lock()
+
+    def published(self) -> dict:
+        try:
+            return json.loads((self.feed_dir / "VERSION").read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"version": 0, "snapshot": 0}
+
+    def poll(self) -> tuple[pl.DataFrame | None, int]:
+        """Latest state and its version (None, 0 when no producer has published yet)."""
+        head = self.published()
+        if head["version"] != self.view[1]:
+            with self._lock:
+                if head["version"] != self.version:
+                    try:
+                        self._catch_up(head)
+                    except FileNotFoundError:
+                        # Un delta fue compactado mientras leíamos: recarga desde el snapshot
+                        self.state, self.version = None, 0
+                        self._catch_up(self.published())
+        state, version = self.view[:2]
+        return state, version
+
+    def _catch_up(self, head: dict) -> None:
+        start, rebinned = self.version, 0
+        if self.state is None or head["snapshot"] > self.version or head["version"] < self.version:
+            self.state = pl.read_parquet(self.feed_dir / f"snapshot-{head['snapshot']:08d}.parquet")
+            self.cube.rebuild(self.state)
+            self.drift.observe(self.state)
+            rebinned = self.drift.last_changed
+            start = head["snapshot"]
+
+        for v in range(start + 1, head["version"] + 1):
+            delta = pl.read_parquet(self.feed_dir / f"delta-{v:08d}.parquet")
+            upserts = delta.filter(pl.col(OP_COL) == "upsert").drop(OP_COL).select(self.state.columns)
+            self.state = pl.concat([
+                self.state.join(delta.select(KEY_COLS), on=KEY_COLS, how="anti"),
+                upserts.cast(self.state.schema),
+            ], how="vertical")
+            deletes = delta.filter(pl.col(OP_COL) == "delete")
+            self.cube.apply(upserts, deletes)
+            rebinned += self.drift.apply_delta(upserts, deletes)
+        self.version = head["version"]
+        # Los deltas reordenan filas (anti-join + concat): el índice se reconstruye aquí
+        self.view = (self.state, self.version, self.cube.view(), ExpiryIndex.from_frame(self.state),
+                     self.drift.view(), rebinned)
@@ -0,0 +1,258 @@
+"""
+Shared-memory lot store: worker processes read the lots without pickling frames.
+
+A store is a family of `multiprocessing.shared_memory` segments:
+    <name>          header: [seq, generation] (int64), updated as a seqlock
+    <name>-g<gen>   one immutable generation: a JSON layout followed by
+                    64-byte aligned buffers (numeric feature columns, and
+                    dictionary-encoded key columns as int32 codes plus the
+                    UTF-8 dictionary with its offsets)
+
+publish() writes a complete new generation and only then flips the header, so
+a reader either attaches the previous generation or the new one, never a
+half-written one. Readers attach by name (`attach(name)` for the latest,
+`attach(name, gen)` for a specific one) and get read-only numpy views over the
+segment: no copy, no pickling. The writer keeps the last `keep` generations
+alive; an unlinked segment stays mapped for readers already attached to it.
+Arrays from column()/codes() must be released before the view is closed;
+frame() returns its own copy and can outlive the view.
+"""
+import json
+import os
+import secrets
+import time
+from collections import deque
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import polars as pl
+
+NUMERIC_COLS = ["Quantity", "Days_to_Expire", "Avg_Usage_per_Day", "Risk_Score"]
+KEY_COLS = ["Product_ID", "LOT_Number", "Expiry_Date"]
+ALIGN = 64
+
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _dictionary_encode(s: pl.Series) -> tuple[np.ndarray, np.ndarray, bytes]:
+    """(int32 codes, int64 offsets, UTF-8 data); nulls get code -1."""
+    s = s.cast(pl.Utf8)
+    # Rango denso = código sobre el diccionario ordenado, sin bucle por fila
+    codes = (s.rank("dense") - 1).fill_null(-1).cast(pl.Int32).to_numpy()
+    dictionary = s.drop_nulls().unique().sort()
+    lengths = dictionary.str.len_bytes().cast(pl.Int64).to_numpy()
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    data = dictionary.str.join("").item().encode() if dictionary.len() else b""
+    return codes, offsets, data
+
+
+class SharedLotStore:
+    """Single writer of a store; each publish() is a new immutable generation."""
+
+    def __init__(self, name: str | None = None, keep: int = 2,
+                 numeric: list[str] | None = NUMERIC_COLS, keys: list[str] = KEY_COLS):
+        # numeric=None: todas las columnas numéricas del frame publicado (salvo las claves)
+        self.name = name or f"lots-{os.getpid()}-{secrets.token_hex(4)}"
+        self.keep = keep
+        self.numeric = numeric
+        self.keys = keys
+        self._header = SharedMemory(name=self.name, create=True, size=16)
+        self._hdr = np.ndarray(2, dtype=np.int64, buffer=self._header.buf)
+        self._hdr[:] = 0
+        self.generation = 0
+        self._segments: deque = deque()
+
+    def publish(self, df: pl.DataFrame) -> int:
+        """Copy the numeric and key columns of `df` into a new generation; returns its number."""
+        buffers = {}
+        numeric = self.numeric if self.numeric is not None else [
+            c for c, dtype in df.schema.items() if dtype.is_numeric() and c not in self.keys
+        ]
+        for col in numeric:
+            if col in df.columns:
+                buffers[col] = df[col].cast(pl.Float64).fill_null(np.nan).to_numpy()
+        dicts = {}
+        for col in self.keys:
+            if col in df.columns:
+                dicts[col] = _dictionary_encode(df[col])
+
+        layout = {"rows": df.height, "columns": {}, "dicts": {}}
+        blobs = []
+        offset = 0
+
+        def place(arr_or_bytes) -> list:
+            nonlocal offset
+            raw = arr_or_bytes if isinstance(arr_or_bytes, bytes) else arr_or_bytes.tobytes()
+            blobs.append((offset, raw))
+            spec = [offset, len(raw)]
+            offset = _align(offset + len(raw))
+            return spec
+
+        for col, arr in buffers.items():
+            layout["columns"][col] = place(arr)
+        for col, (codes, offsets, data) in dicts.items():
+            layout["dicts"][col] = {"codes": place(codes), "offsets": place(offsets), "data": place(data)}
+
+        meta = json.dumps(layout).encode()
+        base = _align(8 + len(meta))
+        gen = self.generation + 1
+        shm = SharedMemory(name=f"{self.name}-g{gen}", create=True, size=max(base + offset, 1))
+        shm.buf[:8] = np.uint64(len(meta)).tobytes()
+        shm.buf[8:8 + len(meta)] = meta
+        for start, raw in blobs:
+            shm.buf[base + start:base + start + len(raw)] = raw
+
+        # Seqlock: seq impar mientras cambia la generación publicada
+        self._hdr[0] += 1
+        self._hdr[1] = gen
+        self._hdr[0] += 1
+        self.generation = gen
+
+        self._segments.append(shm)
+        while len(self._segments) > self.keep:
+            old = self._segments.popleft()
+            old.close()
+            old.unlink()
+        return gen
+
+    def close(self) -> None:
+        """Unlink every segment of the store (attached readers keep their mappings)."""
+        while self._segments:
+            shm = self._segments.popleft()
+            shm.close()
+            shm.unlink()
+        del self._hdr
+        self._header.close()
+        self._header.unlink()
+
+    def __enter__(self) -> "SharedLotStore":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class LotStoreView:
+    """
+    Read-only view of one generation. Arrays from column()/codes() alias the
+    segment (zero-copy) and must be released, or copied, before close();
+    frame() copies the rows it returns.
+    """
+
+    def __init__(self, shm: SharedMemory, generation: int):
+        self._shm = shm
+        self.generation = generation
+        meta_len = int(np.frombuffer(shm.buf[:8], dtype=np.uint64)[0])
+        layout = json.loads(bytes(shm.buf[8:8 + meta_len]))
+        base = _align(8 + meta_len)
+        self.rows = layout["rows"]
+
+        def view(spec, dtype) -> np.ndarray:
+            start, nbytes = spec
+            arr = np.frombuffer(shm.buf, dtype=dtype, count=nbytes // np.dtype(dtype).itemsize, offset=base + start)
+            arr.flags.writeable = False
+            return arr
+
+        self._columns = {c: view(spec, np.float64) for c, spec in layout["columns"].items()}
+        self._codes = {c: view(d["codes"], np.int32) for c, d in layout["dicts"].items()}
+        self._dicts = {c: (view(d["offsets"], np.int64), view(d["data"], np.uint8)) for c, d in layout["dicts"].items()}
+        self._decoded: dict = {}
+
+    @property
+    def columns(self) -> list[str]:
+        return list(self._columns) + list(self._codes)
+
+    def column(self, name: str) -> np.ndarray:
+        """Numeric column as float64, straight from shared memory (release it before close())."""
+        return self._columns[name]
+
+    def codes(self, name: str) -> np.ndarray:
+        """int32 dictionary codes of a key column (-1 = null); aliases the segment like column()."""
+        return self._codes[name]
+
+    def dictionary(self, name: str) -> list[str]:
+        if name not in self._decoded:
+            offsets, data = self._dicts[name]
+            raw = data.tobytes()
+            self._decoded[name] = [raw[a:b].decode() for a, b in zip(offsets[:-1], offsets[1:])]
+        return self._decoded[name]
+
+    def frame(self, columns: list[str] | None = None, start: int = 0, stop: int | None = None) -> pl.DataFrame:
+        """Rows [start, stop) as a Polars frame (a copy); key columns are decoded from their dictionary."""
+        columns = columns or self.columns
+        data = {}
+        for col in columns:
+            if col in self._columns:
+                # Copia: Polars adoptaría el buffer compartido y el frame no podría sobrevivir a close()
+                data[col] = self._columns[col][start:stop].copy()
+            else:
+                labels = pl.Series(self.dictionary(col), dtype=pl.Utf8)
+                codes = self._codes[col][start:stop]
+                if labels.len() == 0:
+                    data[col] = pl.Series(col, [None] * len(codes), dtype=pl.Utf8)
+                    continue
+                decoded = labels.gather(np.where(codes >= 0, codes, 0))
+                data[col] = pl.select(
+                    pl.when(pl.Series(codes >= 0)).then(decoded).otherwise(None).alias(col)
+                ).to_series()
+        return pl.DataFrame(data)
+
+    def close(self) -> None:
+        """Unmap the segment; fails with BufferError while arrays from column()/codes() are alive."""
+        # Las vistas numpy propias deben soltarse antes de cerrar el mapeo
+        self._columns, self._codes, self._dicts = {}, {}, {}
+        try:
+            self._shm.close()
+        except BufferError:
+            raise BufferError(
+                f"Generation {self.generation} is still referenced by arrays from column()/codes(); "
+                "release them (or copy what must outlive the view) before closing it"
+            ) from None
+
+    def __enter__(self) -> "LotStoreView":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def current_generation(name: str, timeout: float = 1.0) -> int:
+    """Generation published in the header, read consistently (retries while the writer flips it)."""
+    header = SharedMemory(name=name, track=False)
+    hdr = np.ndarray(2, dtype=np.int64, buffer=header.buf)
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            seq1, gen, seq2 = int(hdr[0]), int(hdr[1]), int(hdr[0])
+            if seq1 == seq2 and seq1 % 2 == 0:
+                return gen
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Lot store {name} header kept changing")
+    finally:
+        del hdr
+        header.close()
+
+
+def attach(name: str, generation: int | None = None, retries: int = 3) -> LotStoreView:
+    """
+    View of `generation` (default: the latest published) of the store `name`.
+    The latest generation can be unlinked between reading the header and opening
+    it (the writer published `keep` more meanwhile): the header is read again.
+    """
+    if generation == 0:
+        raise LookupError(f"Lot store {name} has not published any generation yet")
+    if generation is not None:
+        return LotStoreView(SharedMemory(name=f"{name}-g{generation}", track=False), generation)
+    for attempt in range(retries + 1):
+        gen = current_generation(name)
+        if gen == 0:
+            raise LookupError(f"Lot store {name} has not published any generation yet")
+        try:
+            return LotStoreView(SharedMemory(name=f"{name}-g{gen}", track=False), gen)
+        except FileNotFoundError:
+            if attempt == retries:
+                raise
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import polars as pl
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-lot requests into one predict_proba call. With a
+    per-family bundle (utils.family_models) the batch is routed by the family of
+    each lot's Product_ID; lots sent without one go to the global model.
+
+    A batch is flushed when it reaches `max_batch` rows or when the oldest
+    request has waited `max_wait_ms`. Inference runs in a thread pool so the
+    event loop keeps accepting requests meanwhile.
+    """
+
+    def __init__(self, model, max_batch: int = 256, max_wait_ms: float = 3.0, threads: int = 2):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="predict")
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        # El loop solo guarda referencias débiles a las tareas: sin este set un flush podría recogerse a medias
+        self._flushes: set[asyncio.Task] = set()
+        self.batches = 0
+        self.rows = 0
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+        self._executor.shutdown(wait=False)
+
+    async def predict(self, features: list[float], product_id: str | None = None) -> float:
+        """Probability of waste (0-1) for one feature vector."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((features, product_id, future))
+        return await future
+
+    def _predict(self, X: np.ndarray, product_ids: list) -> np.ndarray:
+        if hasattr(self.model, "predict_routed"):
+            families = self.model.families(pl.DataFrame({"Product_ID": product_ids}, schema={"Product_ID": pl.Utf8}))
+            return self.model.predict_routed(X, families)
+        return self.model.predict_proba(X)[:, 1]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(items) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # No se espera al batch: el siguiente se arma mientras este se predice
+            flush = loop.create_task(self._flush(items))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, items: list) -> None:
+        X = np.asarray([features for features, _, _ in items], dtype=np.float64)
+        product_ids = [product_id for _, product_id, _ in items]
+        try:
+            probs = await asyncio.get_running_loop().run_in_executor(
+                self._executor, lambda: self._predict(X, product_ids)
+            )
+        except Exception as exc:
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        self.batches += 1
+        self.rows += len(items)
+        for (_, _, future), p in zip(items, probs):
+            if not future.done():
+                future.set_result(float(p))
@@ -0,0 +1,199 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import polars as pl
+
+from utils.instrumentation import span
+
+
+def model_version(model_path: str) -> str:
+    """Cheap version tag for a model file: changes whenever the .pkl is rewritten."""
+    stat = os.stat(model_path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+class _VersionStore:
+    """
+    Cached values of one model version: a sorted uint64 array of row hashes with
+    the values and last-use stamps in parallel arrays, so lookups, inserts and
+    LRU eviction are numpy operations over the whole batch.
+    """
+
+    def __init__(self, width: int | None = None):
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.values = np.empty((0,) if width is None else (0, width),
+                               dtype=np.float64 if width is None else np.float32)
+        self.stamps = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def lookup(self, hashes: np.ndarray, stamp: int) -> tuple[np.ndarray, np.ndarray]:
+        """(found mask, position of each found hash); found entries are stamped as used."""
+        if not len(self.hashes):
+            return np.zeros(len(hashes), dtype=bool), np.empty(0, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.hashes, hashes), len(self.hashes) - 1)
+        found = self.hashes[pos] == hashes
+        pos = pos[found]
+        self.stamps[pos] = stamp
+        return found, pos
+
+    def insert(self, hashes: np.ndarray, values: np.ndarray, stamp: int) -> None:
+        # Filas repetidas en el lote (misma clave y features) entran una vez
+        hashes, first = np.unique(hashes, return_index=True)
+        values = values[first]
+        fresh = ~np.isin(hashes, self.hashes, assume_unique=True)
+        hashes, values = hashes[fresh], values[fresh]
+        at = np.searchsorted(self.hashes, hashes)
+        self.hashes = np.insert(self.hashes, at, hashes)
+        self.values = np.insert(self.values, at, values, axis=0)
+        self.stamps = np.insert(self.stamps, at, np.full(len(hashes), stamp, dtype=np.int64))
+
+    def evict(self, n: int) -> None:
+        """Drop the `n` least recently used entries (the arrays stay sorted)."""
+        if n >= len(self.hashes):
+            self.__init__(None if self.values.ndim == 1 else self.values.shape[1])
+            return
+        keep = np.ones(len(self.hashes), dtype=bool)
+        keep[np.argpartition(self.stamps, n)[:n]] = False
+        self.hashes, self.values, self.stamps = self.hashes[keep], self.values[keep], self.stamps[keep]
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of waste probabilities keyed by model version and a hash
+    of (lot key, feature vector).
+
+    Each version keeps its entries in numpy arrays (_VersionStore): a call
+    looks every row up with one searchsorted, scores only the misses in a
+    single predict_proba batch, scatters hits and fresh predictions back into
+    one array and inserts the misses in bulk. LRU order is a per-call stamp;
+    when the cache is full, whole older versions go first, then the least
+    recently used entries of the others. Per-lot feature contributions
+    (explain) are cached the same way.
+    """
+
+    def __init__(self, maxsize: int = 200_000):
+        self.maxsize = maxsize
+        # version → _VersionStore, en orden de uso (la última versión usada al final)
+        self._entries: OrderedDict = OrderedDict()
+        # Contribuciones por feature, con las mismas claves que las predicciones
+        self._explanations: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._stamp = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._seconds_per_row = 0.0
+
+    @staticmethod
+    def _keys(df: pl.DataFrame, key_cols: list[str], features: list[str]) -> np.ndarray:
+        key_cols = [c for c in key_cols if c in df.columns]
+        # Tipos normalizados: Expiry_Date str vs Date o Int64 vs Float64 no deben cambiar el hash
+        return df.select(
+            pl.struct([pl.col(c).cast(pl.Utf8) for c in key_cols] + [pl.col(c).cast(pl.Float64) for c in features])
+            .hash().alias("h")
+        )["h"].to_numpy()
+
+    def _store(self, stores: OrderedDict, version: str, width: int | None = None) -> _VersionStore:
+        store = stores.get(version)
+        if store is None:
+            store = stores[version] = _VersionStore(width)
+        stores.move_to_end(version)
+        return store
+
+    def _shrink(self, stores: OrderedDict) -> None:
+        excess = sum(len(s) for s in stores.values()) - self.maxsize
+        # Primero versiones enteras (modelos ya reemplazados), luego LRU dentro de la actual
+        while excess > 0 and len(stores) > 1:
+            _, old = stores.popitem(last=False)
+            excess -= len(old)
+        if excess > 0:
+            next(reversed(stores.values())).evict(excess)
+
+    def predict(self, model, version: str, df: pl.DataFrame, key_cols: list[str], features: list[str]) -> np.ndarray:
+        """Probability of class 1 for every row of `df` (same order)."""
+        n = df.height
+        keys = self._keys(df, key_cols, features)
+
+        out = np.empty(n, dtype=np.float64)
+        with self._lock:
+            self._stamp += 1
+            store = self._store(self._entries, version)
+            hit, pos = store.lookup(keys, self._stamp)
+            out[hit] = store.values[pos]
+
+        miss_idx = np.flatnonzero(~hit)
+        if len(miss_idx):
+            start = time.perf_counter()
+            with span("predict_proba", rows=len(miss_idx)):
+                if hasattr(model, "predict_frame"):
+                    # Bundle por familia: necesita Product_ID para enrutar cada lote
+                    probs = model.predict_frame(df[miss_idx], features)
+                else:
+                    probs = model.predict_proba(df.select(features).to_numpy()[miss_idx])[:, 1]
+            elapsed = time.perf_counter() - start
+            out[miss_idx] = probs
+        else:
+            elapsed = 0.0
+
+        with self._lock:
+            if len(miss_idx):
+                self._store(self._entries, version).insert(keys[miss_idx], out[miss_idx], self._stamp)
+                self._shrink(self._entries)
+
+            n_hits = n - len(miss_idx)
+            self.hits += n_hits
+            self.misses += len(miss_idx)
+            if len(miss_idx):
+                # Coste medio por fila (EMA) para estimar el tiempo ahorrado por los hits
+                per_row = elapsed / len(miss_idx)
+                self._seconds_per_row = per_row if self._seconds_per_row == 0 else 0.8 * self._seconds_per_row + 0.2 * per_row
+            self.saved_seconds += n_hits * self._seconds_per_row
+        return out
+
+    def explain(self, attributor, version: str, df: pl.DataFrame, key_cols: list[str],
+                features: list[str]) -> np.ndarray:
+        """
+        Per-feature contributions (rows × features) from a TreeAttributor, cached
+        under the same keys as the predictions; only new feature vectors are explained.
+        """
+        keys = self._keys(df, key_cols, features)
+        out = np.empty((df.height, len(features)), dtype=np.float32)
+        with self._lock:
+            self._stamp += 1
+            store = self._store(self._explanations, version, len(features))
+            hit, pos = store.lookup(keys, self._stamp)
+            out[hit] = store.values[pos]
+        miss = np.flatnonzero(~hit)
+
+        if len(miss):
+            with span("explain", rows=len(miss)):
+                if hasattr(attributor, "explain_frame"):
+                    # Bundle por familia: cada lote se explica con el modelo que lo puntuó
+                    contribs = attributor.explain_frame(df[miss], features)
+                else:
+                    contribs = attributor.explain(df.select(features).to_numpy()[miss])
+            out[miss] = contribs
+            with self._lock:
+                self._store(self._explanations, version, len(features)).insert(keys[miss], out[miss], self._stamp)
+                self._shrink(self._explanations)
+        return out
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "size": sum(len(s) for s in self._entries.values()),
+            "saved_seconds": self.saved_seconds,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._explanations.clear()
@@ -1,6 +1,47 @@
-import joblib
-import polars as pl
 import numpy as np
+import polars as pl
+
+from utils.instrumentation import span
+from utils.prediction_cache import PredictionCache, model_version
+from utils.risk_utils import recalc_risk
+
+LOT_KEY = ["Product_ID", "LOT_Number", "Expiry_Date"]
+
+def _load_model(model_path: str):
+    # joblib (y sklearn al deserializar) se importa solo cuando una página predice
+    import joblib
+
+    return joblib.load(model_path)
+
+
+def load_scoring_model(model_path: str = "data/waste_model.pkl"):
+    """
+    The per-family bundle when one has been trained, else the global model.
+    Returns (model, version tag for caches).
+    """
+    from utils.family_models import load_bundle
+
+    bundle = load_bundle()
+    if bundle is not None:
+        return bundle, bundle.version
+    return _load_model(model_path), model_version(model_path)
+
+
+def scoring_model_version(model_path: str = "data/waste_model.pkl") -> str:
+    """Version tag of what load_scoring_model() would return, without loading it."""
+    from utils.family_models import current_bundle_path
+
+    path = current_bundle_path()
+    if path is not None and path.exists():
+        return path.stem.removeprefix("bundle-")
+    return model_version(model_path)
+
+
+def predict_waste(model, df: pl.DataFrame, features: list[str]) -> np.ndarray:
+    """P(waste) per row: routed by product family for a bundle, a single batch otherwise."""
+    if hasattr(model, "predict_frame"):
+        return model.predict_frame(df, features)
+    return model.predict_proba(df.select(features).to_numpy())[:, 1]
 
 def simulate_scenario(df: pl.DataFrame, delay_hours: float = 0, consumption_factor: float = 1.0,
                       model_path: str = "data/waste_model.pkl") -> pl.DataFrame:
@@ -9,9 +50,9 @@ def simulate_scenario(df: pl.DataFrame, delay_hours: float = 0, consumption_fact
     Uses Polars for processing.
     """
 
-    # --- Load model ---
+    # --- Load model (per-family bundle when available) ---
     try:
-        model = joblib.load(model_path)
+        model, _ = load_scoring_model(model_path)
     except:
         raise RuntimeError("No trained model found. Please train it first in the Predictive AI page.")
 
@@ -32,18 +73,16 @@ def simulate_scenario(df: pl.DataFrame, delay_hours: float = 0, consumption_fact
         if col not in df_sim.columns:
             raise ValueError(f"Missing required feature: {col}")
 
-    # --- Prepare numpy arrays for model ---
-    X_current = df_sim.select(features).to_numpy()
-    X_scenario = df_sim.select([
-        "Quantity",
-        "Days_to_Expire_adj",
-        "Avg_Usage_per_Day_adj",
-        risk_col
-    ]).to_numpy()
+    # --- Scenario features under the model's column names (Product_ID kept for family routing) ---
+    df_scenario = df_sim.with_columns(
+        pl.col("Days_to_Expire_adj").alias("Days_to_Expire"),
+        pl.col("Avg_Usage_per_Day_adj").alias("Avg_Usage_per_Day"),
+    )
 
     # --- Predict probabilities ---
-    prob_current = model.predict_proba(X_current)[:, 1] * 100
-    prob_sim = model.predict_proba(X_scenario)[:, 1] * 100
+    with span("predict_proba.scenario", rows=2 * df_sim.height):
+        prob_current = predict_waste(model, df_sim, features) * 100
+        prob_sim = predict_waste(model, df_scenario, features) * 100
 
     # --- Add results to dataframe ---
     df_sim = df_sim.with_columns([
@@ -54,20 +93,40 @@ def simulate_scenario(df: pl.DataFrame, delay_hours: float = 0, consumption_fact
 
     return df_sim
 
-def predict_probability(df, model_path="data/waste_model.pkl"):
+def score_lots(model, df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Polars-only scoring path (no pandas round-trip) for batch jobs.
+    Days_to_Expire and Risk_Score are re-derived from Expiry_Date when it is present.
+    """
+    if "Expiry_Date" in df.columns:
+        df = recalc_risk(df)
+
+    risk_col = "Risk_Score" if "Risk_Score" in df.columns else "Risk"
+    required = ["Quantity", "Days_to_Expire", "Avg_Usage_per_Day", risk_col]
+    missing = [c for c in required if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required feature: {missing}")
+
+    with span("predict_proba", rows=df.height):
+        probs = predict_waste(model, df, required) * 100
+    return df.with_columns(pl.Series("Probability_of_Expiration", probs).round(2))
+
+def predict_probability(df, model_path="data/waste_model.pkl", cache: PredictionCache | None = None):
     """
     Predict probability of expiration for each lot using the trained RandomForest model.
     Works with both Polars and Pandas DataFrames.
+    With a PredictionCache, only lots whose features changed since the last call are scored.
     """
 
-    # --- Load model ---
+    # --- Load model (per-family bundle when available) ---
     try:
-        model = joblib.load(model_path)
+        model, version = load_scoring_model(model_path)
     except FileNotFoundError:
         raise RuntimeError("⚠️ Model not found. Train it first in the Predictive AI page.")
 
     # --- Convert Polars → Pandas if needed ---
-    df_pd = df.to_pandas() if isinstance(df, pl.DataFrame) else df.copy()
+    with span("to_pandas", rows=len(df)):
+        df_pd = df.to_pandas() if isinstance(df, pl.DataFrame) else df.copy()
 
     # --- Detect risk column name ---
     risk_col = "Risk_Score" if "Risk_Score" in df_pd.columns else "Risk"
@@ -82,10 +141,16 @@ def predict_probability(df, model_path="data/waste_model.pkl"):
     X = df_pd[required]
 
     # --- Predict probability of waste (class 1) ---
-    probs = model.predict_proba(X)[:, 1] * 100
+    df_pl = df if isinstance(df, pl.DataFrame) else pl.from_pandas(df_pd)
+    if cache is not None:
+        probs = cache.predict(model, version, df_pl, LOT_KEY, required) * 100
+    else:
+        with span("predict_proba", rows=len(X)):
+            probs = predict_waste(model, df_pl, required) * 100
 
     # --- Add prediction column ---
     df_pd["Probability_of_Expiration"] = probs.round(2)
 
     # --- Return as Polars again (optional) ---
-    return pl.from_pandas(df_pd)
+    with span("from_pandas", rows=len(df_pd)):
+        return pl.from_pandas(df_pd)
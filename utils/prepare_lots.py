@@ -0,0 +1,73 @@
+from datetime import date
+
+import polars as pl
+
+from utils.normalize_text_col import normalize_text_col
+from utils.parse_expiry import ParseExpiry
+
+parse_expiry = ParseExpiry()
+
+# Clave mínima razonable para lotes
+KEY_COLS = ["Product_ID", "LOT_Number", "Expiry_Date"]
+BASE_COLS = ["Product_ID", "Product_Name", "Weight_or_Volume", "LOT_Number", "Expiry_Date", "Quantity"]
+OUTPUT_COLS = BASE_COLS + ["Days_to_Expire", "Status", "Avg_Usage_per_Day"]
+REQUIRED_COLS = ["Product_ID", "Product_Name", "Expiry_Date"]
+
+
+def normalize_lots(df: pl.DataFrame) -> pl.DataFrame:
+    """ Tipos y normalización básica de textos, cantidad y fecha """
+    return df.with_columns([
+        # Normaliza textos
+        normalize_text_col(pl.col("Product_ID")).alias("Product_ID"),
+        normalize_text_col(pl.col("Product_Name")).alias("Product_Name"),
+        normalize_text_col(pl.col("Weight_or_Volume")).alias("Weight_or_Volume"),
+        normalize_text_col(pl.col("LOT_Number")).str.to_uppercase().alias("LOT_Number"),
+
+        # Cantidad segura (int >= 0, nulos -> 0)
+        pl.col("Quantity")
+        .cast(pl.Int64, strict=False)
+        .fill_null(0)
+        .clip(lower_bound=0)
+        .alias("Quantity"),
+
+        # Fecha
+        parse_expiry.parse_expiry_expr("Expiry_Date").alias("Expiry_Date")
+    ])
+
+
+def split_quality(df: pl.DataFrame, required: list[str] = REQUIRED_COLS) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """ Separa registros buenos del log de calidad (faltan campos requeridos) """
+    missing = pl.any_horizontal([pl.col(c).is_null() for c in required])
+    quality_log = df.filter(missing).with_columns(pl.lit("MISSING_REQUIRED").alias("quality_issue"))
+    return df.filter(~missing), quality_log
+
+
+def dedupe_lots(df: pl.DataFrame) -> pl.DataFrame:
+    """ Deduplicación por clave (suma Quantity, conserva el primer valor del resto) """
+    return df.group_by(KEY_COLS).agg([
+        pl.col("Quantity").sum().alias("Quantity"),
+        pl.col("Product_Name").first().alias("Product_Name"),
+        pl.col("Weight_or_Volume").first().alias("Weight_or_Volume"),
+    ]).select(BASE_COLS)
+
+
+def derive_lot_columns(df: pl.DataFrame, today: date | None = None) -> pl.DataFrame:
+    """ Derivados: Days_to_Expire, Status y Avg_Usage_per_Day respecto a `today` """
+    today = today or date.today()
+    df = df.with_columns([
+        (pl.col("Expiry_Date") - pl.lit(today)).dt.total_days().cast(pl.Int64).alias("Days_to_Expire"),
+    ])
+
+    df = df.with_columns([
+        pl.when(pl.col("Days_to_Expire") < 0).then(pl.lit("Expirado"))
+          .when(pl.col("Days_to_Expire") <= 2).then(pl.lit("Crítico"))
+          .when(pl.col("Days_to_Expire") <= 7).then(pl.lit("Medio"))
+          .otherwise(pl.lit("Vigente"))
+          .alias("Status")
+    ])
+
+    # Valor por defecto editable en el dashboard
+    return df.with_columns([
+        (pl.col("Quantity") / (pl.col("Days_to_Expire").clip(lower_bound=1))).round(2)
+        .alias("Avg_Usage_per_Day")
+    ])
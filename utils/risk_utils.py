@@ -1,8 +1,13 @@
+import math
 import polars as pl
 from datetime import date
 
-def recalc_risk(df: pl.DataFrame) -> pl.DataFrame:
-    today = date.today()
+from utils.expiry_index import ExpiryIndex
+from utils.instrumentation import timed
+
+@timed("recalc_risk")
+def recalc_risk(df: pl.DataFrame, today: date | None = None) -> pl.DataFrame:
+    today = today or date.today()
 
     # --- 1. Detect dtype actual ---
     dtype = df.schema.get("Expiry_Date")
@@ -33,3 +38,42 @@ def recalc_risk(df: pl.DataFrame) -> pl.DataFrame:
 
     return df
 
+
+
+# --- Ventanas de días (Risk_Score = clip(100 - 10 * días, 0, 100)) ---
+
+def max_days_for_risk(threshold: float) -> int:
+    """Largest Days_to_Expire with Risk_Score > threshold (e.g. 85 → 1, 70 → 2)."""
+    return math.ceil((100 - threshold) / 10) - 1
+
+
+def select_days(df: pl.DataFrame, min_days: int | None = None, max_days: int | None = None,
+                index: ExpiryIndex | None = None) -> pl.DataFrame:
+    """
+    Rows with min_days ≤ Days_to_Expire ≤ max_days. With an ExpiryIndex built for
+    this frame the rows are gathered from the calendar buckets; otherwise the
+    column is scanned.
+    """
+    # El índice agrupa todos los expirados en un bucket: rangos negativos se escanean
+    if index is not None and index.n_rows == df.height and (min_days is None or min_days >= 0):
+        return df[index.rows(min_days, max_days)]
+    days = pl.col("Days_to_Expire")
+    cond = pl.lit(True)
+    if min_days is not None:
+        cond = cond & (days >= min_days)
+    if max_days is not None:
+        cond = cond & (days <= max_days)
+    return df.filter(cond)
+
+
+def snapshot_day(df: pl.DataFrame) -> date:
+    """Day the Days_to_Expire column was computed for (Expiry_Date − Days_to_Expire); today if unknown."""
+    if "Days_to_Expire" not in df.columns or df.is_empty():
+        return date.today()
+    expiry = pl.col("Expiry_Date")
+    if df.schema.get("Expiry_Date") == pl.Utf8:
+        expiry = expiry.str.strptime(pl.Date, strict=False)
+    days = df.select(
+        (expiry.cast(pl.Date) - pl.duration(days=pl.col("Days_to_Expire").cast(pl.Int64))).alias("day")
+    )["day"].drop_nulls()
+    return days.mode().min() if not days.is_empty() else date.today()
@@ -0,0 +1,138 @@
+"""
+Precomputed scenario grid for the Scenarios page.
+
+The sliders are discrete (delay × consumption factor, ~400 combinations), so a
+background thread scores every combination once per (data version, model
+version) and keeps the per-lot probabilities as one float16 array of shape
+(delays, factors, lots) plus the float32 current probabilities. A slider move
+then becomes an array lookup. Cells are filled one delay row at a time with a
+single predict_proba batch per row; `lookup()` returns None until its cell is
+ready, so the page can fall back to simulating on demand. With a per-family
+bundle each row is routed to its family's model, as in the live scoring.
+
+Grids live in a small LRU keyed by version: when the data or the model
+changes, a new grid is built and the oldest one is dropped (and its build
+stopped if still running).
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import polars as pl
+
+from config import scenarios as sc
+from utils.instrumentation import span
+
+DELAYS = list(range(sc.DELAY_MIN, sc.DELAY_MAX + 1, sc.DELAY_STEP))
+FACTORS = [round(sc.CONSUMPTION_MIN + i * sc.CONSUMPTION_STEP, 1)
+           for i in range(round((sc.CONSUMPTION_MAX - sc.CONSUMPTION_MIN) / sc.CONSUMPTION_STEP) + 1)]
+
+
+def data_version(df: pl.DataFrame, features: list[str]) -> int:
+    """Content tag of the scored features: any change in any lot gives a new grid."""
+    return int(df.select(features).hash_rows().sum())
+
+
+class ScenarioGrid:
+    def __init__(self, model, X: np.ndarray, families: np.ndarray | None = None):
+        self.model = model
+        # Columnas: Quantity, Days_to_Expire, Avg_Usage_per_Day, riesgo (como simulate_scenario)
+        self.X = X
+        # Familia de cada lote, para enrutar las filas con un bundle por familia
+        self.families = families
+        self.current: np.ndarray | None = None
+        self.probs = np.zeros((len(DELAYS), len(FACTORS), X.shape[0]), dtype=np.float16)
+        self.ready = np.zeros(len(DELAYS), dtype=bool)
+        self.error: Exception | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def progress(self) -> float:
+        return float(self.ready.mean())
+
+    def start(self) -> "ScenarioGrid":
+        self._thread = threading.Thread(target=self.build, name="scenario-grid", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _predict(self, X: np.ndarray, families: np.ndarray | None) -> np.ndarray:
+        if hasattr(self.model, "predict_routed"):
+            return self.model.predict_routed(X, families)
+        return self.model.predict_proba(X)[:, 1]
+
+    def build(self) -> None:
+        try:
+            with span("scenario_grid.current", rows=len(self.X)):
+                self.current = self._predict(self.X, self.families).astype(np.float32)
+            tiled = np.tile(self.families, len(FACTORS)) if self.families is not None else None
+            n = len(self.X)
+            for i in range(len(DELAYS)):
+                if self._stop.is_set():
+                    return
+                # Una fila de la rejilla (todos los factores de un retraso) en un solo lote
+                batch = np.tile(self.X, (len(FACTORS), 1))
+                batch[:, 1] -= DELAYS[i] / 24
+                batch[:, 2] *= np.repeat(FACTORS, n)
+                with span("scenario_grid.row", rows=len(batch)):
+                    self.probs[i] = self._predict(batch, tiled).reshape(len(FACTORS), n)
+                self.ready[i] = True
+        except Exception as e:
+            self.error = e
+
+    def lookup(self, delay: float, factor: float) -> tuple[np.ndarray, np.ndarray] | None:
+        """(current, simulated) probabilities in % for every lot, or None while the cell is not built."""
+        i = DELAYS.index(delay) if delay in DELAYS else None
+        j = FACTORS.index(round(factor, 1)) if round(factor, 1) in FACTORS else None
+        if i is None or j is None or not self.ready[i]:
+            return None
+        return self.current * 100, self.probs[i, j].astype(np.float32) * 100
+
+
+class ScenarioGridCache:
+    """LRU of grids keyed by (data version, model version)."""
+
+    def __init__(self, maxsize: int = sc.GRID_VERSIONS):
+        self.maxsize = maxsize
+        self._grids: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def for_frame(self, df: pl.DataFrame, model_path: str = "data/waste_model.pkl") -> ScenarioGrid | None:
+        """
+        Grid of `df` under the scoring model (the per-family bundle when trained,
+        else the model at `model_path`); None when the frame is too large to
+        precompute. Raises FileNotFoundError when there is no model.
+        """
+        from utils.predictive_ai import load_scoring_model, scoring_model_version
+
+        if df.height > sc.GRID_MAX_LOTS:
+            return None
+        risk_col = "Risk_Score" if "Risk_Score" in df.columns else "Risk"
+        features = ["Quantity", "Days_to_Expire", "Avg_Usage_per_Day", risk_col]
+        version = (data_version(df, features), scoring_model_version(model_path))
+        with self._lock:
+            grid = self._grids.get(version)
+            if grid is not None:
+                self._grids.move_to_end(version)
+                return grid
+
+        model, _ = load_scoring_model(model_path)
+        X = df.select(features).to_numpy().astype(np.float64)
+        families = model.families(df) if hasattr(model, "families") else None
+        return self.get(version, model, X, families)
+
+    def get(self, version: tuple, model, X: np.ndarray, families: np.ndarray | None = None) -> ScenarioGrid:
+        """The grid for `version`, starting its background build on first request."""
+        with self._lock:
+            grid = self._grids.get(version)
+            if grid is not None:
+                self._grids.move_to_end(version)
+                return grid
+            grid = self._grids[version] = ScenarioGrid(model, X, families).start()
+            while len(self._grids) > self.maxsize:
+                _, old = self._grids.popitem(last=False)
+                old.stop()
+            return grid
@@ -2,6 +2,9 @@ import polars as pl
 import random
 from datetime import date, timedelta
 
+from utils.instrumentation import timed
+
+@timed("simulate_warehouse")
 def simulate_warehouse(df: pl.DataFrame) -> pl.DataFrame:
     """Simulate random warehouse updates; Expiry_Date handled as string for schema consistency."""
     if df.is_empty():
@@ -0,0 +1,170 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Callable
+
+import polars as pl
+
+from config import live_feed as lf
+from config.training_labels import SNAPSHOT_DIR
+from utils import risk_utils, simulate_warehouse
+from utils.drift_monitor import FeatureSketch, LiveDriftMonitor
+from utils.expiry_index import ExpiryIndex
+from utils.history import HistoryStore
+from utils.kpi_cube import KpiCube, KpiView
+from utils.live_feed import KEY_COLS, LiveFeedPublisher
+from utils.snapshots import write_daily_snapshot
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TwinSnapshot:
+    """Immutable view of the twin at one version; sessions only ever read these."""
+    version: int
+    taken_at: datetime
+    df: pl.DataFrame
+    kpis: KpiView
+    index: ExpiryIndex
+    # Sketch en vivo de las features (drift) de esta versión y lotes re-binneados al producirla
+    drift: FeatureSketch | None = None
+    drift_changed: int = 0
+
+    def frame(self) -> pl.DataFrame:
+        """
+        Session-local handle on the shared frame. The clone is shallow (the column
+        buffers are shared), but Polars can deadlock when several threads use the
+        same DataFrame object at once, so every reader works on its own object.
+        """
+        return self.df.clone()
+
+
+def persist_tick(df: pl.DataFrame) -> None:
+    """Single writer of the live CSV and the daily snapshot history."""
+    df.write_csv(lf.LIVE_STATE_CSV)
+    write_daily_snapshot(df, SNAPSHOT_DIR)
+
+
+class SimulationClock:
+    """
+    Owns the warehouse twin and advances it on a fixed clock in one background
+    thread, however many sessions are watching. Each tick builds a new frame and
+    swaps the snapshot reference, so readers never see a half-updated state.
+    """
+
+    def __init__(self, load_fn: Callable[[], pl.DataFrame], tick_seconds: float,
+                 publisher: LiveFeedPublisher | None = None,
+                 on_tick: Callable[[pl.DataFrame], None] | None = None,
+                 history: HistoryStore | None = None):
+        self.tick_seconds = tick_seconds
+        self.publisher = publisher
+        self.history = history
+        self.on_tick = on_tick
+        self.ticks = 0
+        # Fallos de tick: el reloj sigue, y las páginas muestran el último error hasta el siguiente tick bueno
+        self.failures = 0
+        self.last_error: tuple[datetime, str] | None = None
+        # Tras un tick fallido el cubo, el índice y el histórico pueden haber perdido su delta
+        self._resync = False
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        self._df = load_fn()
+        version = publisher.publish(self._df) if publisher else 1
+        if history is not None:
+            history.record(self._df)
+        self.cube = KpiCube.from_frame(self._df)
+        self.index = ExpiryIndex.from_frame(self._df)
+        self.drift = LiveDriftMonitor(KEY_COLS)
+        self.drift.observe(self._df)
+        self._snapshot = self._snap(version, self._df)
+
+    def _snap(self, version: int, df: pl.DataFrame) -> TwinSnapshot:
+        return TwinSnapshot(version, datetime.now(), df.clone(), self.cube.view(), self.index,
+                            self.drift.view(), self.drift.last_changed)
+
+    def latest(self) -> TwinSnapshot:
+        return self._snapshot
+
+    def step(self) -> bool:
+        """
+        Advance one tick; returns False when the state did not change (idle tick).
+        If a consumer (publisher, cube, history, on_tick) raises, the next tick
+        rebuilds the cube, the drift sketch and the index from the full frame and
+        lets the history diff its own state, so none of them stays behind the clock.
+        """
+        # El hilo del reloj trabaja sobre su propio frame; las sesiones solo ven clones publicados
+        df = risk_utils.recalc_risk(simulate_warehouse.simulate_warehouse(self._df))
+        self._df = df
+        self.ticks += 1
+        resync, self._resync = self._resync, True
+        if self.publisher:
+            version = self.publisher.publish(df)
+            if version is None and not resync:
+                self._resync = False
+                return False
+            version = version or self._snapshot.version
+            if resync:
+                self.cube.rebuild(df)
+                self.drift.observe(df)
+            else:
+                # Solo los lotes que cambiaron se mueven de celda en el cubo y de bin en el sketch
+                self.cube.apply(self.publisher.last_upserts, self.publisher.last_deletes)
+                self.drift.apply_delta(self.publisher.last_upserts, self.publisher.last_deletes)
+            if self.history is not None:
+                if resync:
+                    self.history.record(df)
+                else:
+                    self.history.record(df, upserts=self.publisher.last_upserts, deletes=self.publisher.last_deletes)
+        else:
+            version = self._snapshot.version + 1
+            self.cube.rebuild(df)
+            self.drift.observe(df)
+            if self.history is not None:
+                self.history.record(df)
+        if resync:
+            self.index = ExpiryIndex.from_frame(df)
+        else:
+            # El simulador conserva el orden de filas y solo añade lotes al final
+            self.index = self.index.advanced(date.today()).extended(df)
+        self._snapshot = self._snap(version, df)
+        # on_tick (persistencia) no toca cubo ni histórico: su fallo no obliga a resincronizar
+        self._resync = False
+        if self.on_tick:
+            self.on_tick(df)
+        return True
+
+    def start(self) -> "SimulationClock":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="simulation-clock", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run(self, max_ticks: int = 0) -> None:
+        """
+        Tick on a fixed schedule; a slow tick skips missed slots instead of bursting.
+        A tick that raises is logged and recorded in `last_error`; the schedule goes on.
+        """
+        next_tick = time.monotonic() + self.tick_seconds
+        attempts = 0
+        while not self._stop.wait(max(0.0, next_tick - time.monotonic())):
+            attempts += 1
+            try:
+                self.step()
+            except Exception as exc:
+                # Un tick fallido no puede parar el reloj: se registra y se reintenta en el siguiente slot
+                log.exception("Simulation tick failed; the clock keeps its schedule")
+                self.failures += 1
+                self.last_error = (datetime.now(), f"{type(exc).__name__}: {exc}")
+            else:
+                self.last_error = None
+            if max_ticks and attempts >= max_ticks:
+                break
+            next_tick += self.tick_seconds
+            if next_tick < time.monotonic():
+                next_tick = time.monotonic() + self.tick_seconds
@@ -0,0 +1,163 @@
+"""
+Zone slotting: which warehouse zone each lot should occupy.
+
+Every lot gets a score per zone (config/zones.py):
+
+    expected waste avoided = Expected_Waste · (rotation + cold bonus for short-dated lots)
+    − MOVE_COST when the zone is not the lot's current one
+    −∞ for non-cold zones when the product needs the cold chain
+
+Expected_Waste is Probability_of_Expiration (or Risk_Score) × Quantity. The
+score matrix is built with numpy in one pass and solved with a greedy in
+rounds: every pending lot proposes its best open zone, each zone accepts
+proposals by score while its capacity (units) lasts, and a zone that rejects
+anything is closed for the next round. At most one round per zone, so the
+cost is O(zones · lots · log lots) regardless of how lots compete.
+
+Capacities are fixed at the first assign(). update() re-optimises only the
+lots whose risk or quantity changed (and new ones) against the capacity left
+by the others, whose recommendation stays as it is; the assignment is always
+feasible and the number of moves stays low.
+"""
+import numpy as np
+import polars as pl
+
+from config.zones import COLD_BONUS, COLD_CHAIN_PREFIXES, COLD_SHORT_DAYS, MOVE_COST, ZONES
+from utils.kpi_cube import KEY_COLS, NO_ZONE
+
+# Desempate: a igualdad de merma, los lotes sin riesgo van a las zonas de reserva
+# y los que no necesitan frío dejan libres las zonas frías
+_TIE = 1e-3
+
+
+def _lot_inputs(df: pl.DataFrame) -> pl.DataFrame:
+    prob = pl.col("Probability_of_Expiration") if "Probability_of_Expiration" in df.columns else pl.col("Risk_Score")
+    zone = pl.col("Zone").cast(pl.Utf8) if "Zone" in df.columns else pl.lit(None, dtype=pl.Utf8)
+    quantity = pl.col("Quantity").cast(pl.Int64).fill_null(0).clip(lower_bound=0)
+    return df.select(
+        [pl.col(c).cast(pl.Utf8) for c in KEY_COLS] + [
+            quantity.alias("Quantity"),
+            pl.col("Days_to_Expire").cast(pl.Int64),
+            (prob.cast(pl.Float64).fill_null(0) / 100 * quantity).alias("Expected_Waste"),
+            pl.col("Product_ID").cast(pl.Utf8).str.slice(0, 3).is_in(list(COLD_CHAIN_PREFIXES)).alias("Cold_Chain"),
+            pl.when(zone == NO_ZONE).then(None).otherwise(zone).alias("Current_Zone"),
+        ]
+    )
+
+
+class ZoneSlotter:
+    def __init__(self, zones: dict | None = None):
+        zones = zones or ZONES
+        self.names = list(zones)
+        self._share = np.array([z["capacity"] for z in zones.values()], dtype=np.float64)
+        self._cold = np.array([z["cold"] for z in zones.values()], dtype=bool)
+        self._rotation = np.array([z["rotation"] for z in zones.values()], dtype=np.float64)
+        self.capacity: np.ndarray | None = None
+        self.free: np.ndarray | None = None
+        self.assignment: pl.DataFrame | None = None
+
+    def _zone_index(self, names: pl.Series) -> np.ndarray:
+        """Position of each zone name in self.names (-1 for unknown or missing)."""
+        lookup = {name: i for i, name in enumerate(self.names)}
+        return names.replace_strict(lookup, default=-1, return_dtype=pl.Int64).to_numpy()
+
+    def _scores(self, lots: pl.DataFrame) -> np.ndarray:
+        waste = lots["Expected_Waste"].to_numpy()
+        short = (lots["Days_to_Expire"].fill_null(0).to_numpy() <= COLD_SHORT_DAYS)
+        gain = self._rotation[None, :] + COLD_BONUS * (short[:, None] & self._cold[None, :])
+        cold_chain = lots["Cold_Chain"].to_numpy()
+        scores = waste[:, None] * gain - _TIE * (self._rotation[None, :] + (~cold_chain[:, None] & self._cold[None, :]))
+
+        current = self._zone_index(lots["Current_Zone"])
+        placed = current >= 0
+        scores[placed] -= MOVE_COST
+        scores[np.flatnonzero(placed), current[placed]] += MOVE_COST
+        scores[np.ix_(cold_chain, ~self._cold)] = -np.inf
+        return scores
+
+    def _greedy(self, scores: np.ndarray, qty: np.ndarray) -> np.ndarray:
+        """Zone index per lot (-1 when no feasible zone has room); consumes self.free."""
+        zone = np.full(len(qty), -1, dtype=np.int64)
+        scores = scores.copy()
+        pending = np.arange(len(qty))
+        while len(pending):
+            s = scores[pending]
+            best = s.argmax(axis=1)
+            best_score = s[np.arange(len(pending)), best]
+            feasible = np.isfinite(best_score)
+            pending, best, best_score = pending[feasible], best[feasible], best_score[feasible]
+            if not len(pending):
+                break
+
+            # Por zona, en orden de puntuación: se aceptan lotes mientras quepan
+            order = np.lexsort((-best_score, best))
+            pending, best = pending[order], best[order]
+            q = qty[pending]
+            cum = np.cumsum(q)
+            starts = np.r_[0, np.flatnonzero(np.diff(best)) + 1]
+            group_start = np.repeat(starts, np.diff(np.r_[starts, len(best)]))
+            cum_in_zone = cum - (cum[group_start] - q[group_start])
+            fits = cum_in_zone <= self.free[best]
+
+            zone[pending[fits]] = best[fits]
+            self.free -= np.bincount(best[fits], weights=q[fits], minlength=len(self.names))
+            scores[:, np.unique(best[~fits])] = -np.inf
+            pending = pending[~fits]
+        return zone
+
+    def _result(self, lots: pl.DataFrame, zone: np.ndarray) -> pl.DataFrame:
+        names = np.array(self.names + [NO_ZONE], dtype=object)
+        return lots.with_columns(pl.Series("Zone", names[zone], dtype=pl.Utf8)).with_columns(
+            (pl.col("Current_Zone").is_not_null() & (pl.col("Zone") != pl.col("Current_Zone"))).alias("Move")
+        )
+
+    def assign(self, df: pl.DataFrame) -> pl.DataFrame:
+        """Full optimisation over `df`: KEY_COLS, Quantity, Expected_Waste, Current_Zone, Zone, Move."""
+        lots = _lot_inputs(df)
+        qty = lots["Quantity"].to_numpy()
+        self.capacity = self._share * qty.sum()
+        self.free = self.capacity.copy()
+        self.assignment = self._result(lots, self._greedy(self._scores(lots), qty))
+        return self.assignment
+
+    def update(self, upserts: pl.DataFrame | None, deletes: pl.DataFrame | None = None) -> pl.DataFrame:
+        """
+        Re-optimise only the changed lots (new risk, quantity or new lots). Their
+        previous zone counts as current, so they only move when it pays off.
+        """
+        if self.assignment is None:
+            return self.assign(upserts)
+        keys = [lots.select([pl.col(c).cast(pl.Utf8) for c in KEY_COLS])
+                for lots in (upserts, deletes) if lots is not None and not lots.is_empty()]
+        if not keys:
+            return self.assignment
+
+        # Liberar la capacidad que ocupaban los lotes cambiados o borrados
+        released = self.assignment.join(pl.concat(keys), on=KEY_COLS, how="semi")
+        self.free += np.bincount(
+            self._zone_index(released["Zone"]) % (len(self.names) + 1),
+            weights=released["Quantity"].to_numpy(), minlength=len(self.names) + 1,
+        )[:len(self.names)]
+        kept = self.assignment.join(released.select(KEY_COLS), on=KEY_COLS, how="anti")
+
+        parts = [kept]
+        if upserts is not None and not upserts.is_empty():
+            lots = _lot_inputs(upserts).join(released.select(KEY_COLS + ["Zone"]), on=KEY_COLS, how="left")
+            lots = lots.with_columns(
+                pl.coalesce("Current_Zone", pl.when(pl.col("Zone") != NO_ZONE).then(pl.col("Zone"))).alias("Current_Zone")
+            ).drop("Zone")
+            parts.append(self._result(lots, self._greedy(self._scores(lots), lots["Quantity"].to_numpy())))
+        self.assignment = pl.concat(parts)
+        return self.assignment
+
+    def zone_load(self) -> pl.DataFrame:
+        """Zone, Cold, Rotation, Capacity, Units, Lots."""
+        counts = (self.assignment.group_by("Zone").agg(pl.len().alias("Lots"))
+                  if self.assignment is not None else pl.DataFrame(schema={"Zone": pl.Utf8, "Lots": pl.UInt32}))
+        return pl.DataFrame({
+            "Zone": self.names,
+            "Cold": self._cold,
+            "Rotation": self._rotation,
+            "Capacity": np.round(self.capacity).astype(np.int64),
+            "Units": np.round(self.capacity - self.free).astype(np.int64),
+        }).join(counts, on="Zone", how="left").with_columns(pl.col("Lots").fill_null(0))
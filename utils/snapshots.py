@@ -0,0 +1,44 @@
+import os
+from datetime import date
+from pathlib import Path
+
+import polars as pl
+
+SNAPSHOT_COLS = ["Product_ID", "LOT_Number", "Expiry_Date", "Quantity", "Days_to_Expire", "Avg_Usage_per_Day", "Risk_Score"]
+
+
+def write_daily_snapshot(df: pl.DataFrame, snapshot_dir: str, day: date | None = None) -> Path:
+    """
+    Persist the warehouse state as the snapshot of `day` (hive partition Snapshot_Date=YYYY-MM-DD).
+    Later ticks of the same day overwrite it, so history grows by one file per day.
+    """
+    day = day or date.today()
+    part_dir = Path(snapshot_dir) / f"Snapshot_Date={day.isoformat()}"
+    os.makedirs(part_dir, exist_ok=True)
+
+    snap = df.select([c for c in SNAPSHOT_COLS if c in df.columns]).with_columns([
+        pl.col("Expiry_Date").cast(pl.Utf8).str.strptime(pl.Date, strict=False).alias("Expiry_Date"),
+        pl.col("Quantity").cast(pl.Int64, strict=False),
+    ])
+    path = part_dir / "part-0.parquet"
+    tmp = path.with_suffix(".parquet.tmp")
+    snap.write_parquet(tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def scan_snapshots(snapshot_dir: str) -> pl.LazyFrame:
+    """Lazy view over all daily snapshots; filters on Snapshot_Date prune whole files."""
+    return pl.scan_parquet(
+        str(Path(snapshot_dir) / "Snapshot_Date=*" / "*.parquet"),
+        hive_partitioning=True,
+    )
+
+
+def snapshot_dates(snapshot_dir: str) -> list[date]:
+    """Days with a snapshot, from the partition directory names (no file is read)."""
+    return sorted(
+        date.fromisoformat(part.name.split("=", 1)[1])
+        for part in Path(snapshot_dir).glob("Snapshot_Date=*")
+        if any(part.glob("*.parquet"))
+    )
@@ -0,0 +1,207 @@
+import os
+from datetime import date
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import polars as pl
+
+from utils.prepare_lots import derive_lot_columns
+
+# Catálogo base (mismos productos que expirations.xlsx) con vida útil típica en días
+CATALOG = [
+    # Product_ID, Product_Name, shelf life (min, max), uso diario medio
+    ("SNK001", "Snack Box Economy", (60, 240), 12.0),
+    ("DRK002", "Bottled Water 0.5L", (180, 365), 25.0),
+    ("MLK003", "Powdered Milk Sachet", (30, 180), 8.0),
+    ("SND004", "Chicken Sandwich", (2, 5), 20.0),
+    ("JCE005", "Orange Juice 200ml", (20, 90), 15.0),
+    ("COF006", "Instant Coffee Stick", (180, 365), 10.0),
+    ("BIS007", "Sweet Biscuit Pack", (60, 240), 9.0),
+    ("SAL008", "Mixed Salad Bowl", (2, 5), 14.0),
+    ("FRU009", "Fruit Cup 150g", (5, 12), 11.0),
+    ("CHS010", "Cheese Portion Pack", (10, 60), 7.0),
+]
+SIZES = ["100ml", "150g", "180g", "200ml", "250ml", "300g"]
+LOT_LETTERS = np.array(list("ABCDEFGH"))
+EXPIRED_SHARE = 0.05
+BAD_DATES = ["N/A", "31/02/2025", "TBD", "", "2025-13-45"]
+
+RAW_COLS = ["Product_ID", "Product_Name", "Weight_or_Volume", "LOT_Number", "Expiry_Date", "Quantity"]
+TRAINING_COLS = ["Product_ID", "Quantity", "Days_to_Expire", "Avg_Usage_per_Day", "Risk", "Waste_Label"]
+KINDS = ("raw", "processed", "training")
+
+
+def product_table(n_products: int) -> pl.DataFrame:
+    """Expand the base catalog to `n_products` variants (same family prefix, new number)."""
+    idx = np.arange(n_products)
+    base = idx % len(CATALOG)
+    variant = idx // len(CATALOG)
+    ids = [f"{CATALOG[b][0][:3]}{int(CATALOG[b][0][3:]) + 10 * v:03d}" for b, v in zip(base, variant)]
+    names = [CATALOG[b][1] if v == 0 else f"{CATALOG[b][1]} #{v}" for b, v in zip(base, variant)]
+    return pl.DataFrame({
+        "Product_ID": ids,
+        "Product_Name": names,
+        "Family": base.astype(np.int32),
+        # Popularidad tipo Zipf: pocos productos concentran la mayoría de lotes
+        "Weight": 1.0 / (idx + 1) ** 0.8,
+    })
+
+
+def _lots(rng: np.random.Generator, products: pl.DataFrame, n: int, start_index: int, today: date) -> dict:
+    weights = products["Weight"].to_numpy()
+    pick = rng.choice(products.height, size=n, p=weights / weights.sum())
+    family = products["Family"].to_numpy()[pick]
+
+    shelf = np.array([c[2] for c in CATALOG])
+    usage = np.array([c[3] for c in CATALOG])
+    lo, hi = shelf[family, 0], shelf[family, 1]
+    days = lo + (rng.random(n) * (hi - lo + 1)).astype(np.int64)
+    # Una fracción ya caducada (lotes olvidados en almacén)
+    expired = rng.random(n) < EXPIRED_SHARE
+    days = np.where(expired, -rng.integers(1, 30, size=n), days)
+
+    quantity = np.clip(rng.lognormal(mean=5.7, sigma=0.5, size=n), 1, 1000).astype(np.int64)
+    avg_usage = np.round(usage[family] * rng.lognormal(0.0, 0.6, size=n), 2)
+    global_idx = start_index + np.arange(n)
+
+    return {
+        "Product_ID": products["Product_ID"].to_numpy()[pick],
+        "Product_Name": products["Product_Name"].to_numpy()[pick],
+        "Weight_or_Volume": np.array(SIZES)[rng.integers(0, len(SIZES), size=n)],
+        "LOT_Number": np.char.add(np.char.add("LOT-", LOT_LETTERS[global_idx % len(LOT_LETTERS)]),
+                                  (global_idx // len(LOT_LETTERS)).astype(str)),
+        "Expiry_Date": np.datetime64(today, "D") + days,
+        "Quantity": quantity,
+        "Days_to_Expire": days,
+        "Avg_Usage_per_Day": avg_usage,
+    }
+
+
+def _dirty(rng: np.random.Generator, df: pl.DataFrame, rate: float) -> pl.DataFrame:
+    """Inject the data-quality issues seen in the real xlsx: bad dates, Excel serials, whitespace, nulls."""
+    n = df.height
+    date_str = df["Expiry_Date"].cast(pl.Utf8).to_numpy().astype(object)
+    roll = rng.random(n)
+
+    # Seriales de Excel (días desde 1899-12-30)
+    serial = (df["Expiry_Date"].to_numpy().astype("datetime64[D]") - np.datetime64("1899-12-30")).astype(np.int64)
+    is_serial = roll < rate
+    date_str[is_serial] = serial[is_serial].astype(str)
+    is_bad = (roll >= rate) & (roll < 2 * rate)
+    date_str[is_bad] = rng.choice(BAD_DATES, size=int(is_bad.sum()))
+
+    names = df["Product_Name"].to_numpy().astype(object)
+    spaced = rng.random(n) < rate
+    names[spaced] = ["  " + s.replace(" ", "   ") + " \t" for s in names[spaced]]
+    names[rng.random(n) < rate / 4] = None
+
+    lots = df["LOT_Number"].to_numpy().astype(object)
+    lower = rng.random(n) < rate
+    lots[lower] = [s.lower() + " " for s in lots[lower]]
+
+    quantity = df["Quantity"].to_numpy().copy()
+    quantity[rng.random(n) < rate / 4] = -1
+
+    return df.with_columns([
+        pl.Series("Expiry_Date", date_str, dtype=pl.Utf8),
+        pl.Series("Product_Name", names, dtype=pl.Utf8),
+        pl.Series("LOT_Number", lots, dtype=pl.Utf8),
+        pl.Series("Quantity", quantity),
+    ])
+
+
+def generate_chunk(kind: str, n: int, chunk_index: int, start_index: int, seed: int, products: pl.DataFrame,
+                   dirty_rate: float = 0.0, label_noise: float = 0.0, today: date | None = None) -> pl.DataFrame:
+    """
+    One chunk of synthetic rows. The RNG is seeded with (seed, chunk_index), so a chunk
+    is identical no matter how many chunks are generated or in which order.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown kind: {kind} (expected one of {KINDS})")
+    today = today or date.today()
+    rng = np.random.default_rng([seed, chunk_index])
+    lots = pl.DataFrame(_lots(rng, products, n, start_index, today)).with_columns(
+        pl.col("Expiry_Date").cast(pl.Date)
+    )
+
+    if kind == "raw":
+        return _dirty(rng, lots.select(RAW_COLS), dirty_rate) if dirty_rate > 0 else lots.select(RAW_COLS)
+
+    if kind == "processed":
+        usage = lots["Avg_Usage_per_Day"]
+        df = derive_lot_columns(lots.select(RAW_COLS), today).with_columns(usage)
+        return df.with_columns((100 - (pl.col("Days_to_Expire") * 10)).clip(0, 100).alias("Risk_Score"))
+
+    # --- training: mismas fórmulas que src/train_predict_waste.py ---
+    df = lots.with_columns(
+        (100 - (pl.col("Days_to_Expire") * pl.col("Avg_Usage_per_Day")) / ((pl.col("Quantity") / 10) + 1))
+        .clip(0, 100).round(2).alias("Risk")
+    ).with_columns(
+        ((pl.col("Days_to_Expire") < 0) |
+         ((pl.col("Days_to_Expire") < 5) & (pl.col("Quantity") > pl.col("Avg_Usage_per_Day") * 5)))
+        .cast(pl.Int8).alias("Waste_Label")
+    )
+    if label_noise > 0:
+        flip = pl.Series(rng.random(n) < label_noise)
+        df = df.with_columns(
+            pl.when(flip).then(1 - pl.col("Waste_Label")).otherwise(pl.col("Waste_Label")).alias("Waste_Label")
+        )
+    return df.select(TRAINING_COLS)
+
+
+def iter_chunks(kind: str, n_rows: int, chunk_size: int = 1_000_000, seed: int = 42, n_products: int = 10,
+                **kwargs) -> Iterator[pl.DataFrame]:
+    """Yield `n_rows` synthetic rows in chunks; memory is bounded by `chunk_size`."""
+    products = product_table(n_products)
+    for chunk_index, start in enumerate(range(0, n_rows, chunk_size)):
+        n = min(chunk_size, n_rows - start)
+        yield generate_chunk(kind, n, chunk_index, start, seed, products, **kwargs)
+
+
+def generate(kind: str, n_rows: int, **kwargs) -> pl.DataFrame:
+    """In-memory helper for small datasets (benchmarks, notebooks)."""
+    return pl.concat(list(iter_chunks(kind, n_rows, **kwargs)), how="vertical")
+
+
+def flight_schedule(demand: pl.DataFrame, n_flights: int, day: date | None = None, seed: int = 42) -> pl.DataFrame:
+    """
+    One day of departures. `demand` is Product_ID, Daily_Demand; each product's
+    daily demand is split at random across the flights. Returns one row per
+    flight and product: Flight_ID, Departure, Product_ID, Demand.
+    """
+    day = day or date.today()
+    rng = np.random.default_rng(seed)
+    # Salidas entre las 05:00 y las 23:00
+    minutes = np.sort(rng.integers(5 * 60, 23 * 60, size=n_flights))
+    departure = (np.datetime64(day, "m") + minutes).astype("datetime64[ms]")
+    share = rng.dirichlet(np.ones(n_flights), size=demand.height)
+    qty = np.round(share * demand["Daily_Demand"].to_numpy()[:, None]).astype(np.int64)
+
+    product_idx, flight_idx = np.nonzero(qty)
+    return pl.DataFrame({
+        "Flight_ID": np.char.add("GG", (1000 + flight_idx).astype(str)),
+        "Departure": departure[flight_idx],
+        "Product_ID": demand["Product_ID"].to_numpy()[product_idx],
+        "Demand": qty[product_idx, flight_idx],
+    }).sort(["Departure", "Flight_ID", "Product_ID"])
+
+
+def write_chunks(chunks: Iterator[pl.DataFrame], output: str, fmt: str = "parquet") -> int:
+    """
+    Stream chunks to disk: one part file per chunk for Parquet (a directory),
+    a single appended file for CSV. Returns the number of rows written.
+    """
+    rows = 0
+    if fmt == "parquet":
+        os.makedirs(output, exist_ok=True)
+        for i, chunk in enumerate(chunks):
+            chunk.write_parquet(Path(output) / f"part-{i:05d}.parquet")
+            rows += chunk.height
+        return rows
+
+    with open(output, "w") as f:
+        for i, chunk in enumerate(chunks):
+            chunk.write_csv(f, include_header=(i == 0))
+            rows += chunk.height
+    return rows
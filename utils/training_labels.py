@@ -0,0 +1,118 @@
+import os
+from datetime import date, timedelta
+from pathlib import Path
+
+import polars as pl
+
+from utils.snapshots import scan_snapshots, snapshot_dates
+
+KEY_COLS = ["Product_ID", "LOT_Number", "Expiry_Date"]
+FEATURES = ["Quantity", "Days_to_Expire", "Avg_Usage_per_Day", "Risk"]
+LABEL_COLS = KEY_COLS + ["Feature_Date"] + FEATURES + ["Waste_Label"]
+
+
+def build_labels(snapshot_dir: str, start: date, end: date, lead_days: int, tolerance_days: int) -> pl.DataFrame:
+    """
+    Derive Waste_Label for lots expiring in [start, end) from the daily snapshots.
+
+    Features are taken from the last snapshot at or before Expiry_Date - lead_days,
+    and the label is 1 when the last snapshot at or before Expiry_Date still holds
+    stock. Both lookups are as-of joins per lot, and only the snapshot partitions
+    that can match the window are scanned.
+    """
+    first_needed = start - timedelta(days=lead_days + tolerance_days)
+    snaps = (
+        scan_snapshots(snapshot_dir)
+        .filter(pl.col("Snapshot_Date").is_between(first_needed, end, closed="left"))
+        .filter(pl.col("Expiry_Date").is_between(start, end, closed="left"))
+        .select(KEY_COLS + ["Snapshot_Date", "Quantity", "Avg_Usage_per_Day", "Risk_Score"])
+        .collect()
+        .sort("Snapshot_Date")
+    )
+    if snaps.is_empty():
+        return pl.DataFrame(schema=_label_schema())
+
+    lots = snaps.select(KEY_COLS).unique().with_columns(
+        (pl.col("Expiry_Date") - pl.duration(days=lead_days)).alias("Feature_Date")
+    )
+    tolerance = timedelta(days=tolerance_days)
+
+    # --- Features "as of" N días antes de caducar ---
+    features = lots.sort("Feature_Date").join_asof(
+        snaps, left_on="Feature_Date", right_on="Snapshot_Date", by=KEY_COLS,
+        strategy="backward", tolerance=tolerance, check_sortedness=False,
+    ).filter(pl.col("Snapshot_Date").is_not_null())
+
+    # --- Resultado real: stock remanente al caducar ---
+    outcome = lots.sort("Expiry_Date").join_asof(
+        snaps.select(KEY_COLS + [pl.col("Snapshot_Date").alias("Outcome_Date"), pl.col("Quantity").alias("Quantity_at_expiry")]),
+        left_on="Expiry_Date", right_on="Outcome_Date", by=KEY_COLS,
+        strategy="backward", tolerance=tolerance, check_sortedness=False,
+    ).filter(pl.col("Outcome_Date").is_not_null())
+
+    # Un lote que desaparece de los snapshots antes de caducar se consumió por completo.
+    # Los días con snapshot salen de la lista de particiones, no de `snaps`: un día sin
+    # lotes de esta ventana también cuenta como snapshot en el que el lote ya no estaba
+    snapshot_days = pl.DataFrame(
+        {"Last_Snapshot": [d for d in snapshot_dates(snapshot_dir) if first_needed <= d < end]},
+        schema={"Last_Snapshot": pl.Date},
+    )
+    outcome = outcome.sort("Expiry_Date").join_asof(
+        snapshot_days, left_on="Expiry_Date", right_on="Last_Snapshot", strategy="backward",
+    )
+
+    labels = features.join(outcome.select(KEY_COLS + ["Outcome_Date", "Last_Snapshot", "Quantity_at_expiry"]),
+                           on=KEY_COLS, how="inner")
+    return labels.with_columns([
+        (pl.col("Expiry_Date") - pl.col("Snapshot_Date")).dt.total_days().cast(pl.Int64).alias("Days_to_Expire"),
+        pl.col("Risk_Score").cast(pl.Float64).alias("Risk"),
+        ((pl.col("Quantity_at_expiry") > 0) & (pl.col("Outcome_Date") == pl.col("Last_Snapshot")))
+        .cast(pl.Int8).alias("Waste_Label"),
+    ]).select(LABEL_COLS).cast(_label_schema())
+
+
+def _label_schema() -> dict:
+    return {
+        "Product_ID": pl.Utf8, "LOT_Number": pl.Utf8, "Expiry_Date": pl.Date, "Feature_Date": pl.Date,
+        "Quantity": pl.Int64, "Days_to_Expire": pl.Int64, "Avg_Usage_per_Day": pl.Float64,
+        "Risk": pl.Float64, "Waste_Label": pl.Int8,
+    }
+
+
+def labeled_until(store_dir: str) -> date | None:
+    """Watermark: last expiry date already processed (stored in the chunk file names)."""
+    chunks = sorted(Path(store_dir).glob("labels_*_*.parquet"))
+    if not chunks:
+        return None
+    return date.fromisoformat(chunks[-1].stem.split("_")[-1])
+
+
+def update_training_store(snapshot_dir: str, store_dir: str, lead_days: int, tolerance_days: int,
+                          window_days: int, today: date | None = None) -> int:
+    """
+    Append labels for every lot that expired since the last run, one Parquet chunk per window.
+    Memory is bounded by a single window of snapshots, never the full history.
+    """
+    today = today or date.today()
+    os.makedirs(store_dir, exist_ok=True)
+
+    start = labeled_until(store_dir)
+    if start is None:
+        first = scan_snapshots(snapshot_dir).select(pl.col("Snapshot_Date").min()).collect().item()
+        if first is None:
+            return 0
+        start = first
+
+    written = 0
+    while start < today:
+        end = min(start + timedelta(days=window_days), today)
+        labels = build_labels(snapshot_dir, start, end, lead_days, tolerance_days)
+        # Se escribe el chunk aunque esté vacío: su nombre avanza el watermark
+        labels.write_parquet(Path(store_dir) / f"labels_{start.isoformat()}_{end.isoformat()}.parquet")
+        written += labels.height
+        start = end
+    return written
+
+
+def scan_training_store(store_dir: str) -> pl.LazyFrame:
+    return pl.scan_parquet(str(Path(store_dir) / "labels_*.parquet"))
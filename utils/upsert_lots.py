@@ -0,0 +1,138 @@
+import os
+from datetime import date
+from pathlib import Path
+from typing import Callable
+
+import polars as pl
+
+from utils.prepare_lots import BASE_COLS, KEY_COLS, OUTPUT_COLS, derive_lot_columns
+
+# Acciones aceptadas en la columna opcional "Action" del delta
+DELETE_ACTIONS = {"DELETE", "DEL", "REMOVE"}
+PARTITION_COL = "_partition"
+
+
+def _partition_expr() -> pl.Expr:
+    """ Partición por mes de caducidad (YYYY-MM) """
+    return pl.col("Expiry_Date").dt.strftime("%Y-%m").alias(PARTITION_COL)
+
+
+def _partition_path(store_dir: str, partition: str) -> Path:
+    return Path(store_dir) / f"part-{partition}.parquet"
+
+
+def _write_partition(part: pl.DataFrame, path: Path) -> None:
+    """ Escribe de forma atómica (tmp + rename) para no dejar particiones a medias """
+    tmp = path.with_suffix(".parquet.tmp")
+    part.write_parquet(tmp)
+    os.replace(tmp, path)
+
+
+def init_store(df: pl.DataFrame, store_dir: str) -> int:
+    """Write a full (deduplicated) lot table as one Parquet file per expiry month."""
+    os.makedirs(store_dir, exist_ok=True)
+    for old in Path(store_dir).glob("part-*.parquet"):
+        old.unlink()
+
+    parts = df.select(BASE_COLS).with_columns(_partition_expr()).partition_by(PARTITION_COL, as_dict=True)
+    for (partition,), part in parts.items():
+        _write_partition(part.drop(PARTITION_COL), _partition_path(store_dir, partition))
+    return len(parts)
+
+
+def _normalize_delta(delta: pl.DataFrame) -> pl.DataFrame:
+    """Collapse duplicated keys: quantities add up, the last action wins."""
+    if "Action" not in delta.columns:
+        delta = delta.with_columns(pl.lit("UPSERT").alias("Action"))
+    for col in BASE_COLS:
+        if col not in delta.columns:
+            delta = delta.with_columns(pl.lit(None, dtype=pl.Utf8).alias(col))
+
+    delta = delta.with_columns(
+        pl.col("Action").cast(pl.Utf8).str.strip_chars().str.to_uppercase()
+        .is_in(list(DELETE_ACTIONS)).fill_null(False).alias("_delete")
+    )
+    return delta.group_by(KEY_COLS, maintain_order=True).agg([
+        pl.col("Quantity").sum().alias("Quantity"),
+        pl.col("Product_Name").drop_nulls().first().alias("Product_Name"),
+        pl.col("Weight_or_Volume").drop_nulls().first().alias("Weight_or_Volume"),
+        pl.col("_delete").last().alias("_delete"),
+    ])
+
+
+def upsert_delta(delta: pl.DataFrame, store_dir: str,
+                 on_change: Callable[[pl.DataFrame, pl.DataFrame], None] | None = None) -> dict:
+    """
+    Merge a cleaned delta of lots into the partitioned store.
+
+    The delta is hash-joined against the existing lots on
+    (Product_ID, LOT_Number, Expiry_Date): new keys are inserted, existing keys
+    take the delta Quantity, and rows flagged with Action=DELETE are removed.
+    Only the expiry-month partitions touched by the delta are read and rewritten.
+    New lots without a Product_Name are counted as rejected and skipped.
+
+    `on_change(upserted_lots, deleted_keys)` is called per partition with the
+    merged lots (derived columns included) so incremental aggregates such as
+    KpiCube.apply can follow the store in O(delta).
+    """
+    stats = {"inserted": 0, "updated": 0, "deleted": 0, "rejected": 0, "partitions": 0}
+    if delta.is_empty():
+        return stats
+
+    os.makedirs(store_dir, exist_ok=True)
+    delta = _normalize_delta(delta).with_columns(_partition_expr())
+
+    for (partition,), part_delta in delta.partition_by(PARTITION_COL, as_dict=True).items():
+        path = _partition_path(store_dir, partition)
+        if path.exists():
+            current = pl.read_parquet(path)
+        else:
+            current = part_delta.select(BASE_COLS).clear()
+
+        upserts = part_delta.filter(~pl.col("_delete"))
+        deletes = part_delta.filter(pl.col("_delete"))
+
+        # --- Hash join sobre la clave compuesta ---
+        # LOT_Number nulo es una clave válida (dedupe_lots lo agrupa así): los nulos deben casar entre sí
+        matched = upserts.join(current, on=KEY_COLS, how="left", suffix="_old", coalesce=True, nulls_equal=True)
+        is_update = pl.col("Quantity_old").is_not_null()
+        # Un lote nuevo necesita al menos Product_Name (mismo criterio que split_quality)
+        is_valid = is_update | pl.col("Product_Name").is_not_null()
+        stats["rejected"] += matched.filter(~is_valid).height
+        matched = matched.filter(is_valid)
+        stats["updated"] += matched.filter(is_update).height
+        stats["inserted"] += matched.filter(~is_update).height
+        stats["deleted"] += current.join(deletes, on=KEY_COLS, how="semi", nulls_equal=True).height
+
+        # Actualizaciones parciales (solo cantidad) conservan los textos previos
+        merged = matched.with_columns([
+            pl.coalesce("Product_Name", "Product_Name_old").alias("Product_Name"),
+            pl.coalesce("Weight_or_Volume", "Weight_or_Volume_old").alias("Weight_or_Volume"),
+            pl.col("Quantity").cast(pl.Int64).fill_null(0).clip(lower_bound=0).alias("Quantity"),
+        ]).select(BASE_COLS)
+
+        untouched = current.join(part_delta, on=KEY_COLS, how="anti", nulls_equal=True)
+        new_part = pl.concat([untouched, merged.cast(current.schema)], how="vertical")
+
+        if on_change is not None:
+            on_change(derive_lot_columns(merged),
+                      current.join(deletes, on=KEY_COLS, how="semi", nulls_equal=True).select(KEY_COLS))
+
+        if new_part.is_empty():
+            path.unlink(missing_ok=True)
+        else:
+            _write_partition(new_part, path)
+        stats["partitions"] += 1
+
+    return stats
+
+
+def scan_store(store_dir: str) -> pl.LazyFrame:
+    """Lazy view over every partition of the store."""
+    return pl.scan_parquet(str(Path(store_dir) / "part-*.parquet"))
+
+
+def export_processed(store_dir: str, output_csv: str, today: date | None = None) -> None:
+    """Materialize the store as expirations_processed.csv (same layout as data_preparation)."""
+    df = derive_lot_columns(scan_store(store_dir).collect(), today)
+    df.select(OUTPUT_COLS).sort(["Days_to_Expire", "Quantity"], descending=[False, True]).write_csv(output_csv)
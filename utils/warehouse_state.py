@@ -0,0 +1,52 @@
+from datetime import date
+
+import polars as pl
+
+
+def load_warehouse(primary: str = "data/expirations_processed.csv",
+                   fallback: str = "data/data_with_risk.csv") -> pl.DataFrame:
+    """Base warehouse state with Days_to_Expire, Status and Risk_Score relative to today."""
+    try:
+        df = pl.read_csv(primary)
+    except:
+        df = pl.read_csv(fallback)
+
+    today = date.today()
+
+    # --- Detect and normalize Expiry_Date dtype ---
+    dtype = df.schema.get("Expiry_Date")
+
+    if dtype == pl.Utf8:
+        df = df.with_columns(
+            pl.col("Expiry_Date")
+            .str.strptime(pl.Date, strict=False)
+            .alias("Expiry_Date")
+        )
+
+    df = df.with_columns(
+        pl.when(pl.col("Expiry_Date").is_null())
+        .then(pl.lit(today))
+        .otherwise(pl.col("Expiry_Date"))
+        .alias("Expiry_Date")
+    )
+
+    # --- Compute days to expire ---
+    df = df.with_columns([
+        (pl.col("Expiry_Date").cast(pl.Date) - pl.lit(today).cast(pl.Date))
+        .dt.total_days()
+        .cast(pl.Int64, strict=False)
+        .alias("Days_to_Expire")
+    ])
+
+    # --- Status and risk ---
+    return df.with_columns([
+        pl.when(pl.col("Days_to_Expire") < 0).then(pl.lit("Expired"))
+        .when(pl.col("Days_to_Expire") <= 2).then(pl.lit("Critical"))
+        .when(pl.col("Days_to_Expire") <= 7).then(pl.lit("Medium"))
+        .otherwise(pl.lit("Active"))
+        .alias("Status"),
+
+        (100 - (pl.col("Days_to_Expire") * 10))
+        .clip(0, 100)
+        .alias("Risk_Score"),
+    ])